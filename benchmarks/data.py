@@ -0,0 +1,76 @@
+"""Синтетические данные для бенчмарков в нескольких масштабах.
+
+Книги, читатели и история займов создаются генератором src.seed (COPY,
+параллельные воркеры): один масштаб и seed дают одну и ту же базу.
+"""
+
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from src.auth import get_password_hash
+from src.database import get_engine
+from src.seed import SeedOptions, generate
+
+BENCH_PASSWORD = "benchpass"
+
+
+@dataclass(frozen=True)
+class Scale:
+    books: int
+    readers: int
+    loans: int
+
+
+# Масштаб назван по числу займов в истории
+SCALES = {
+    "10k": Scale(books=1_000, readers=1_000, loans=10_000),
+    "1m": Scale(books=100_000, readers=100_000, loans=1_000_000),
+    "10m": Scale(books=1_000_000, readers=1_000_000, loans=10_000_000),
+}
+
+
+def bench_email(n):
+    return f"bench{n}@library.com"
+
+
+def is_empty(conn):
+    return not conn.execute(text("SELECT count(*) FROM books")).scalar()
+
+
+def reset(conn):
+    conn.execute(
+        text(
+            "TRUNCATE borrowed_books, books, readers, users "
+            "RESTART IDENTITY CASCADE"
+        )
+    )
+
+
+def seed(scale, users=20, workers=None):
+    """Заполняет пустую базу через src.seed и добавляет библиотекарей.
+
+    Все займы истории возвращены: активные займы создаёт сама нагрузка,
+    поэтому выдачи не упираются в лимиты читателей и остатки книг.
+    """
+    options = SeedOptions(
+        books=scale.books,
+        readers=scale.readers,
+        loans=scale.loans,
+        return_rate=1.0,
+    )
+    generate(options, workers=workers or os.cpu_count() or 1)
+    # Один хеш на всех: bcrypt на каждого пользователя занял бы секунды
+    password = get_password_hash(BENCH_PASSWORD)
+    with get_engine().begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO users (email, password) "
+                "VALUES (:email, :password)"
+            ),
+            [
+                {"email": bench_email(n), "password": password}
+                for n in range(users)
+            ],
+        )
@@ -0,0 +1,296 @@
+"""Нагрузочный генератор: чтения каталога, логины, выдачи и возвраты.
+
+Виртуальные пользователи (asyncio + httpx) в цикле выбирают сценарий
+по весам --mix. Итог - req/s и p50/p95/p99 по каждому эндпоинту, он же
+сохраняется в benchmarks/results/ для сравнения между коммитами::
+
+    # заполнить отдельную базу и нагрузить приложение в этом процессе
+    python -m benchmarks.load --scale 10k --reset
+
+    # нагрузить запущенный сервер (python -m src.server)
+    python -m benchmarks.load --url http://127.0.0.1:8000 --concurrency 64
+
+    python -m benchmarks.load --compare benchmarks/results/load-....json
+
+База берётся из DATABASE_URL_LOCAL/DATABASE_URL_PROD; запускать только
+на отдельной базе в состоянии head.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import data, report
+from src.database import get_async_engine, get_engine
+from src.seed import ADJECTIVES, FIRST_NAMES, LAST_NAMES, NOUNS, TOPICS
+
+MIX = {"catalog": 70, "login": 5, "loan": 25}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in MIX or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"Некорректная смесь: {part}")
+        mix[name] = int(weight)
+    return mix
+
+
+def search_query(rng):
+    """Запрос к /books/search из словаря генератора src.seed.
+
+    Слова названий, авторы и темы встречаются в заполненной базе, так что
+    поиск возвращает совпадения, а не пустые страницы.
+    """
+    kind = rng.random()
+    if kind < 0.4:
+        return f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+    if kind < 0.7:
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    if kind < 0.85:
+        return rng.choice(LAST_NAMES)
+    return rng.choice(TOPICS)
+
+
+class Recorder:
+    """Задержки и коды ответов по имени эндпоинта."""
+
+    def __init__(self):
+        self.enabled = False
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def request(self, client, name, method, url, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        if self.enabled:
+            self.samples[name].append(time.perf_counter() - started)
+            self.statuses[name][str(response.status_code)] += 1
+        return response
+
+    def results(self, elapsed):
+        endpoints = {
+            name: report.summarize(
+                self.samples[name], elapsed, self.statuses[name]
+            )
+            for name in sorted(self.samples)
+        }
+        total = report.summarize(
+            [s for samples in self.samples.values() for s in samples],
+            elapsed,
+            sum(self.statuses.values(), Counter()),
+        )
+        return endpoints, total
+
+
+class VirtualUser:
+    def __init__(self, n, client, recorder, args, books, readers, rng):
+        self.n = n
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.books = books
+        self.readers = readers
+        self.rng = rng
+        self.headers = {}
+        self.cursor = None
+
+    def request(self, name, method, url, **kwargs):
+        return self.recorder.request(
+            self.client, name, method, url, headers=self.headers, **kwargs
+        )
+
+    async def login(self):
+        response = await self.request(
+            "POST /login",
+            "POST",
+            "/login",
+            json={
+                "email": data.bench_email(self.n % self.args.users),
+                "password": data.BENCH_PASSWORD,
+            },
+        )
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    async def catalog(self):
+        roll = self.rng.random()
+        if roll < 0.35 or (roll < 0.5 and self.cursor is None):
+            response = await self.request(
+                "GET /books", "GET", "/books", params={"limit": 20}
+            )
+            self.cursor = response.headers.get("X-Next-Cursor")
+        elif roll < 0.5:
+            response = await self.request(
+                "GET /books?cursor",
+                "GET",
+                "/books",
+                params={"limit": 20, "cursor": self.cursor},
+            )
+            self.cursor = response.headers.get("X-Next-Cursor")
+        elif roll < 0.8:
+            book_id = self.rng.randint(1, self.books)
+            await self.request(
+                "GET /books/{book_id}", "GET", f"/books/{book_id}"
+            )
+        elif roll < 0.9:
+            await self.request(
+                "GET /books/search",
+                "GET",
+                "/books/search",
+                params={"q": search_query(self.rng)},
+            )
+        else:
+            reader_id = self.rng.randint(1, self.readers)
+            await self.request(
+                "GET /readers/{reader_id}", "GET", f"/readers/{reader_id}"
+            )
+
+    async def loan(self):
+        # У каждого пользователя свои читатели: параллельные выдачи не
+        # упираются в лимит книг одного читателя. Если пользователей больше,
+        # чем читателей, они делят читателей по кругу
+        step = min(self.args.concurrency, self.readers)
+        reader_id = self.rng.randrange(self.n % step, self.readers, step) + 1
+        loan = {
+            "book_id": self.rng.randint(1, self.books),
+            "reader_id": reader_id,
+        }
+        response = await self.request(
+            "POST /rent_book", "POST", "/rent_book", json=loan
+        )
+        if response.status_code < 300:
+            await self.request(
+                "POST /return_book", "POST", "/return_book", json=loan
+            )
+
+    async def run(self, deadline):
+        await self.login()
+        names = list(self.args.mix)
+        weights = [self.args.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            await getattr(self, scenario)()
+
+
+def prepare_database(args):
+    with get_engine().begin() as conn:
+        if args.reset:
+            data.reset(conn)
+        empty = data.is_empty(conn)
+    # Генератор пишет своими соединениями: очистка уже закоммичена
+    if empty:
+        print(f"Заполняем базу, масштаб {args.scale}...")
+        data.seed(data.SCALES[args.scale], users=args.users)
+    with get_engine().connect() as conn:
+        return conn.execute(
+            text(
+                "SELECT (SELECT max(id) FROM books), "
+                "(SELECT max(id) FROM readers)"
+            )
+        ).one()
+
+
+async def run_load(args, books, readers):
+    recorder = Recorder()
+    if args.url:
+        client = httpx.AsyncClient(
+            base_url=args.url,
+            limits=httpx.Limits(max_connections=args.concurrency),
+            timeout=30,
+        )
+    else:
+        from src.main import create_app
+
+        # Исключения приложения считаются ответами 500, а не прерывают прогон
+        transport = httpx.ASGITransport(
+            app=create_app(), raise_app_exceptions=False
+        )
+        client = httpx.AsyncClient(
+            transport=transport,
+            base_url="http://bench",
+            timeout=30,
+        )
+    async with client:
+        started = time.perf_counter()
+        deadline = started + args.warmup + args.duration
+        users = [
+            VirtualUser(
+                n,
+                client,
+                recorder,
+                args,
+                books,
+                readers,
+                random.Random(args.seed + n),
+            )
+            for n in range(args.concurrency)
+        ]
+        tasks = [asyncio.create_task(user.run(deadline)) for user in users]
+        # Прогрев: пулы соединений, кэши и prepared statements
+        await asyncio.sleep(args.warmup)
+        recorder.enabled = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - measured_from
+    if not args.url:
+        # Соединения asyncpg привязаны к event loop этого прогона
+        await get_async_engine().dispose()
+    return recorder.results(elapsed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="адрес сервера; без него - в процессе")
+    parser.add_argument("--scale", choices=data.SCALES, default="10k")
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="очистить books, readers, borrowed_books и users и заполнить",
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=MIX,
+        help="веса сценариев, например catalog=70,login=5,loan=25",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона")
+    args = parser.parse_args()
+
+    books, readers = prepare_database(args)
+    (endpoints, total), elapsed = asyncio.run(run_load(args, books, readers))
+    results = {
+        "name": "load",
+        "target": args.url or "in-process",
+        "scale": args.scale,
+        "books": books,
+        "readers": readers,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 1),
+        "mix": args.mix,
+        "endpoints": endpoints,
+        "total": total,
+    }
+    report.print_table(results)
+    print(f"\nРезультаты: {report.save(results, args.output)}")
+    if args.compare:
+        with open(args.compare) as f:
+            report.print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Бенчмарк эндпоинтов займов на большой истории borrowed_books.
+
+Заполняет базу из DATABASE_URL_LOCAL/DATABASE_URL_PROD историческими
+займами (по умолчанию 10M) и меряет задержку /rent_book, /return_book и
+/readers/{id}/borrowed с индексами на borrowed_books и без них.
+
+Запускать только на отдельной базе, схема должна быть в актуальном
+состоянии (alembic upgrade head)::
+
+    python -m benchmarks.loan_indexes --reset --loans 10000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import data
+from src.database import get_async_engine, get_engine
+from src.main import app
+
+INDEXES = {
+    "ix_borrowed_books_reader_active": (
+        "CREATE INDEX ix_borrowed_books_reader_active ON borrowed_books "
+        "(reader_id) WHERE return_date IS NULL"
+    ),
+    "ix_borrowed_books_book_reader_active": (
+        "CREATE INDEX ix_borrowed_books_book_reader_active ON borrowed_books "
+        "(book_id, reader_id) WHERE return_date IS NULL"
+    ),
+    "ix_borrowed_books_book_history": (
+        "CREATE INDEX ix_borrowed_books_book_history ON borrowed_books "
+        "(book_id, borrow_date, id)"
+    ),
+    "ix_borrowed_books_reader_history": (
+        "CREATE INDEX ix_borrowed_books_reader_history ON borrowed_books "
+        "(reader_id, borrow_date, id)"
+    ),
+}
+
+
+def set_indexes(enabled):
+    with get_engine().begin() as conn:
+        for name, ddl in INDEXES.items():
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            if enabled:
+                conn.execute(text(ddl))
+        conn.execute(text("ANALYZE borrowed_books"))
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def measure(books, readers, requests):
+    rng = random.Random(42)
+    timings = {"rent_book": [], "return_book": [], "borrowed": []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        response = await client.post(
+            "/login",
+            json={
+                "email": data.bench_email(0),
+                "password": data.BENCH_PASSWORD,
+            },
+        )
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"
+        }
+        for _ in range(requests):
+            loan = {
+                "book_id": rng.randint(1, books),
+                "reader_id": rng.randint(1, readers),
+            }
+            borrowed_url = f"/readers/{loan['reader_id']}/borrowed"
+            for name, method, url, body in (
+                ("rent_book", "POST", "/rent_book", loan),
+                ("borrowed", "GET", borrowed_url, None),
+                ("return_book", "POST", "/return_book", loan),
+            ):
+                start = time.perf_counter()
+                response = await client.request(
+                    method, url, json=body, headers=headers
+                )
+                timings[name].append(time.perf_counter() - start)
+                if response.status_code >= 300:
+                    raise RuntimeError(f"{url}: {response.text}")
+    # Соединения asyncpg привязаны к event loop этого прогона
+    await get_async_engine().dispose()
+    return timings
+
+
+def report(title, timings):
+    print(f"\n{title}")
+    print(f"{'endpoint':<14}{'p50, ms':>10}{'p95, ms':>10}{'mean, ms':>10}")
+    for name, samples in timings.items():
+        print(
+            f"{name:<14}"
+            f"{percentile(samples, 0.50) * 1000:>10.2f}"
+            f"{percentile(samples, 0.95) * 1000:>10.2f}"
+            f"{statistics.mean(samples) * 1000:>10.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--loans", type=int, default=10_000_000)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="очистить books, readers, borrowed_books и users перед запуском",
+    )
+    args = parser.parse_args()
+
+    with get_engine().begin() as conn:
+        if args.reset:
+            data.reset(conn)
+        elif not data.is_empty(conn):
+            parser.error("база не пуста, запустите с --reset")
+    print(f"Заполняем {args.loans} займов...")
+    data.seed(
+        data.Scale(books=args.books, readers=args.readers, loans=args.loans),
+        users=1,
+        workers=args.workers,
+    )
+
+    for enabled in (False, True):
+        set_indexes(enabled)
+        timings = asyncio.run(
+            measure(args.books, args.readers, args.requests)
+        )
+        report(
+            f"{'С индексами' if enabled else 'Без индексов'} "
+            f"({args.loans} займов в истории)",
+            timings,
+        )
+
+
+if __name__ == "__main__":
+    main()
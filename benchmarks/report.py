@@ -0,0 +1,95 @@
+"""Сводка замеров, сохранение в JSON и сравнение прогонов между коммитами."""
+
+import json
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(samples, elapsed, statuses):
+    """Задержки в мс и пропускная способность одного эндпоинта."""
+    summary = {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1),
+        "errors": sum(
+            count
+            for status_code, count in statuses.items()
+            if int(status_code) >= 400
+        ),
+        "statuses": dict(sorted(statuses.items())),
+    }
+    for name, q in PERCENTILES:
+        summary[f"{name}_ms"] = round(percentile(samples, q) * 1000, 2)
+    summary["max_ms"] = round(max(samples) * 1000, 2)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(results, path=None):
+    """Пишет результаты в JSON; по умолчанию - results/<name>-<commit>-..."""
+    now = datetime.now(timezone.utc)
+    results = {
+        "commit": git_commit(),
+        "created_at": now.isoformat(timespec="seconds"),
+        **results,
+    }
+    if path is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / (
+            f"{results['name']}-{results['commit'] or 'nogit'}-"
+            f"{now:%Y%m%dT%H%M%S}.json"
+        )
+    Path(path).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    return path
+
+
+def print_table(results):
+    print(
+        f"\n{'endpoint':<32}{'req/s':>9}{'p50, ms':>10}{'p95, ms':>10}"
+        f"{'p99, ms':>10}{'errors':>8}"
+    )
+    rows = dict(results["endpoints"], total=results["total"])
+    for name, row in rows.items():
+        print(
+            f"{name:<32}{row['rps']:>9.1f}{row['p50_ms']:>10.2f}"
+            f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>8}"
+        )
+
+
+def print_comparison(baseline, current):
+    """Изменение req/s и перцентилей относительно сохранённого прогона."""
+    print(
+        f"\nСравнение с {baseline.get('commit')} "
+        f"({baseline.get('created_at')}), изменение в %"
+    )
+    print(f"{'endpoint':<32}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    rows = dict(current["endpoints"], total=current["total"])
+    base_rows = dict(baseline["endpoints"], total=baseline["total"])
+    for name, row in rows.items():
+        base = base_rows.get(name)
+        if base is None:
+            continue
+        deltas = [
+            (row[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"{name:<32}" + "".join(f"{d:>+9.1f}" for d in deltas))
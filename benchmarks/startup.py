@@ -0,0 +1,78 @@
+"""Бенчмарк холодного старта воркера: импорт src.main в новом процессе.
+
+Сравнивает прежнее поведение (upgrade head при импорте приложения) с
+текущим (миграции отдельной командой src.migrate). База из
+DATABASE_URL_LOCAL/DATABASE_URL_PROD должна быть в состоянии head::
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Как было: каждый воркер при импорте прогонял alembic upgrade head
+WITH_MIGRATIONS = "import src.main; from src.migrate import upgrade; upgrade()"
+IMPORT_ONLY = "import src.main"
+
+
+def boot_time(code, workers):
+    """Время, за которое ``workers`` одновременно запущенных процессов
+    импортируют приложение."""
+    started = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        if process.wait() != 0:
+            raise RuntimeError(f"Процесс завершился с ошибкой: {code}")
+    return time.perf_counter() - started
+
+
+def report(title, samples):
+    print(
+        f"{title:<40}"
+        f"{statistics.median(samples) * 1000:>10.0f}"
+        f"{min(samples) * 1000:>10.0f}"
+        f"{max(samples) * 1000:>10.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="сколько воркеров стартует одновременно",
+    )
+    args = parser.parse_args()
+
+    # Прогрев: байткод и файловый кэш ОС
+    boot_time(WITH_MIGRATIONS, 1)
+    timings = {
+        "import + upgrade head (до)": [],
+        "import (после)": [],
+    }
+    for _ in range(args.runs):
+        timings["import + upgrade head (до)"].append(
+            boot_time(WITH_MIGRATIONS, args.workers)
+        )
+        timings["import (после)"].append(boot_time(IMPORT_ONLY, args.workers))
+
+    title = f"старт {args.workers} воркеров"
+    print(f"\n{title:<40}{'p50, ms':>10}{'min, ms':>10}{'max, ms':>10}")
+    for title, samples in timings.items():
+        report(title, samples)
+
+
+if __name__ == "__main__":
+    main()
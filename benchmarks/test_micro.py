@@ -0,0 +1,150 @@
+"""Микробенчмарки горячих путей без базы (pytest-benchmark).
+
+    pytest benchmarks/test_micro.py --benchmark-autosave
+    pytest benchmarks/test_micro.py --benchmark-compare
+
+Результаты сохраняются в benchmarks/results/micro (см. Makefile) с
+номером коммита в имени файла.
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.auth import create_user_token
+from src.bulk import iter_csv
+from src.cache import MemoryCache, ResponseCache
+from src.conditional import content_etag
+from src.export import _csv_chunk, _ndjson_chunk
+from src.instrumentation import QueryStats
+from src.pagination import decode_cursor, encode_cursor
+from src.schemas import BookSchema
+
+ROWS = 1000
+
+
+def run(coro):
+    # Корутины кэша в памяти не уходят в event loop: выполняем их
+    # напрямую, чтобы не мерить накладные расходы asyncio
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("корутина ожидает event loop")
+
+
+def book(i):
+    return SimpleNamespace(
+        id=i,
+        title=f"Book {i}",
+        author=f"Author {i % 100}",
+        year_published=1900 + i % 125,
+        isbn=f"978{i:010d}",
+        copies_available=i % 7,
+        description="Synthetic description " * 5,
+    )
+
+
+class ExportRow(tuple):
+    # Как строка Row из SQLAlchemy: кортеж с _asdict()
+    keys = ("id", "book_id", "reader_id", "borrow_date", "return_date")
+
+    def _asdict(self):
+        return dict(zip(self.keys, self))
+
+
+@pytest.fixture(scope="module")
+def books():
+    return [book(i) for i in range(50)]
+
+
+@pytest.fixture(scope="module")
+def page(books):
+    return [
+        BookSchema.model_validate(b).model_dump(mode="json") for b in books
+    ]
+
+
+def test_cursor_roundtrip(benchmark):
+    values = {"sort": "title", "id": 123456, "value": "Clean Code"}
+    assert benchmark(lambda: decode_cursor(encode_cursor(values))) == values
+
+
+def test_book_page_serialization(benchmark, books):
+    def serialize():
+        return [
+            BookSchema.model_validate(b).model_dump(mode="json") for b in books
+        ]
+
+    assert len(benchmark(serialize)) == len(books)
+
+
+def test_page_content_etag(benchmark, page):
+    assert benchmark(content_etag, page).startswith('"')
+
+
+def test_response_cache_hit(benchmark, page):
+    cache = ResponseCache(MemoryCache(10_000), ttl=30)
+
+    async def load():
+        return page
+
+    run(cache.get_or_load("0:20:None", load, namespace="books"))
+    result = benchmark(
+        lambda: run(cache.get_or_load("0:20:None", load, namespace="books"))
+    )
+    assert result is page
+
+
+def test_issue_token(benchmark):
+    user = SimpleNamespace(id=1, email="bench0@library.com", token_version=0)
+    assert benchmark(create_user_token, user)
+
+
+def test_csv_import_parsing(benchmark):
+    lines = ["title,author,year_published,isbn,copies_available"] + [
+        f'"Book {i}, vol. 2",Author {i},2001,978{i:010d},3'
+        for i in range(ROWS)
+    ]
+    body = ("\n".join(lines) + "\n").encode()
+    chunks = []
+    for start in range(0, len(body), 65536):
+        stop = start + 65536
+        chunks.append(body[start:stop])
+
+    async def parse():
+        async def source():
+            for chunk in chunks:
+                yield chunk
+
+        return [row async for row in iter_csv(source())]
+
+    assert len(benchmark(lambda: asyncio.run(parse()))) == ROWS
+
+
+def test_export_chunks(benchmark):
+    now = datetime(2026, 1, 1)
+    rows = [ExportRow((i, i % 97, i % 89, now, None)) for i in range(ROWS)]
+
+    def export():
+        return _ndjson_chunk(rows), _csv_chunk(rows)
+
+    ndjson, csv = benchmark(export)
+    assert ndjson.count("\n") == csv.count("\n") == ROWS
+
+
+def test_query_stats_record(benchmark):
+    # 5 разных запросов по 20 раз: все попадают в предупреждение об N+1
+    statements = [
+        f"SELECT * FROM books WHERE id = {i % 5}" for i in range(100)
+    ]
+
+    def record():
+        stats = QueryStats()
+        for statement in statements:
+            stats.record(statement, 0.001)
+        return stats.repeated()
+
+    assert benchmark(record)
@@ -0,0 +1,31 @@
+"""Add token_version to users
+
+Revision ID: 3f1c2a7d9e40
+Revises: 9ef89beedff9
+Create Date: 2026-10-18 12:05:11.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9e40'
+down_revision: Union[str, None] = '9ef89beedff9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'users',
+        sa.Column(
+            'token_version', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,46 @@
+"""Replace stored books.search_vector with an expression index
+
+Revision ID: 5e9a2c7d4b31
+Revises: c6a1d9e3b7f4
+Create Date: 2026-10-18 23:48:10.517302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9a2c7d4b31'
+down_revision: Union[str, None] = 'c6a1d9e3b7f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с d41a8c6f2e93 и src.models.book_search_vector
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    # Базы, прошедшие прежнюю версию d41a8c6f2e93, хранят вектор в
+    # колонке. DROP COLUMN не переписывает таблицу и удаляет индекс по
+    # колонке; на новых базах оба шага ничего не делают
+    op.drop_column('books', 'search_vector', if_exists=True)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_books_search_vector',
+            'books',
+            [sa.text(f'({SEARCH_VECTOR})')],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    # Индекс по выражению остаётся: его удаляет downgrade d41a8c6f2e93
+    pass
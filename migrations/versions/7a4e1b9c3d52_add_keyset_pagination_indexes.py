@@ -0,0 +1,29 @@
+"""Add keyset pagination indexes
+
+Revision ID: 7a4e1b9c3d52
+Revises: 3f1c2a7d9e40
+Create Date: 2026-10-18 12:31:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4e1b9c3d52'
+down_revision: Union[str, None] = '3f1c2a7d9e40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Курсор по (title, id) / (name, id) читает индекс без сортировки
+    op.create_index('ix_books_title_id', 'books', ['title', 'id'])
+    op.create_index('ix_readers_name_id', 'readers', ['name', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_readers_name_id', table_name='readers')
+    op.drop_index('ix_books_title_id', table_name='books')
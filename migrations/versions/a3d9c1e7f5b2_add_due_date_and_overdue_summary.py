@@ -0,0 +1,144 @@
+"""Add due_date to borrowed_books and overdue summary tables
+
+Revision ID: a3d9c1e7f5b2
+Revises: e5c83a1f7b24
+Create Date: 2026-10-18 19:12:08.531764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9c1e7f5b2'
+down_revision: Union[str, None] = 'e5c83a1f7b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с src.models.LOAN_PERIOD_DAYS на момент миграции
+LOAN_PERIOD_DAYS = 14
+
+
+# Строк borrowed_books в одной транзакции дозаполнения due_date
+BACKFILL_BATCH_SIZE = 50_000
+DUE_DATE_CHECK = 'ck_borrowed_books_due_date_not_null'
+
+
+def drop_invalid_index(name) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID:
+    # IF NOT EXISTS его пропустил бы, поэтому удаляем и строим заново.
+    # В offline-режиме (--sql) каталог не прочитать
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT EXISTS (SELECT 1 FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid)"
+        ),
+        {'name': name},
+    ).scalar()
+    if invalid:
+        op.drop_index(
+            name, table_name='borrowed_books', postgresql_concurrently=True
+        )
+
+
+def upgrade() -> None:
+    # Колонка без значения по умолчанию добавляется без перезаписи таблицы
+    op.add_column(
+        'borrowed_books',
+        sa.Column('due_date', sa.DateTime(), nullable=True),
+        if_not_exists=True,
+    )
+    # Дальше - вне транзакции миграции: история займов дозаполняется
+    # пачками по BACKFILL_BATCH_SIZE строк, каждая в своей транзакции,
+    # поэтому выдачи и возвраты ждут только блокировки своих строк
+    with op.get_context().autocommit_block():
+        # NOT VALID проверяет только новые строки: займы, выданные во
+        # время дозаполнения, приходят уже со сроком (src.models)
+        op.execute(
+            f'ALTER TABLE borrowed_books DROP CONSTRAINT IF EXISTS '
+            f'{DUE_DATE_CHECK}'
+        )
+        op.execute(
+            f'ALTER TABLE borrowed_books ADD CONSTRAINT {DUE_DATE_CHECK} '
+            'CHECK (due_date IS NOT NULL) NOT VALID'
+        )
+        # COMMIT внутри DO допустим только вне блока транзакции
+        op.execute(
+            f"""
+            DO $$
+            DECLARE
+                batch_start bigint := (SELECT min(id) FROM borrowed_books);
+                last_id bigint := (SELECT max(id) FROM borrowed_books);
+            BEGIN
+                WHILE batch_start <= last_id LOOP
+                    UPDATE borrowed_books
+                    SET due_date = borrow_date
+                        + interval '{LOAN_PERIOD_DAYS} days'
+                    WHERE id >= batch_start
+                        AND id < batch_start + {BACKFILL_BATCH_SIZE}
+                        AND due_date IS NULL;
+                    COMMIT;
+                    batch_start := batch_start + {BACKFILL_BATCH_SIZE};
+                END LOOP;
+            END $$
+            """
+        )
+        # VALIDATE не блокирует запись, а с проверенным CHECK
+        # SET NOT NULL не сканирует таблицу под ACCESS EXCLUSIVE
+        op.execute(
+            f'ALTER TABLE borrowed_books VALIDATE CONSTRAINT {DUE_DATE_CHECK}'
+        )
+        op.alter_column('borrowed_books', 'due_date', nullable=False)
+        op.execute(
+            f'ALTER TABLE borrowed_books DROP CONSTRAINT {DUE_DATE_CHECK}'
+        )
+        drop_invalid_index('ix_borrowed_books_due_active')
+        op.create_index(
+            'ix_borrowed_books_due_active',
+            'borrowed_books',
+            ['due_date', 'id'],
+            postgresql_where=sa.text('return_date IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+    op.create_table(
+        'overdue_state',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('checked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column(
+            'last_run_loans', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+    op.execute("INSERT INTO overdue_state (id) VALUES (1)")
+    op.create_table(
+        'reader_overdue',
+        sa.Column(
+            'reader_id',
+            sa.Integer(),
+            sa.ForeignKey('readers.id', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        sa.Column('overdue_loans', sa.Integer(), nullable=False),
+    )
+    op.create_index(
+        'ix_reader_overdue_loans', 'reader_overdue', ['overdue_loans']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reader_overdue_loans', table_name='reader_overdue')
+    op.drop_table('reader_overdue')
+    op.drop_table('overdue_state')
+    op.drop_index(
+        'ix_borrowed_books_due_active',
+        table_name='borrowed_books',
+        if_exists=True,
+    )
+    op.drop_column('borrowed_books', 'due_date', if_exists=True)
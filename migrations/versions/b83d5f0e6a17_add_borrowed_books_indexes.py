@@ -0,0 +1,92 @@
+"""Add borrowed_books indexes
+
+Revision ID: b83d5f0e6a17
+Revises: 7a4e1b9c3d52
+Create Date: 2026-10-18 13:02:26.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d5f0e6a17'
+down_revision: Union[str, None] = '7a4e1b9c3d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    'ix_borrowed_books_reader_active',
+    'ix_borrowed_books_book_reader_active',
+    'ix_borrowed_books_book_id',
+    'ix_borrowed_books_reader_id',
+)
+
+
+def drop_invalid_indexes(names) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID:
+    # IF NOT EXISTS его пропустил бы, поэтому удаляем и строим заново.
+    # В offline-режиме (--sql) каталог не прочитать
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = ANY(:names) AND NOT i.indisvalid"
+        ),
+        {'names': list(names)},
+    ).scalars()
+    for name in invalid:
+        op.drop_index(
+            name, table_name='borrowed_books', postgresql_concurrently=True
+        )
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует выдачу книг на время построения индекса,
+    # но не работает внутри транзакции. Индексы создаются вне транзакции
+    # миграции: при сбое позже ревизия не отмечена, а индексы уже есть,
+    # поэтому повторный upgrade их пропускает (IF NOT EXISTS)
+    with op.get_context().autocommit_block():
+        drop_invalid_indexes(INDEXES)
+        # Активные займы читателя: лимит в rent_book и /readers/{id}/borrowed
+        op.create_index(
+            'ix_borrowed_books_reader_active',
+            'borrowed_books',
+            ['reader_id'],
+            postgresql_where=sa.text('return_date IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Поиск открытого займа в return_book
+        op.create_index(
+            'ix_borrowed_books_book_reader_active',
+            'borrowed_books',
+            ['book_id', 'reader_id'],
+            postgresql_where=sa.text('return_date IS NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Внешние ключи: проверки при удалении книг и читателей
+        op.create_index(
+            'ix_borrowed_books_book_id',
+            'borrowed_books',
+            ['book_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_borrowed_books_reader_id',
+            'borrowed_books',
+            ['reader_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    for name in reversed(INDEXES):
+        op.drop_index(name, table_name='borrowed_books', if_exists=True)
@@ -0,0 +1,117 @@
+"""Add pre-aggregated circulation statistics tables
+
+Revision ID: b8e4f2a6c913
+Revises: a3d9c1e7f5b2
+Create Date: 2026-10-18 21:40:52.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f2a6c913'
+down_revision: Union[str, None] = 'a3d9c1e7f5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с src.stats.STATS_SHARDS на момент миграции
+STATS_SHARDS = 16
+
+
+def upgrade() -> None:
+    op.create_table(
+        'book_circulation',
+        sa.Column(
+            'book_id',
+            sa.Integer(),
+            sa.ForeignKey('books.id', ondelete='CASCADE'),
+            primary_key=True,
+        ),
+        sa.Column('loans', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column(
+            'active_loans', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+    op.create_index(
+        'ix_book_circulation_loans',
+        'book_circulation',
+        [sa.text('loans DESC'), 'book_id'],
+    )
+    op.create_table(
+        'circulation_daily',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('shard', sa.SmallInteger(), primary_key=True),
+        sa.Column('loans', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column(
+            'returns', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+    op.create_table(
+        'circulation_totals',
+        sa.Column('shard', sa.SmallInteger(), primary_key=True),
+        sa.Column(
+            'active_loans', sa.Integer(), nullable=False, server_default='0'
+        ),
+        sa.Column(
+            'active_readers', sa.Integer(), nullable=False, server_default='0'
+        ),
+        sa.Column(
+            'books_on_loan', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+
+    # Начальное заполнение - те же запросы, что в src.stats.rebuild_stats
+    op.execute(
+        """
+        INSERT INTO book_circulation (book_id, loans, active_loans)
+        SELECT book_id, count(*),
+            count(*) FILTER (WHERE return_date IS NULL)
+        FROM borrowed_books
+        GROUP BY book_id
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO circulation_daily (day, shard, loans, returns)
+        SELECT day, shard, sum(loans), sum(returns)
+        FROM (
+            SELECT borrow_date::date AS day,
+                reader_id % {STATS_SHARDS} AS shard, 1 AS loans, 0 AS returns
+            FROM borrowed_books
+            UNION ALL
+            SELECT return_date::date, reader_id % {STATS_SHARDS}, 0, 1
+            FROM borrowed_books
+            WHERE return_date IS NOT NULL
+        ) AS events
+        GROUP BY day, shard
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO circulation_totals
+            (shard, active_loans, active_readers, books_on_loan)
+        SELECT shards.shard, coalesce(active.loans, 0),
+            coalesce(active.readers, 0),
+            CASE WHEN shards.shard = 0 THEN (
+                SELECT count(*) FROM book_circulation WHERE active_loans > 0
+            ) ELSE 0 END
+        FROM generate_series(0, {STATS_SHARDS} - 1) AS shards (shard)
+        LEFT JOIN (
+            SELECT reader_id % {STATS_SHARDS} AS shard, count(*) AS loans,
+                count(DISTINCT reader_id) AS readers
+            FROM borrowed_books
+            WHERE return_date IS NULL
+            GROUP BY 1
+        ) AS active ON active.shard = shards.shard
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('circulation_totals')
+    op.drop_table('circulation_daily')
+    op.drop_index('ix_book_circulation_loans', table_name='book_circulation')
+    op.drop_table('book_circulation')
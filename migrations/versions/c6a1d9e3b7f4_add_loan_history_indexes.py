@@ -0,0 +1,82 @@
+"""Add loan history indexes on borrowed_books
+
+Revision ID: c6a1d9e3b7f4
+Revises: b8e4f2a6c913
+Create Date: 2026-10-18 23:05:17.402951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a1d9e3b7f4'
+down_revision: Union[str, None] = 'b8e4f2a6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HISTORY_INDEXES = {
+    'ix_borrowed_books_reader_history': ['reader_id', 'borrow_date', 'id'],
+    'ix_borrowed_books_book_history': ['book_id', 'borrow_date', 'id'],
+}
+FOREIGN_KEY_INDEXES = {
+    'ix_borrowed_books_book_id': ['book_id'],
+    'ix_borrowed_books_reader_id': ['reader_id'],
+}
+
+
+def drop_invalid_indexes(names) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID:
+    # IF NOT EXISTS его пропустил бы, поэтому удаляем и строим заново.
+    # В offline-режиме (--sql) каталог не прочитать
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = ANY(:names) AND NOT i.indisvalid"
+        ),
+        {'names': list(names)},
+    ).scalars()
+    for name in invalid:
+        op.drop_index(
+            name, table_name='borrowed_books', postgresql_concurrently=True
+        )
+
+
+def replace_indexes(create, drop) -> None:
+    # CONCURRENTLY не блокирует выдачу книг на время построения индекса,
+    # но не работает внутри транзакции. Индексы создаются вне транзакции
+    # миграции, поэтому при повторном запуске после сбоя уже созданные
+    # пропускаются (IF NOT EXISTS), а удалённые не мешают (IF EXISTS)
+    with op.get_context().autocommit_block():
+        drop_invalid_indexes(create)
+        for name, columns in create.items():
+            op.create_index(
+                name,
+                'borrowed_books',
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for name in drop:
+            op.drop_index(
+                name,
+                table_name='borrowed_books',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+
+
+def upgrade() -> None:
+    # /readers/{id}/loans и /books/{id}/loans: диапазон дат и курсор
+    # (borrow_date, id) внутри одного читателя или книги. Проверки
+    # внешних ключей используют первую колонку новых индексов
+    replace_indexes(HISTORY_INDEXES, FOREIGN_KEY_INDEXES)
+
+
+def downgrade() -> None:
+    replace_indexes(FOREIGN_KEY_INDEXES, HISTORY_INDEXES)
@@ -0,0 +1,75 @@
+"""Add active_loans and loan_limit to readers
+
+Revision ID: c92f7e4a1b68
+Revises: b83d5f0e6a17
+Create Date: 2026-10-18 13:40:02.774315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c92f7e4a1b68'
+down_revision: Union[str, None] = 'b83d5f0e6a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'readers',
+        sa.Column(
+            'active_loans', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+    op.add_column(
+        'readers',
+        sa.Column(
+            'loan_limit', sa.Integer(), nullable=False, server_default='3'
+        ),
+    )
+    op.execute(
+        """
+        UPDATE readers SET active_loans = loans.n
+        FROM (
+            SELECT reader_id, count(*) AS n FROM borrowed_books
+            WHERE return_date IS NULL GROUP BY reader_id
+        ) AS loans
+        WHERE loans.reader_id = readers.id
+        """
+    )
+    # Лимит - настройка читателя: превышения не исправляем молча, а
+    # перечисляем и останавливаем миграцию до ручного разбора
+    op.execute(
+        """
+        DO $$
+        DECLARE over_limit text;
+        BEGIN
+            SELECT string_agg(
+                format('%s (%s > %s)', id, active_loans, loan_limit),
+                ', ' ORDER BY id
+            ) INTO over_limit
+            FROM readers WHERE active_loans > loan_limit;
+            IF over_limit IS NOT NULL THEN
+                RAISE EXCEPTION
+                    'Займов больше loan_limit у читателей: %', over_limit
+                    USING HINT = 'Верните книги или поднимите loan_limit '
+                        'вручную и повторите миграцию';
+            END IF;
+        END $$
+        """
+    )
+    op.create_check_constraint(
+        'check_reader_active_loans',
+        'readers',
+        'active_loans >= 0 AND active_loans <= loan_limit',
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('check_reader_active_loans', 'readers', type_='check')
+    op.drop_column('readers', 'loan_limit')
+    op.drop_column('readers', 'active_loans')
@@ -0,0 +1,99 @@
+"""Add full-text and trigram search to books
+
+Revision ID: d41a8c6f2e93
+Revises: c92f7e4a1b68
+Create Date: 2026-10-18 14:22:53.061447
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a8c6f2e93'
+down_revision: Union[str, None] = 'c92f7e4a1b68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Конфигурация russian стеммит и кириллицу, и латиницу (english_stem).
+# Совпадает с src.models.book_search_vector: поиск использует индекс
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+TRIGRAM_INDEXES = {
+    'ix_books_title_trgm': 'title',
+    'ix_books_author_trgm': 'author',
+}
+
+
+def trigram_available() -> bool:
+    # pg_trgm из contrib есть не на каждом сервере; без него поиск
+    # работает без нечёткого режима (src.search.trigram_available).
+    # В offline-режиме (--sql) каталог не прочитать: SQL пишется полностью
+    if op.get_context().as_sql:
+        return True
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT EXISTS (SELECT 1 FROM pg_available_extensions "
+            "WHERE name = 'pg_trgm')"
+        )
+    ).scalar()
+
+
+def drop_invalid_indexes(names) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID:
+    # IF NOT EXISTS его пропустил бы, поэтому удаляем и строим заново
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = ANY(:names) AND NOT i.indisvalid"
+        ),
+        {'names': list(names)},
+    ).scalars()
+    for name in invalid:
+        op.drop_index(name, table_name='books', postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    # Индекс по выражению, а не хранимая колонка: ADD COLUMN ... STORED
+    # переписал бы books под ACCESS EXCLUSIVE. CONCURRENTLY не блокирует
+    # запись в books, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        drop_invalid_indexes(['ix_books_search_vector', *TRIGRAM_INDEXES])
+        op.create_index(
+            'ix_books_search_vector',
+            'books',
+            [sa.text(f'({SEARCH_VECTOR})')],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        if not trigram_available():
+            return
+        # Нечёткий поиск с опечатками по названию и автору
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, column in TRIGRAM_INDEXES.items():
+            op.create_index(
+                name,
+                'books',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    for name in ('ix_books_author_trgm', 'ix_books_title_trgm'):
+        op.drop_index(name, table_name='books', if_exists=True)
+    op.drop_index('ix_books_search_vector', table_name='books', if_exists=True)
+    # Колонка из прежней версии этой миграции, см. 5e9a2c7d4b31
+    op.drop_column('books', 'search_vector', if_exists=True)
@@ -0,0 +1,44 @@
+"""Add version and updated_at to books and readers
+
+Revision ID: e5c83a1f7b24
+Revises: d41a8c6f2e93
+Create Date: 2026-10-18 17:05:41.208913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c83a1f7b24'
+down_revision: Union[str, None] = 'd41a8c6f2e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Значения по умолчанию не volatile: Postgres не переписывает таблицы
+    for table in ('books', 'readers'):
+        op.add_column(
+            table,
+            sa.Column(
+                'version', sa.Integer(), nullable=False, server_default='1'
+            ),
+        )
+        op.add_column(
+            table,
+            sa.Column(
+                'updated_at',
+                sa.DateTime(),
+                nullable=False,
+                server_default=sa.text("timezone('utc', now())"),
+            ),
+        )
+
+
+def downgrade() -> None:
+    for table in ('readers', 'books'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
@@ -1,60 +1,201 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-import os
+from functools import lru_cache
+import threading
+import time
 from typing import Optional
-from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
 )
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db
 from src.models import UserModel
-from dotenv import load_dotenv
+from src.settings import get_settings
 
-load_dotenv()
+settings = get_settings()
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer_scheme = HTTPBearer(description="Enter JWT Bearer token", auto_error=False)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib и jose (через cryptography) заметно удлиняют импорт, а нужны
+    # только запросам с паролем или токеном
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+        bcrypt__max_rounds=settings.bcrypt_rounds,
+    )
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+class PasswordHashQueue:
+    """Ограниченный пул потоков для bcrypt со счётчиком очереди.
+
+    bcrypt отпускает GIL, поэтому потоков достаточно, чтобы хеширование
+    не блокировало event loop.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def _job(self, func, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func, *args):
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._job, func, args
+        )
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed_total": self.completed,
+            }
+
+
+password_hash_queue = PasswordHashQueue(settings.password_hash_concurrency)
+
+
+async def async_get_password_hash(password):
+    return await password_hash_queue.run(get_pwd_context().hash, password)
+
+
+async def async_verify_and_update_password(plain_password, hashed_password):
+    """Проверяет пароль вне event loop.
+
+    Возвращает ``(verified, new_hash)``; ``new_hash`` не ``None``, если
+    хеш создан с устаревшей стоимостью и его нужно сохранить.
+    """
+    return await password_hash_queue.run(
+        get_pwd_context().verify_and_update, plain_password, hashed_password
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    print(data);
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(
+        to_encode, settings.jwt_secret_key, algorithm=ALGORITHM
+    )
     return encoded_jwt
 
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """Снимок библиотекаря, не привязанный к сессии БД."""
+
+    id: int
+    email: str
+    token_version: int
+
+
+class UserCache:
+    """Небольшой TTL-кэш пользователей для проверки токенов."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return user
+
+    def put(self, db_user):
+        user = CurrentUser(
+            id=db_user.id,
+            email=db_user.email,
+            token_version=db_user.token_version,
+        )
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # Вытесняем самую старую запись (dict хранит порядок вставки)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    settings.auth_user_cache_ttl, settings.auth_user_cache_size
+)
+
+
+def create_user_token(user):
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -64,13 +205,28 @@ async def get_current_user(
         raise credentials_exception
     token = credentials.credentials
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(
+            token, settings.jwt_secret_key, algorithms=[ALGORITHM]
+        )
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(UserModel).filter(UserModel.email == email).first()
-    if user is None:
+    user_id = payload.get("uid")
+    if settings.auth_trust_token_claims and user_id is not None:
+        user = user_cache.get(user_id)
+        if user is None:
+            db_user = await db.get(UserModel, user_id)
+            if db_user is None:
+                raise credentials_exception
+            user = user_cache.put(db_user)
+    else:
+        user = await db.scalar(
+            select(UserModel).where(UserModel.email == email)
+        )
+        if user is None:
+            raise credentials_exception
+    if user.token_version != payload.get("ver", 0):
         raise credentials_exception
     return user
@@ -0,0 +1,288 @@
+import codecs
+import csv
+import json
+import re
+
+from pydantic import ValidationError
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+
+from src.cache import response_cache
+from src.models import BookModel
+from src.schemas import BookCreateSchema
+
+# Сколько ошибок по строкам возвращать в ответе; остальные только считаются
+MAX_REPORTED_ERRORS = 1000
+# Предел параметров одного запроса в протоколе PostgreSQL (asyncpg)
+MAX_QUERY_PARAMS = 32767
+
+JSON_CONTENT_TYPES = ("application/json",)
+NDJSON_CONTENT_TYPES = (
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+)
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+# Пробельные символы JSON (RFC 8259)
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class BulkFormatError(ValueError):
+    """Тело запроса нельзя разобрать дальше: импорт останавливается."""
+
+
+async def _iter_text(chunks, encoding="utf-8"):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _iter_lines(chunks, encoding="utf-8"):
+    buffer = ""
+    async for text in _iter_text(chunks, encoding):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_json_array(chunks):
+    """Разбирает JSON-массив объектов по мере поступления байтов.
+
+    Отдаёт пары ``(номер строки, объект)``; если элемент не объект,
+    вместо объекта отдаётся текст ошибки.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = finished = False
+    row = 0
+    async for text in _iter_text(chunks):
+        # Разобранное начало отбрасывается раз на кусок, внутри куска
+        # элементы читаются по позиции: срезы на каждый элемент делали
+        # разбор квадратичным от размера куска
+        buffer = buffer[position:] + text
+        position = 0
+        while True:
+            position = JSON_WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if not started:
+                if char != "[":
+                    raise BulkFormatError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if finished:
+                break
+            if char == "]":
+                finished = True
+                position += 1
+                continue
+            if char == ",":
+                position += 1
+                continue
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Элемент ещё не пришёл целиком
+                break
+            row += 1
+            yield row, value if isinstance(value, dict) else "Ожидался объект"
+    if not finished or buffer[position:].strip():
+        raise BulkFormatError(f"Некорректный JSON после элемента {row}")
+
+
+async def iter_ndjson(chunks):
+    row = 0
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, f"Некорректный JSON: {e.msg}"
+            continue
+        yield row, value if isinstance(value, dict) else "Ожидался объект"
+
+
+async def iter_csv(chunks):
+    """CSV с заголовком; пустые ячейки считаются незаданными полями."""
+    header = None
+    row = 0
+    record = ""
+    async for line in _iter_lines(chunks, encoding="utf-8-sig"):
+        # Перенос строки внутри кавычек: копим до закрытия кавычки
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, "Число колонок не совпадает с заголовком"
+            continue
+        yield row, {
+            name: value
+            for name, value in zip(header, values)
+            if value.strip() != ""
+        }
+    if record:
+        raise BulkFormatError("Незакрытая кавычка в конце CSV")
+
+
+def row_parser(content_type):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson
+    if media_type in CSV_CONTENT_TYPES:
+        return iter_csv
+    if media_type in JSON_CONTENT_TYPES:
+        return iter_json_array
+    return None
+
+
+def _format_validation_error(error):
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+class BookImport:
+    """Пакетная загрузка книг с upsert по ISBN и отчётом по строкам."""
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.received = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self._batch = []
+        self._batch_isbns = set()
+
+    def _fail(self, row, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": messages})
+
+    def report_format_error(self, message):
+        self._fail(self.received + 1, [message])
+
+    async def add(self, row, value):
+        self.received += 1
+        if isinstance(value, str):
+            self._fail(row, [value])
+            return
+        try:
+            book = BookCreateSchema.model_validate(value)
+        except ValidationError as e:
+            self._fail(row, [_format_validation_error(x) for x in e.errors()])
+            return
+        # Повтор ISBN внутри пакета: ON CONFLICT не обновляет строку дважды
+        # за один INSERT, поэтому сначала записываем накопленное
+        if book.isbn is not None and book.isbn in self._batch_isbns:
+            await self.flush()
+        # Только переданные поля: upsert не затирает незаданные колонки
+        # существующей книги значениями по умолчанию
+        self._batch.append((row, book.model_dump(exclude_unset=True)))
+        if book.isbn is not None:
+            self._batch_isbns.add(book.isbn)
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def _upsert(self, values):
+        stmt = insert(BookModel).values(values)
+        columns = {
+            column: stmt.excluded[column]
+            for column in values[0]
+            if column != "isbn"
+        }
+        if "copies_available" in columns:
+            # Для существующей книги copies_available из файла - поступившие
+            # экземпляры: часть остатка может быть на руках у читателей
+            columns["copies_available"] = (
+                BookModel.copies_available + columns["copies_available"]
+            )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_isbn",
+            # onupdate колонок не применяется к ON CONFLICT DO UPDATE
+            set_={
+                **columns,
+                "version": BookModel.version + 1,
+                "updated_at": func.timezone("utc", func.now()),
+            },
+        ).returning(
+            BookModel.id, literal_column("xmax = 0").label("inserted")
+        )
+        return (await self.db.execute(stmt)).all()
+
+    def _count(self, rows, updated_ids):
+        for book_id, inserted in rows:
+            if inserted:
+                self.inserted += 1
+            else:
+                self.updated += 1
+                updated_ids.append(book_id)
+
+    async def _write(self, batch, updated_ids):
+        try:
+            async with self.db.begin_nested():
+                rows = await self._upsert([values for _, values in batch])
+            self._count(rows, updated_ids)
+        except DBAPIError:
+            # Пакет отклонён целиком - повторяем по строке, чтобы найти
+            # виноватые и сохранить остальные
+            for row, values in batch:
+                try:
+                    async with self.db.begin_nested():
+                        rows = await self._upsert([values])
+                    self._count(rows, updated_ids)
+                except DBAPIError as e:
+                    self._fail(row, [str(e.orig).splitlines()[0]])
+
+    async def flush(self):
+        batch, self._batch = self._batch, []
+        self._batch_isbns = set()
+        if not batch:
+            return
+        # Многострочный INSERT требует одинаковых колонок у всех строк
+        groups = {}
+        for row, values in batch:
+            groups.setdefault(tuple(sorted(values)), []).append((row, values))
+        updated_ids = []
+        # Колонки со значением по умолчанию тоже уходят параметрами
+        size = MAX_QUERY_PARAMS // len(BookModel.__table__.columns)
+        for rows in groups.values():
+            for start in range(0, len(rows), size):
+                stop = start + size
+                await self._write(rows[start:stop], updated_ids)
+        await self.db.commit()
+        await response_cache.invalidate(
+            *(f"book:{book_id}" for book_id in updated_ids),
+            namespaces=("books",),
+        )
+
+    def result(self):
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
@@ -0,0 +1,242 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from src.settings import get_settings
+
+settings = get_settings()
+
+
+class CacheBackend(ABC):
+    """Хранилище ключ-значение с TTL. Значения - JSON-совместимые данные."""
+
+    @abstractmethod
+    async def get(self, key):
+        pass
+
+    @abstractmethod
+    async def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    async def delete(self, key):
+        pass
+
+    @abstractmethod
+    async def incr(self, key):
+        pass
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+    @abstractmethod
+    async def stats(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """LRU с TTL в памяти процесса."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+    async def incr(self, key):
+        value = (await self.get(key) or 0) + 1
+        await self.set(key, value, None)
+        return value
+
+    async def clear(self):
+        self._entries.clear()
+
+    async def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCache(CacheBackend):
+    """Общий для воркеров кэш поверх клиента redis.asyncio.
+
+    Клиент передаётся снаружи, поэтому в тестах его можно заменить
+    любым объектом с методами get/set/delete/incr/scan_iter/info. Все
+    ключи получают prefix: clear() удаляет только их, а не всю базу Redis.
+    """
+
+    # Сколько ключей удалять одной командой DEL при очистке
+    CLEAR_BATCH_SIZE = 1000
+    INFO_FIELDS = (
+        "keyspace_hits",
+        "keyspace_misses",
+        "evicted_keys",
+        "expired_keys",
+    )
+
+    def __init__(self, client, prefix=""):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix=""):
+        try:
+            import redis.asyncio as redis
+        except ImportError:  # redis нужен только для CACHE_BACKEND=redis
+            raise RuntimeError("Для CACHE_BACKEND=redis установите redis")
+        return cls(redis.from_url(url), prefix)
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(
+            self.prefix + key, json.dumps(value), ex=ttl or None
+        )
+
+    async def delete(self, key):
+        await self.client.delete(self.prefix + key)
+
+    async def incr(self, key):
+        return await self.client.incr(self.prefix + key)
+
+    async def clear(self):
+        # SCAN вместо KEYS: не блокирует Redis на большом числе ключей
+        batch = []
+        async for key in self.client.scan_iter(
+            match=f"{self.prefix}*", count=self.CLEAR_BATCH_SIZE
+        ):
+            batch.append(key)
+            if len(batch) >= self.CLEAR_BATCH_SIZE:
+                await self.client.delete(*batch)
+                batch = []
+        if batch:
+            await self.client.delete(*batch)
+
+    async def stats(self):
+        # INFO stats - счётчики всего сервера Redis, а не только префикса
+        info = await self.client.info("stats")
+        return {field: info.get(field, 0) for field in self.INFO_FIELDS}
+
+
+class ResponseCache:
+    """Read-through кэш ответов: карточки записей и страницы списков.
+
+    У карточки (ключ без namespace, например ``book:1``) своё поколение,
+    у страниц списков - поколение пространства имён. Изменение записи
+    сменяет поколение её карточки и списков, но не трогает карточки
+    других записей: выдачи не сбрасывают весь кэш. Старые ключи больше
+    не читаются и истекают по TTL; значение, загруженное до изменения и
+    записанное после инвалидации, попадает под старое поколение и не
+    отдаётся.
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def _generation(self, key):
+        return await self.backend.get(f"{key}:generation") or 0
+
+    async def get_or_load(self, key, loader, namespace=None):
+        """Возвращает значение из кэша или из ``loader()``.
+
+        ``loader`` - корутина; ``None`` от неё не кэшируется. Без
+        ``namespace`` ключ зависит от поколения самого ключа, с ним - от
+        поколения пространства имён.
+        """
+        if self.backend is None:
+            return await loader()
+        if namespace is None:
+            key = f"{key}:{await self._generation(key)}"
+        else:
+            key = f"{namespace}:{await self._generation(namespace)}:{key}"
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            await self.backend.set(key, value, self.ttl)
+        return value
+
+    async def invalidate(self, *keys, namespaces=()):
+        """Сменяет поколение ключей ``keys`` и пространств имён.
+
+        Счётчик поколения ключа - один на запись, а не на запрос, поэтому
+        их не больше, чем записей.
+        """
+        if self.backend is None:
+            return
+        for key in keys:
+            generation = await self.backend.incr(f"{key}:generation")
+            # Прежнее поколение удаляется, чтобы не занимать место до
+            # истечения TTL; новое - на случай, если счётчик сбросился
+            # (вытеснение, clear) и под ним осталось старое значение
+            await self.backend.delete(f"{key}:{generation - 1}")
+            await self.backend.delete(f"{key}:{generation}")
+        for namespace in namespaces:
+            await self.backend.incr(f"{namespace}:generation")
+
+    async def clear(self):
+        self.hits = self.misses = 0
+        if self.backend is not None:
+            await self.backend.clear()
+
+    async def stats(self):
+        stats = {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+        if self.backend is not None:
+            stats.update(await self.backend.stats())
+        return stats
+
+
+def create_cache_backend(name=None):
+    # memory - LRU в памяти воркера, redis - общий кэш, none - выключен
+    name = name or settings.cache_backend
+    if name == "none":
+        return None
+    if name == "redis":
+        return RedisCache.from_url(
+            settings.cache_url, settings.cache_key_prefix
+        )
+    return MemoryCache(settings.cache_max_entries)
+
+
+# memory-бэкенд - только для одного воркера (src.server проверяет это)
+response_cache = ResponseCache(create_cache_backend(), settings.cache_ttl)
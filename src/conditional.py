@@ -0,0 +1,92 @@
+import hashlib
+import json
+import re
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Response, status
+
+# Версия - int4, длиннее 9 цифр заведомо не совпадёт
+VERSION_ETAG = re.compile(r'"(\d{1,9})"')
+
+
+def version_etag(version):
+    return f'"{version}"'
+
+
+def content_etag(data):
+    """ETag по содержимому ответа - для списков, у которых нет версии."""
+    body = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+
+def http_date(value):
+    # В базе наивное UTC-время
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _parse_etags(header, weak=True):
+    tags = {tag.strip() for tag in header.split(",")}
+    if weak:
+        # Слабое сравнение для If-None-Match: W/"1" совпадает с "1"
+        tags = {tag.removeprefix("W/") for tag in tags}
+    return tags
+
+
+def _parse_http_date(header):
+    if not header:
+        return None
+    try:
+        value = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def validator_headers(etag, last_modified=None):
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def conditional_get(request, response, etag, last_modified=None):
+    """Ставит ETag/Last-Modified и возвращает 304, если копия клиента
+    актуальна, иначе ``None``.
+
+    If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2).
+    """
+    headers = validator_headers(etag, last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _parse_etags(if_none_match)
+        fresh = "*" in tags or etag in tags
+    else:
+        since = _parse_http_date(request.headers.get("if-modified-since"))
+        # Last-Modified передаётся с точностью до секунды
+        fresh = (
+            since is not None
+            and last_modified is not None
+            and last_modified.replace(microsecond=0) <= since
+        )
+    if not fresh:
+        response.headers.update(headers)
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def if_match_versions(request):
+    """Версии строки, допустимые по If-Match; ``None`` - условия нет.
+
+    Сравнение сильное: слабые и чужие ETag не совпадают ни с одной
+    версией, и пустое множество означает 412 для существующей строки.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return None
+    tags = _parse_etags(if_match, weak=False)
+    if "*" in tags:
+        return None
+    return {int(tag[1:-1]) for tag in tags if VERSION_ETAG.fullmatch(tag)}
@@ -1,17 +1,220 @@
-import os
-from sqlalchemy import create_engine
+import threading
+import time
+from functools import lru_cache
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.settings import get_settings
 
-load_dotenv()
+settings = get_settings()
 
-if os.getenv('ENVIRONMENT') == 'prod':
-    SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL_PROD")
-else: 
-    SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL_LOCAL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def make_async_url(url):
+    """Переводит синхронный URL Postgres на драйвер asyncpg."""
+    url = make_url(url)
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        url = url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+class PoolMetrics:
+    """Счётчики пула: выдачи соединений, ожидание и таймауты."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connects_total": self.connects,
+                "checkouts_total": self.checkouts,
+                "checkins_total": self.checkins,
+                "timeouts_total": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class _TimedPoolMixin:
+    # Объект метрик задаётся атрибутом класса, чтобы пережить
+    # pool.recreate() при engine.dispose()
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - start, True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return conn
+
+
+def _timed_pool_class(base, metrics):
+    return type(
+        f"Timed{base.__name__}",
+        (_TimedPoolMixin, base),
+        {"metrics": metrics},
+    )
+
+
+def _attach_pool_events(engine, metrics):
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", on_checkin)
+
+
+def create_db_engine(url, is_async=False):
+    """Создаёт движок с настройками пула и таймаутов из окружения.
+
+    Метрики пула доступны через ``engine.pool.metrics`` и
+    :func:`pool_status`.
+    """
+    metrics = PoolMetrics()
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "query_cache_size": settings.db_statement_cache_size,
+    }
+    statement_timeout = settings.db_statement_timeout_ms
+    if is_async:
+        url = make_async_url(url).update_query_dict(
+            {
+                "prepared_statement_cache_size": str(
+                    settings.db_statement_cache_size
+                )
+            }
+        )
+        if statement_timeout:
+            options["connect_args"] = {
+                "server_settings": {
+                    "statement_timeout": str(statement_timeout)
+                }
+            }
+        options["poolclass"] = _timed_pool_class(
+            AsyncAdaptedQueuePool, metrics
+        )
+        db_engine = create_async_engine(url, **options)
+        _attach_pool_events(db_engine.sync_engine, metrics)
+    else:
+        if statement_timeout:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={statement_timeout}"
+            }
+        options["poolclass"] = _timed_pool_class(QueuePool, metrics)
+        db_engine = create_engine(url, **options)
+        _attach_pool_events(db_engine, metrics)
+    return db_engine
+
+
+def pool_status(db_engine):
+    """Текущее состояние пула и накопленные метрики ожидания."""
+    pool = db_engine.pool
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+    }
+    status.update(pool.metrics.snapshot())
+    return status
+
+
+# Движки создаются при первом обращении: импорт приложения не загружает
+# драйверы БД и не строит пулы, которые процессу могут не понадобиться
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _get_or_create_engine(name, is_async):
+    with _engines_lock:
+        db_engine = _engines.get(name)
+        if db_engine is None:
+            db_engine = _engines[name] = create_db_engine(
+                settings.database_url, is_async=is_async
+            )
+        return db_engine
+
+
+def get_engine():
+    """Синхронный движок: seed.py, reconcile и скрипты обслуживания."""
+    return _get_or_create_engine("sync", is_async=False)
+
+
+def get_async_engine():
+    """Асинхронный движок: все обработчики FastAPI."""
+    return _get_or_create_engine("async", is_async=True)
+
+
+def created_engines():
+    """Уже созданные в этом процессе движки по имени ("sync", "async")."""
+    with _engines_lock:
+        return dict(_engines)
+
+
+async def dispose_engines():
+    """Закрывает соединения всех созданных движков при остановке воркера."""
+    for db_engine in created_engines().values():
+        if isinstance(db_engine, AsyncEngine):
+            await db_engine.dispose()
+        else:
+            db_engine.dispose()
+
+
+@lru_cache(maxsize=None)
+def get_sessionmaker():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+@lru_cache(maxsize=None)
+def _async_sessionmaker():
+    return async_sessionmaker(
+        bind=get_async_engine(), autoflush=False, expire_on_commit=False
+    )
+
 
 Base = declarative_base()
+
+
+async def get_db():
+    async with _async_sessionmaker()() as db:
+        yield db
+
+
+def get_session_factory():
+    """Фабрика сессий для потоковых ответов, которые живут дольше get_db."""
+    return _async_sessionmaker()
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from src.models import BookModel, BorrowedBookModel, ReaderModel
+
+# Сколько строк забирать с серверного курсора за раз
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = {
+    "books": (
+        BookModel.id,
+        BookModel.title,
+        BookModel.author,
+        BookModel.year_published,
+        BookModel.isbn,
+        BookModel.copies_available,
+        BookModel.description,
+    ),
+    "readers": (
+        ReaderModel.id,
+        ReaderModel.name,
+        ReaderModel.email,
+        ReaderModel.loan_limit,
+        ReaderModel.active_loans,
+    ),
+    "loans": (
+        BorrowedBookModel.id,
+        BorrowedBookModel.book_id,
+        BorrowedBookModel.reader_id,
+        BorrowedBookModel.borrow_date,
+        BorrowedBookModel.due_date,
+        BorrowedBookModel.return_date,
+    ),
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _ndjson_chunk(rows):
+    return "".join(
+        json.dumps(row._asdict(), ensure_ascii=False, default=_json_default)
+        + "\n"
+        for row in rows
+    )
+
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _csv_header(columns):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(column.key for column in columns)
+    return buffer.getvalue()
+
+
+def export_statement(entity):
+    columns = EXPORT_COLUMNS[entity]
+    return (
+        select(*columns)
+        .order_by(columns[0])
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def loan_history_statement(conditions, descending=False):
+    """Займы по условиям в порядке (borrow_date, id) для потоковой отдачи."""
+    order = (BorrowedBookModel.borrow_date, BorrowedBookModel.id)
+    if descending:
+        order = [column.desc() for column in order]
+    return (
+        select(*EXPORT_COLUMNS["loans"])
+        .where(*conditions)
+        .order_by(*order)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+async def stream_rows(session_factory, stmt, columns, fmt, compress=False):
+    """Отдаёт выгрузку кусками по мере чтения серверного курсора.
+
+    Сессия открывается здесь, а не через get_db: зависимости FastAPI
+    закрываются до начала отправки тела StreamingResponse.
+    """
+    encode = _ndjson_chunk if fmt == "ndjson" else _csv_chunk
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def pack(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    if fmt == "csv":
+        yield pack(_csv_header(columns))
+    async with session_factory() as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            chunk = pack(encode(rows))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
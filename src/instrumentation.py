@@ -0,0 +1,165 @@
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from src.settings import get_settings
+
+settings = get_settings()
+
+# Длина SQL в логах
+LOGGED_SQL_LENGTH = 500
+
+logger = logging.getLogger("library.requests")
+
+_request_stats = contextvars.ContextVar("request_query_stats", default=None)
+
+
+def _shorten(statement):
+    statement = " ".join(statement.split())
+    if len(statement) > LOGGED_SQL_LENGTH:
+        return statement[:LOGGED_SQL_LENGTH] + "..."
+    return statement
+
+
+class QueryStats:
+    """SQL, выполненный в рамках одного HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        self.statements[statement] += 1
+        if duration >= self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+    def repeated(self, threshold=None):
+        """Одинаковые запросы, выполненные больше ``threshold`` раз."""
+        if threshold is None:
+            threshold = settings.query_n_plus_one_threshold
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count > threshold
+        ]
+
+    def server_timing(self, elapsed):
+        return (
+            f'db;dur={self.total * 1000:.1f};desc="{self.count} queries", '
+            f"app;dur={elapsed * 1000:.1f}"
+        )
+
+
+def current_stats():
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    slow_ms = settings.query_slow_ms
+    if slow_ms and duration * 1000 >= slow_ms:
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_query",
+                    "duration_ms": round(duration * 1000, 1),
+                    "sql": _shorten(statement),
+                },
+                ensure_ascii=False,
+            )
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute при ошибке не вызывается
+    conn = context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware: считает SQL на запрос, отдаёт Server-Timing и пишет
+    по строке JSON-лога на каждый запрос.
+
+    Запросы из тела StreamingResponse попадают в лог, но не в заголовок:
+    он уходит до начала тела.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.server_timing_enabled:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing",
+                        stats.server_timing(time.perf_counter() - started),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            self.log(scope, status_code, stats, time.perf_counter() - started)
+
+    def log(self, scope, status_code, stats, elapsed):
+        record = {
+            "event": "request",
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 1),
+            "db_queries": stats.count,
+            "db_ms": round(stats.total * 1000, 1),
+        }
+        if stats.slowest_statement is not None:
+            record["slowest_ms"] = round(stats.slowest * 1000, 1)
+            record["slowest_sql"] = _shorten(stats.slowest_statement)
+        repeated = stats.repeated()
+        if repeated:
+            record["n_plus_one"] = [
+                {"sql": _shorten(statement), "count": count}
+                for statement, count in repeated
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
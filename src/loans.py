@@ -0,0 +1,218 @@
+from collections import Counter, defaultdict
+
+from fastapi import status
+from sqlalchemy import case, insert, select, tuple_, update
+
+from src.models import BookModel, BorrowedBookModel, ReaderModel
+from src.overdue import forget_returned
+from src.stats import record_rented, record_returned
+
+
+def _result(item, status_code, detail=None, loan=None):
+    return {
+        "book_id": item.book_id,
+        "reader_id": item.reader_id,
+        "status_code": status_code,
+        "detail": detail,
+        "loan": loan,
+    }
+
+
+async def _lock(db, columns, id_column, ids):
+    # Блокируем строки в порядке id: параллельные пакеты не взаимоблокируются
+    rows = await db.execute(
+        select(id_column, *columns)
+        .where(id_column.in_(sorted(ids)))
+        .order_by(id_column)
+        .with_for_update()
+    )
+    return {row[0]: list(row[1:]) for row in rows}
+
+
+async def _shift(db, model, column, deltas, sign):
+    """Меняет счётчик сразу у всех строк одним UPDATE через CASE по id.
+
+    Возвращает новые значения счётчика по id.
+    """
+    if not deltas:
+        return {}
+    rows = await db.execute(
+        update(model)
+        .where(model.id.in_(deltas))
+        .values(
+            {
+                column: getattr(model, column)
+                + sign * case(deltas, value=model.id)
+            }
+        )
+        .returning(model.id, getattr(model, column))
+        .execution_options(synchronize_session=False)
+    )
+    return dict(rows.all())
+
+
+def _summary(results):
+    succeeded = sum(1 for result in results if result["loan"] is not None)
+    return {
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+async def rent_books(db, items, now):
+    """Выдаёт пачку книг в одной транзакции с теми же правилами, что
+    /rent_book. Ошибочные позиции не отменяют остальные.
+    """
+    readers = await _lock(
+        db,
+        (ReaderModel.active_loans, ReaderModel.loan_limit),
+        ReaderModel.id,
+        {item.reader_id for item in items},
+    )
+    books = await _lock(
+        db,
+        (BookModel.copies_available,),
+        BookModel.id,
+        {item.book_id for item in items},
+    )
+
+    results = []
+    accepted = []
+    for item in items:
+        reader = readers.get(item.reader_id)
+        book = books.get(item.book_id)
+        if reader is None:
+            results.append(
+                _result(item, status.HTTP_404_NOT_FOUND, "Читатель не найден")
+            )
+        elif reader[0] >= reader[1]:
+            results.append(
+                _result(
+                    item,
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Читатель уже взял максимум {reader[1]} книги",
+                )
+            )
+        elif book is None:
+            results.append(
+                _result(item, status.HTTP_404_NOT_FOUND, "Книга не найдена")
+            )
+        elif book[0] <= 0:
+            results.append(
+                _result(
+                    item,
+                    status.HTTP_400_BAD_REQUEST,
+                    "Нет доступных экземпляров книги",
+                )
+            )
+        else:
+            reader[0] += 1
+            book[0] -= 1
+            accepted.append(len(results))
+            results.append(None)
+
+    if accepted:
+        rented = [items[index] for index in accepted]
+        active_loans = await _shift(
+            db,
+            ReaderModel,
+            "active_loans",
+            Counter(item.reader_id for item in rented),
+            1,
+        )
+        await _shift(
+            db,
+            BookModel,
+            "copies_available",
+            Counter(item.book_id for item in rented),
+            -1,
+        )
+        loans = (
+            await db.scalars(
+                insert(BorrowedBookModel).returning(
+                    BorrowedBookModel, sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        "book_id": item.book_id,
+                        "reader_id": item.reader_id,
+                        "borrow_date": now,
+                    }
+                    for item in rented
+                ],
+            )
+        ).all()
+        await record_rented(db, loans, active_loans)
+        for index, loan in zip(accepted, loans):
+            results[index] = _result(
+                items[index], status.HTTP_201_CREATED, loan=loan
+            )
+    return _summary(results)
+
+
+async def return_books(db, items, now):
+    """Возвращает пачку книг в одной транзакции. Повтор пары в пачке
+    закрывает следующий открытый займ этой книги у читателя.
+    """
+    open_loans = defaultdict(list)
+    pair = tuple_(BorrowedBookModel.book_id, BorrowedBookModel.reader_id)
+    rows = await db.execute(
+        select(
+            BorrowedBookModel.id,
+            BorrowedBookModel.book_id,
+            BorrowedBookModel.reader_id,
+        )
+        .where(
+            BorrowedBookModel.return_date.is_(None),
+            pair.in_({(item.book_id, item.reader_id) for item in items}),
+        )
+        .order_by(BorrowedBookModel.id)
+        .with_for_update()
+    )
+    for loan_id, book_id, reader_id in rows:
+        open_loans[book_id, reader_id].append(loan_id)
+
+    results = []
+    loan_ids = {}
+    for item in items:
+        pending = open_loans[item.book_id, item.reader_id]
+        if pending:
+            loan_ids[len(results)] = pending.pop(0)
+            results.append(None)
+        else:
+            results.append(
+                _result(
+                    item,
+                    status.HTTP_400_BAD_REQUEST,
+                    "Книга не была выдана этому читателю или уже возвращена",
+                )
+            )
+
+    if loan_ids:
+        returned = await db.scalars(
+            update(BorrowedBookModel)
+            .where(BorrowedBookModel.id.in_(loan_ids.values()))
+            .values(return_date=now)
+            .returning(BorrowedBookModel)
+            .execution_options(synchronize_session=False)
+        )
+        loans = {loan.id: loan for loan in returned}
+        await forget_returned(db, list(loans.values()), now)
+        closed = [items[index] for index in loan_ids]
+        readers = Counter(item.reader_id for item in closed)
+        books = Counter(item.book_id for item in closed)
+        # Читатели, затем книги, каждые по id - как в rent_books и
+        # /rent_book: UPDATE ... IN сам по себе порядок строк не задаёт
+        await _lock(db, (), ReaderModel.id, readers)
+        await _lock(db, (), BookModel.id, books)
+        active_loans = await _shift(
+            db, ReaderModel, "active_loans", readers, -1
+        )
+        await _shift(db, BookModel, "copies_available", books, 1)
+        await record_returned(db, list(loans.values()), active_loans)
+        for index, loan_id in loan_ids.items():
+            results[index] = _result(
+                items[index], status.HTTP_200_OK, loan=loans[loan_id]
+            )
+    return _summary(results)
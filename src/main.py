@@ -1,99 +1,224 @@
-from datetime import datetime, timedelta, timezone
-import os
-from typing import List
-from dotenv import load_dotenv
-load_dotenv()
-
-from sqlalchemy import and_
-from sqlalchemy.orm import Session, joinedload
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Literal, Optional
+
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from src.auth import (
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    create_access_token,
+    async_get_password_hash,
+    async_verify_and_update_password,
+    create_user_token,
     get_current_user,
-    get_password_hash,
-    verify_password,
+    password_hash_queue,
+    user_cache,
+)
+from src.bulk import (
+    CSV_CONTENT_TYPES,
+    JSON_CONTENT_TYPES,
+    NDJSON_CONTENT_TYPES,
+    BookImport,
+    BulkFormatError,
+    row_parser,
+)
+from src.cache import response_cache
+from src.conditional import (
+    conditional_get,
+    content_etag,
+    if_match_versions,
+    validator_headers,
+    version_etag,
+)
+from src.database import (
+    created_engines,
+    dispose_engines,
+    get_db,
+    get_session_factory,
+    pool_status,
+)
+from src.export import (
+    EXPORT_COLUMNS,
+    MEDIA_TYPES,
+    export_statement,
+    loan_history_statement,
+    stream_rows,
+)
+from src.instrumentation import QueryStatsMiddleware
+from src.loans import rent_books, return_books
+from src.metrics import (
+    LOANS_RENTED,
+    LOANS_RETURNED,
+    MetricsMiddleware,
+    mark_worker_stopped,
+    render_metrics,
 )
-from src.database import SessionLocal
 from src.models import BookModel, BorrowedBookModel, ReaderModel, UserModel
-from alembic.config import Config
-from alembic import command
+from src.overdue import forget_returned, overdue_summary, run_periodically
+from src.pagination import NEXT_CURSOR_HEADER, keyset_page, next_cursor
+from src.search import search_books
+from src.settings import get_settings
+from src.stats import (
+    circulation_totals,
+    daily_stats,
+    record_rented,
+    record_returned,
+    top_books,
+)
 
-from fastapi import FastAPI, Depends, Query, status, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi import (
+    APIRouter,
+    FastAPI,
+    Depends,
+    Query,
+    Request,
+    Response,
+    status,
+    HTTPException,
+)
 
 from src.schemas import (
     BookSchema,
     BookCreateSchema,
     BookUpdateSchema,
+    BulkImportResultSchema,
+    CirculationSchema,
+    DailyCirculationSchema,
     BorrowedBookCreateSchema,
     BorrowedBookReturnSchema,
     BorrowedBookSchema,
+    LoanBatchResultSchema,
+    LoanBatchSchema,
     LoginSchema,
+    OverdueLoanSchema,
+    OverdueSummarySchema,
     ReaderCreateSchema,
     ReaderSchema,
     ReaderUpdateSchema,
+    TopBookSchema,
     TokenSchema,
     UserCreateSchema,
     UserSchema,
 )
 
-app = FastAPI(
-    openapi_tags=[
-        {"name": "Auth", "description": "Аутентификация и регистрация"},
-        {
-            "name": "Loans",
-            "description": "Операции с выдачей и возвратом книг",
-        },
-        {"name": "Books", "description": "Операции с книгами"},
-        {"name": "Readers", "description": "Операции с читателями"},
-    ]
-)
+OPENAPI_TAGS = [
+    {"name": "Auth", "description": "Аутентификация и регистрация"},
+    {
+        "name": "Loans",
+        "description": "Операции с выдачей и возвратом книг",
+    },
+    {"name": "Books", "description": "Операции с книгами"},
+    {"name": "Readers", "description": "Операции с читателями"},
+    {"name": "Export", "description": "Потоковая выгрузка данных"},
+    {"name": "Stats", "description": "Статистика выдач"},
+    {"name": "System", "description": "Служебные эндпоинты"},
+]
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class DependencyOverrides:
+    """Переопределения зависимостей, общие для маршрутов и приложений.
+
+    Маршруты строятся один раз при импорте модуля, а create_app отдаёт
+    приложению готовые объекты: include_router собрал бы их заново.
+    """
+
+    dependency_overrides = {}
+
 
+router = APIRouter(dependency_overrides_provider=DependencyOverrides)
 
-# Автоматическое применение миграций при старте
-def apply_migrations():
-    alembic_cfg = Config("alembic.ini")
-    db_url = os.environ.get("DATABASE_URL_PROD") if os.environ.get("DATABASE_URL_PROD") == 'prod' else os.environ.get("DATABASE_URL_LOCAL")
-    alembic_cfg.set_main_option("sqlalchemy.url", db_url)
-    command.upgrade(alembic_cfg, "head")
-    print("Alembic migrations applied successfully")
 
-# Применяем миграции один раз при старте
-try:
-    apply_migrations()
-except Exception as e:
-    print(f"Failed to apply migrations: {e}")
+def utcnow():
+    # Колонки дат без таймзоны: asyncpg не принимает aware datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def naive_utc(value):
+    # Время из запроса с таймзоной приводится к UTC без неё, как в базе
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def versioned(schema, row):
+    # Данные ответа вместе с валидаторами для ETag и Last-Modified
+    return {
+        "data": schema.model_validate(row).model_dump(mode="json"),
+        "version": row.version,
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
+def if_match(stmt, model, request):
+    # Условие If-Match переносится в WHERE: проверка версии и запись
+    # выполняются одной командой без отдельной блокировки
+    versions = if_match_versions(request)
+    if versions is None:
+        return stmt
+    return stmt.where(model.version.in_(versions))
+
+
+async def not_found_or_modified(db, model, row_id, detail):
+    """Объясняет пустой RETURNING условного UPDATE: 404 или 412."""
+    if await db.get(model, row_id) is None:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=detail
+        )
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Ресурс изменён, получите актуальную версию",
+    )
+
+
+def conditional_entity(request, response, entry):
+    return conditional_get(
+        request,
+        response,
+        version_etag(entry["version"]),
+        datetime.fromisoformat(entry["updated_at"]),
+    )
+
+
+async def invalidate_books(*book_ids):
+    await response_cache.invalidate(
+        *(f"book:{book_id}" for book_id in book_ids), namespaces=("books",)
+    )
+
+
+async def invalidate_readers(*reader_ids):
+    await response_cache.invalidate(
+        *(f"reader:{reader_id}" for reader_id in reader_ids),
+        namespaces=("readers",),
+    )
 
 
 # Auth endpoints
-@app.post(
+@router.post(
     "/register",
     response_model=UserSchema,
     status_code=201,
     summary="Зарегистрировать библиотекаря",
     tags=["Auth"],
 )
-async def register(user: UserCreateSchema, db: Session = Depends(get_db)):
-    db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email уже занят")
-    db_user = UserModel(
-        email=user.email, password=get_password_hash(user.password)
+async def register(user: UserCreateSchema, db: AsyncSession = Depends(get_db)):
+    hashed_password = await async_get_password_hash(user.password)
+    # ON CONFLICT вместо проверочного SELECT: одна команда и нет гонки
+    # между проверкой и вставкой
+    db_user = await db.scalar(
+        insert(UserModel)
+        .values(email=user.email, password=hashed_password)
+        .on_conflict_do_nothing(index_elements=[UserModel.email])
+        .returning(UserModel)
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    if db_user is None:
+        raise HTTPException(status_code=400, detail="Email уже занят")
+    await db.commit()
     return db_user
 
 
-@app.post(
+@router.post(
     "/login",
     response_model=TokenSchema,
     summary="Войти и получить JWT",
@@ -101,59 +226,151 @@ async def register(user: UserCreateSchema, db: Session = Depends(get_db)):
 )
 async def login(
     form_data: LoginSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = (
-        db.query(UserModel).filter(UserModel.email == form_data.email).first()
+    user = await db.scalar(
+        select(UserModel).where(UserModel.email == form_data.email)
     )
-    if not user or not verify_password(form_data.password, user.password):
+    if not user:
         raise HTTPException(
             status_code=401, detail="Неверный email или пароль"
         )
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    verified, new_hash = await async_verify_and_update_password(
+        form_data.password, user.password
     )
+    if not verified:
+        raise HTTPException(
+            status_code=401, detail="Неверный email или пароль"
+        )
+    if new_hash:
+        # Стоимость bcrypt изменилась - сохраняем хеш с новой стоимостью
+        user.password = new_hash
+        await db.commit()
+        user_cache.invalidate(user.id)
+    access_token = create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Выйти на всех устройствах",
+    description="Отзывает все выданные библиотекарю токены",
+    tags=["Auth"],
+)
+async def logout(
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    await db.execute(
+        update(UserModel)
+        .where(UserModel.id == current_user.id)
+        .values(token_version=UserModel.token_version + 1)
+    )
+    await db.commit()
+    user_cache.invalidate(current_user.id)
+    return
+
+
 # Books Enpoints
-@app.get(
+@router.get(
     "/books",
     response_model=List[BookSchema],
     summary="Получить список всех книг",
-    description="Возвращает список всех книг в библиотеке",
+    description="Возвращает список всех книг в библиотеке. Курсор "
+    "следующей страницы передаётся в заголовке X-Next-Cursor. Поддерживает "
+    "If-None-Match",
     tags=["Books"],
 )
 async def read_books(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    sort: Literal["id", "title"] = Query("id"),
+    db: AsyncSession = Depends(get_db),
 ):
-    return db.query(BookModel).offset(skip).limit(limit).all()
+    async def load():
+        sort_column = getattr(BookModel, sort)
+        query = keyset_page(
+            select(BookModel), sort_column, BookModel.id, cursor, skip, limit
+        )
+        books, next_page = next_cursor(
+            (await db.scalars(query)).all(), sort_column, limit
+        )
+        page = {
+            "items": [
+                BookSchema.model_validate(book).model_dump(mode="json")
+                for book in books
+            ],
+            "cursor": next_page,
+        }
+        return {**page, "etag": content_etag(page)}
+
+    page = await response_cache.get_or_load(
+        f"{sort}:{skip}:{limit}:{cursor}", load, namespace="books"
+    )
+    not_modified = conditional_get(request, response, page["etag"])
+    if not_modified:
+        return not_modified
+    if page["cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["cursor"]
+    return page["items"]
 
 
-@app.get(
+@router.get(
+    "/books/search",
+    response_model=List[BookSchema],
+    summary="Поиск книг",
+    description="Ранжированный полнотекстовый поиск по названию, автору и "
+    "описанию; если ничего не найдено - нечёткий поиск по названию и "
+    "автору с учётом опечаток. Режим передаётся в заголовке X-Search-Mode, "
+    "курсор следующей страницы - в X-Next-Cursor",
+    tags=["Books"],
+)
+async def search_books_endpoint(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=255),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    db: AsyncSession = Depends(get_db),
+):
+    books, cursor, mode = await search_books(db, q, cursor, limit)
+    response.headers["X-Search-Mode"] = mode
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return books
+
+
+@router.get(
     "/books/{book_id}",
     response_model=BookSchema,
     summary="Получить книгу по ID",
-    description="Возвращает книгу по ее ID",
+    description="Возвращает книгу по ее ID. Поддерживает If-None-Match и "
+    "If-Modified-Since",
     tags=["Books"],
 )
 async def read_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    book = db.query(BookModel).filter(BookModel.id == book_id).first()
-    if book is None:
+    async def load():
+        book = await db.get(BookModel, book_id)
+        return None if book is None else versioned(BookSchema, book)
+
+    entry = await response_cache.get_or_load(f"book:{book_id}", load)
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Книга не найдена"
         )
-    return book
+    return conditional_entity(request, response, entry) or entry["data"]
 
 
-@app.post(
+@router.post(
     "/books",
     status_code=status.HTTP_201_CREATED,
     response_model=BookSchema,
@@ -163,42 +380,101 @@ async def read_book(
 )
 async def create_book(
     book: BookCreateSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_book = BookModel(**book.model_dump())
-    db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    db_book = await db.scalar(
+        insert(BookModel).values(**book.model_dump()).returning(BookModel)
+    )
+    await db.commit()
+    await invalidate_books()
     return db_book
 
 
-@app.put(
+@router.post(
+    "/books/bulk",
+    response_model=BulkImportResultSchema,
+    summary="Массовая загрузка книг",
+    description="Принимает JSON-массив, NDJSON или CSV с заголовком и "
+    "загружает книги пакетами с upsert по ISBN. Тело читается потоком; "
+    "ошибочные строки попадают в отчёт и не отменяют загрузку остальных",
+    tags=["Books"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                content_type: {}
+                for content_type in (
+                    JSON_CONTENT_TYPES
+                    + NDJSON_CONTENT_TYPES
+                    + CSV_CONTENT_TYPES
+                )
+            },
+        }
+    },
+)
+async def create_books_bulk(
+    request: Request,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    parse_rows = row_parser(request.headers.get("content-type"))
+    if parse_rows is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Поддерживаются JSON, NDJSON и CSV",
+        )
+    book_import = BookImport(db, batch_size)
+    try:
+        async for row, value in parse_rows(request.stream()):
+            await book_import.add(row, value)
+    except BulkFormatError as e:
+        if book_import.received == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+            )
+        # Уже разобранные строки сохраняем, разбор дальше невозможен
+        book_import.report_format_error(str(e))
+    await book_import.flush()
+    return book_import.result()
+
+
+@router.put(
     "/books/{book_id}",
     response_model=BookSchema,
     summary="Обновить книгу",
-    description="Обновляет информацию о книге",
+    description="Обновляет информацию о книге. С заголовком If-Match "
+    "обновление выполняется, только если ETag книги не изменился, иначе 412",
     tags=["Books"],
 )
 async def update_book(
     book_id: int,
     book: BookUpdateSchema,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_book = db.query(BookModel).filter(BookModel.id == book_id).first()
+    stmt = update(BookModel).where(BookModel.id == book_id)
+    db_book = await db.scalar(
+        if_match(stmt, BookModel, request)
+        .values(**book.model_dump(exclude_unset=True))
+        .returning(BookModel)
+    )
     if db_book is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Книга не найдена"
+        raise await not_found_or_modified(
+            db, BookModel, book_id, "Книга не найдена"
         )
-    for key, value in book.model_dump(exclude_unset=True).items():
-        setattr(db_book, key, value)
-    db.commit()
-    db.refresh(db_book)
+    await db.commit()
+    await invalidate_books(book_id)
+    response.headers.update(
+        validator_headers(version_etag(db_book.version), db_book.updated_at)
+    )
     return db_book
 
 
-@app.delete(
+@router.delete(
     "/books/{book_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Удалить книгу",
@@ -207,57 +483,248 @@ async def update_book(
 )
 async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_book = db.query(BookModel).filter(BookModel.id == book_id).first()
-    if db_book is None:
+    deleted = await db.scalar(
+        delete(BookModel)
+        .where(BookModel.id == book_id)
+        .returning(BookModel.id)
+    )
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Книга не найдена"
         )
-    db.delete(db_book)
-    db.commit()
+    await db.commit()
+    await invalidate_books(book_id)
     return
 
 
 # Readers Enpoints
-@app.get(
+@router.get(
     "/readers",
     response_model=List[ReaderSchema],
     summary="Получить список всех читателей",
-    description="Возвращает список всех читателей с пагинацией",
+    description="Возвращает список всех читателей с пагинацией. Курсор "
+    "следующей страницы передаётся в заголовке X-Next-Cursor",
     tags=["Readers"],
 )
 async def read_readers(
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    sort: Literal["id", "name"] = Query("id"),
     current_user: UserModel = Depends(get_current_user),
 ):
-    return db.query(ReaderModel).offset(skip).limit(limit).all()
+    async def load():
+        sort_column = getattr(ReaderModel, sort)
+        query = keyset_page(
+            select(ReaderModel),
+            sort_column,
+            ReaderModel.id,
+            cursor,
+            skip,
+            limit,
+        )
+        readers, next_page = next_cursor(
+            (await db.scalars(query)).all(), sort_column, limit
+        )
+        return {
+            "items": [
+                ReaderSchema.model_validate(reader).model_dump(mode="json")
+                for reader in readers
+            ],
+            "cursor": next_page,
+        }
+
+    page = await response_cache.get_or_load(
+        f"{sort}:{skip}:{limit}:{cursor}", load, namespace="readers"
+    )
+    if page["cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = page["cursor"]
+    return page["items"]
 
 
-@app.get(
+@router.get(
     "/readers/{reader_id}",
     response_model=ReaderSchema,
     summary="Получить читателя по ID",
-    description="Возвращает читателя по его ID",
+    description="Возвращает читателя по его ID. Поддерживает If-None-Match "
+    "и If-Modified-Since",
     tags=["Readers"],
 )
 async def read_reader(
     reader_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    reader = db.query(ReaderModel).filter(ReaderModel.id == reader_id).first()
-    if reader is None:
+    async def load():
+        reader = await db.get(ReaderModel, reader_id)
+        return None if reader is None else versioned(ReaderSchema, reader)
+
+    entry = await response_cache.get_or_load(f"reader:{reader_id}", load)
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Читатель не найден"
         )
-    return reader
+    return conditional_entity(request, response, entry) or entry["data"]
+
+
+async def loan_history(
+    owner_column,
+    owner_id,
+    response,
+    db,
+    session_factory,
+    date_from,
+    date_to,
+    order,
+    limit,
+    cursor,
+    format,
+    gzip,
+):
+    """Страница истории займов читателя или книги либо поток всей истории.
+
+    Фильтр по владельцу, диапазону borrow_date и курсор (borrow_date, id)
+    читаются одним диапазоном индекса ix_borrowed_books_*_history.
+    """
+    conditions = [owner_column == owner_id]
+    if date_from is not None:
+        conditions.append(
+            BorrowedBookModel.borrow_date >= naive_utc(date_from)
+        )
+    if date_to is not None:
+        conditions.append(BorrowedBookModel.borrow_date < naive_utc(date_to))
+    descending = order == "desc"
+
+    if format is not None:
+        # Длинная история уходит кусками с серверного курсора, без
+        # страниц и без загрузки всех строк в память
+        headers = {"Content-Encoding": "gzip"} if gzip else {}
+        return StreamingResponse(
+            stream_rows(
+                session_factory,
+                loan_history_statement(conditions, descending),
+                EXPORT_COLUMNS["loans"],
+                format,
+                compress=gzip,
+            ),
+            media_type=MEDIA_TYPES[format],
+            headers=headers,
+        )
+
+    query = keyset_page(
+        select(BorrowedBookModel).where(*conditions),
+        BorrowedBookModel.borrow_date,
+        BorrowedBookModel.id,
+        cursor,
+        0,
+        limit,
+        descending,
+    )
+    loans, next_page = next_cursor(
+        (await db.scalars(query)).all(),
+        BorrowedBookModel.borrow_date,
+        limit,
+        descending,
+    )
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return loans
 
 
-@app.get(
+LOAN_HISTORY_DESCRIPTION = (
+    "Займы по дате выдачи, по умолчанию от новых к старым; date_from и "
+    "date_to ограничивают дату выдачи [date_from, date_to). Курсор "
+    "следующей страницы передаётся в заголовке X-Next-Cursor. С format="
+    "ndjson или csv вся история отдаётся потоком без страниц"
+)
+
+
+@router.get(
+    "/readers/{reader_id}/loans",
+    response_model=List[BorrowedBookSchema],
+    summary="Получить историю займов читателя",
+    description=LOAN_HISTORY_DESCRIPTION,
+    tags=["Readers", "Loans"],
+)
+async def read_reader_loans(
+    reader_id: int,
+    response: Response,
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None),
+    gzip: bool = Query(False),
+    db: AsyncSession = Depends(get_db),
+    session_factory=Depends(get_session_factory),
+    current_user: UserModel = Depends(get_current_user),
+):
+    if await db.get(ReaderModel, reader_id) is None:
+        raise HTTPException(status_code=404, detail="Читатель не найден")
+    return await loan_history(
+        BorrowedBookModel.reader_id,
+        reader_id,
+        response,
+        db,
+        session_factory,
+        date_from,
+        date_to,
+        order,
+        limit,
+        cursor,
+        format,
+        gzip,
+    )
+
+
+@router.get(
+    "/books/{book_id}/loans",
+    response_model=List[BorrowedBookSchema],
+    summary="Получить историю займов книги",
+    description=LOAN_HISTORY_DESCRIPTION,
+    tags=["Books", "Loans"],
+)
+async def read_book_loans(
+    book_id: int,
+    response: Response,
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None),
+    gzip: bool = Query(False),
+    db: AsyncSession = Depends(get_db),
+    session_factory=Depends(get_session_factory),
+    current_user: UserModel = Depends(get_current_user),
+):
+    if await db.get(BookModel, book_id) is None:
+        raise HTTPException(status_code=404, detail="Книга не найдена")
+    return await loan_history(
+        BorrowedBookModel.book_id,
+        book_id,
+        response,
+        db,
+        session_factory,
+        date_from,
+        date_to,
+        order,
+        limit,
+        cursor,
+        format,
+        gzip,
+    )
+
+
+@router.get(
     "/readers/{reader_id}/borrowed",
     response_model=List[BookSchema],
     summary="Получить список книг, взятых читателем",
@@ -266,21 +733,20 @@ async def read_reader(
 )
 async def read_reader_borrowed(
     reader_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    reader = db.query(ReaderModel).filter(ReaderModel.id == reader_id).first()
+    reader = await db.get(ReaderModel, reader_id)
     if not reader:
         raise HTTPException(status_code=404, detail="Читатель не найден")
 
-    borrowed_entries = (
-        db.query(BorrowedBookModel)
-        .filter(
+    borrowed_entries = await db.scalars(
+        select(BorrowedBookModel)
+        .where(
             BorrowedBookModel.reader_id == reader_id,
             BorrowedBookModel.return_date.is_(None),
         )
         .options(joinedload(BorrowedBookModel.book))
-        .all()
     )
 
     books = [entry.book for entry in borrowed_entries]
@@ -288,7 +754,7 @@ async def read_reader_borrowed(
     return books
 
 
-@app.post(
+@router.post(
     "/readers",
     response_model=ReaderSchema,
     status_code=status.HTTP_201_CREATED,
@@ -298,62 +764,81 @@ async def read_reader_borrowed(
 )
 async def create_reader(
     reader: ReaderCreateSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_reader = ReaderModel(**reader.model_dump())
     try:
-        db.add(db_reader)
-        db.commit()
-        db.refresh(db_reader)
-        return db_reader
+        db_reader = await db.scalar(
+            insert(ReaderModel)
+            .values(**reader.model_dump())
+            .returning(ReaderModel)
+        )
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if "uq_reader_email" in str(e):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Читатель с таким email уже существует",
             )
         raise
+    await invalidate_readers()
+    return db_reader
 
 
-@app.put(
+@router.put(
     "/readers/{reader_id}",
     response_model=ReaderSchema,
     summary="Обновить читателя",
-    description="Обновляет информацию о читателе",
+    description="Обновляет информацию о читателе. С заголовком If-Match "
+    "обновление выполняется, только если ETag читателя не изменился, "
+    "иначе 412",
     tags=["Readers"],
 )
 async def update_reader(
     reader_id: int,
     reader: ReaderUpdateSchema,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_reader = (
-        db.query(ReaderModel).filter(ReaderModel.id == reader_id).first()
-    )
-    if db_reader is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Читатель не найден"
-        )
-    for key, value in reader.model_dump(exclude_unset=True).items():
-        setattr(db_reader, key, value)
+    stmt = update(ReaderModel).where(ReaderModel.id == reader_id)
     try:
-        db.commit()
-        db.refresh(db_reader)
-        return db_reader
+        db_reader = await db.scalar(
+            if_match(stmt, ReaderModel, request)
+            .values(**reader.model_dump(exclude_unset=True))
+            .returning(ReaderModel)
+        )
+        if db_reader is not None:
+            await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if "uq_reader_email" in str(e):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Читатель с таким email уже существует",
             )
+        if "check_reader_active_loans" in str(e):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Лимит меньше числа книг на руках у читателя",
+            )
         raise
+    if db_reader is None:
+        raise await not_found_or_modified(
+            db, ReaderModel, reader_id, "Читатель не найден"
+        )
+    await invalidate_readers(reader_id)
+    response.headers.update(
+        validator_headers(
+            version_etag(db_reader.version), db_reader.updated_at
+        )
+    )
+    return db_reader
 
 
-@app.delete(
+@router.delete(
     "/readers/{reader_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Удалить читателя",
@@ -362,23 +847,25 @@ async def update_reader(
 )
 async def delete_reader(
     reader_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    db_reader = (
-        db.query(ReaderModel).filter(ReaderModel.id == reader_id).first()
+    deleted = await db.scalar(
+        delete(ReaderModel)
+        .where(ReaderModel.id == reader_id)
+        .returning(ReaderModel.id)
     )
-    if db_reader is None:
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Читатель не найден"
         )
-    db.delete(db_reader)
-    db.commit()
+    await db.commit()
+    await invalidate_readers(reader_id)
     return
 
 
 # Loans Endpoints
-@app.post(
+@router.post(
     "/rent_book",
     response_model=BorrowedBookSchema,
     status_code=status.HTTP_201_CREATED,
@@ -388,59 +875,70 @@ async def delete_reader(
 )
 async def rent_book(
     borrow: BorrowedBookCreateSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    book = db.query(BookModel).filter(BookModel.id == borrow.book_id).first()
-    if book is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Книга не найдена"
+    # Лимит проверяется тем же UPDATE, что увеличивает счётчик: строка
+    # читателя блокируется, параллельные выдачи ему идут по очереди
+    active_loans = await db.scalar(
+        update(ReaderModel)
+        .where(
+            ReaderModel.id == borrow.reader_id,
+            ReaderModel.active_loans < ReaderModel.loan_limit,
         )
-    reader = (
-        db.query(ReaderModel)
-        .filter(ReaderModel.id == borrow.reader_id)
-        .first()
+        .values(active_loans=ReaderModel.active_loans + 1)
+        .returning(ReaderModel.active_loans)
     )
-    if reader is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Читатель не найден"
-        )
-
-    if book.copies_available < 1:
+    if active_loans is None:
+        reader = await db.get(ReaderModel, borrow.reader_id)
+        if reader is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Читатель не найден",
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Нет доступных экземпляров книги",
+            detail=f"Читатель уже взял максимум {reader.loan_limit} книги",
         )
 
-    active_borrows = (
-        db.query(BorrowedBookModel)
-        .filter(
-            and_(
-                BorrowedBookModel.reader_id == borrow.reader_id,
-                BorrowedBookModel.return_date.is_(None),
-            )
-        )
-        .count()
+    # Условный UPDATE: из двух выдач последнего экземпляра строку
+    # обновит только одна, вторая получит пустой RETURNING
+    book_id = await db.scalar(
+        update(BookModel)
+        .where(BookModel.id == borrow.book_id, BookModel.copies_available > 0)
+        .values(copies_available=BookModel.copies_available - 1)
+        .returning(BookModel.id)
     )
-    if active_borrows >= 3:
+    if book_id is None:
+        if await db.get(BookModel, borrow.book_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Книга не найдена",
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Читатель уже взял максимум 3 книги",
+            detail="Нет доступных экземпляров книги",
         )
 
-    book.copies_available -= 1
-    borrowed_book = BorrowedBookModel(
-        book_id=borrow.book_id,
-        reader_id=borrow.reader_id,
-        borrow_date=datetime.now(timezone.utc),
+    borrowed_book = await db.scalar(
+        insert(BorrowedBookModel)
+        .values(
+            book_id=borrow.book_id,
+            reader_id=borrow.reader_id,
+            borrow_date=utcnow(),
+        )
+        .returning(BorrowedBookModel)
     )
-    db.add(borrowed_book)
-    db.commit()
-    db.refresh(borrowed_book)
+    await record_rented(db, [borrowed_book], {borrow.reader_id: active_loans})
+    await db.commit()
+    LOANS_RENTED.inc()
+    # Изменились copies_available и active_loans
+    await invalidate_books(borrow.book_id)
+    await invalidate_readers(borrow.reader_id)
     return borrowed_book
 
 
-@app.post(
+@router.post(
     "/return_book",
     response_model=BorrowedBookSchema,
     summary="Вернуть книгу",
@@ -449,40 +947,364 @@ async def rent_book(
 )
 async def return_book(
     borrow: BorrowedBookReturnSchema,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    borrowed_book = (
-        db.query(BorrowedBookModel)
-        .filter(
+    now = utcnow()
+    # FOR UPDATE в подзапросе: повторный параллельный возврат того же
+    # займа дождётся первого и уже не найдёт открытую запись
+    open_loan = (
+        select(BorrowedBookModel.id)
+        .where(
             and_(
                 BorrowedBookModel.book_id == borrow.book_id,
                 BorrowedBookModel.reader_id == borrow.reader_id,
                 BorrowedBookModel.return_date.is_(None),
             )
         )
-        .first()
+        .limit(1)
+        .with_for_update()
+        .scalar_subquery()
+    )
+    borrowed_book = await db.scalar(
+        update(BorrowedBookModel)
+        .where(BorrowedBookModel.id == open_loan)
+        .values(return_date=now)
+        .returning(BorrowedBookModel)
     )
     if borrowed_book is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Книга не была выдана этому читателю или уже возвращена",
         )
+    await forget_returned(db, [borrowed_book], now)
 
-    book = db.query(BookModel).filter(BookModel.id == borrow.book_id).first()
-    if book is None:
+    # Книга и читатель существуют: на них ссылается открытый займ.
+    # Порядок блокировок как в rent_book - читатель, затем книга, -
+    # иначе встречные выдача и возврат взаимоблокируются
+    active_loans = await db.scalar(
+        update(ReaderModel)
+        .where(ReaderModel.id == borrow.reader_id)
+        .values(active_loans=ReaderModel.active_loans - 1)
+        .returning(ReaderModel.active_loans)
+    )
+    await db.execute(
+        update(BookModel)
+        .where(BookModel.id == borrow.book_id)
+        .values(copies_available=BookModel.copies_available + 1)
+    )
+    await record_returned(
+        db, [borrowed_book], {borrow.reader_id: active_loans}
+    )
+    await db.commit()
+    LOANS_RETURNED.inc()
+    await invalidate_books(borrow.book_id)
+    await invalidate_readers(borrow.reader_id)
+    return borrowed_book
+
+
+async def invalidate_loan_targets(result):
+    loans = [item["loan"] for item in result["results"] if item["loan"]]
+    if loans:
+        await invalidate_books(*{loan.book_id for loan in loans})
+        await invalidate_readers(*{loan.reader_id for loan in loans})
+
+
+@router.post(
+    "/rent_book/batch",
+    response_model=LoanBatchResultSchema,
+    summary="Выдать несколько книг",
+    description="Выдаёт до 100 книг за один запрос и одну транзакцию с "
+    "теми же проверками доступности и лимита, что и /rent_book. Результат "
+    "возвращается по каждой позиции; ошибочные не отменяют остальные",
+    tags=["Loans"],
+)
+async def rent_books_batch(
+    batch: LoanBatchSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    result = await rent_books(db, batch.items, utcnow())
+    await db.commit()
+    LOANS_RENTED.inc(result["succeeded"])
+    await invalidate_loan_targets(result)
+    return result
+
+
+@router.post(
+    "/return_book/batch",
+    response_model=LoanBatchResultSchema,
+    summary="Вернуть несколько книг",
+    description="Возвращает до 100 книг за один запрос и одну транзакцию. "
+    "Результат возвращается по каждой позиции",
+    tags=["Loans"],
+)
+async def return_books_batch(
+    batch: LoanBatchSchema,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    result = await return_books(db, batch.items, utcnow())
+    await db.commit()
+    LOANS_RETURNED.inc(result["succeeded"])
+    await invalidate_loan_targets(result)
+    return result
+
+
+@router.get(
+    "/loans/overdue",
+    response_model=List[OverdueLoanSchema],
+    summary="Получить просроченные займы",
+    description="Невозвращённые займы с истёкшим сроком, от самых давних. "
+    "Читается частичный индекс по сроку активных займов; курсор следующей "
+    "страницы передаётся в заголовке X-Next-Cursor",
+    tags=["Loans"],
+)
+async def read_overdue_loans(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Курсор из X-Next-Cursor"),
+    reader_id: Optional[int] = Query(None, ge=1),
+    current_user: UserModel = Depends(get_current_user),
+):
+    now = utcnow()
+    query = select(BorrowedBookModel).where(
+        BorrowedBookModel.return_date.is_(None),
+        BorrowedBookModel.due_date < now,
+    )
+    if reader_id is not None:
+        query = query.where(BorrowedBookModel.reader_id == reader_id)
+    query = keyset_page(
+        query,
+        BorrowedBookModel.due_date,
+        BorrowedBookModel.id,
+        cursor,
+        0,
+        limit,
+    )
+    loans, next_page = next_cursor(
+        (await db.scalars(query)).all(), BorrowedBookModel.due_date, limit
+    )
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return [
+        {
+            "id": loan.id,
+            "book_id": loan.book_id,
+            "reader_id": loan.reader_id,
+            "borrow_date": loan.borrow_date,
+            "due_date": loan.due_date,
+            "days_overdue": (now - loan.due_date).days,
+        }
+        for loan in loans
+    ]
+
+
+@router.get(
+    "/loans/overdue/summary",
+    response_model=OverdueSummarySchema,
+    summary="Сводка просрочек",
+    description="Число просроченных займов и читателей-должников по данным "
+    "фоновой задачи (обновляется раз в OVERDUE_JOB_INTERVAL секунд) и "
+    "читатели с наибольшим числом просрочек",
+    tags=["Loans"],
+)
+async def read_overdue_summary(
+    top: int = Query(10, ge=0, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    return await overdue_summary(db, top)
+
+
+# Stats Endpoints
+@router.get(
+    "/stats/daily",
+    response_model=List[DailyCirculationSchema],
+    summary="Выдачи и возвраты по дням",
+    description="Число выдач и возвратов за каждый день UTC периода, по "
+    "умолчанию - последние 30 дней. Период не длиннее 366 дней",
+    tags=["Stats"],
+)
+async def read_daily_stats(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    date_to = date_to or utcnow().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if not 0 <= (date_to - date_from).days < 366:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Книга не найдена"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Период должен быть от 1 до 366 дней",
         )
+    return await daily_stats(db, date_from, date_to)
 
-    borrowed_book.return_date = datetime.now(timezone.utc)
-    book.copies_available += 1
-    db.commit()
-    db.refresh(borrowed_book)
-    return borrowed_book
+
+@router.get(
+    "/stats/top-books",
+    response_model=List[TopBookSchema],
+    summary="Самые востребованные книги",
+    description="Книги с наибольшим числом выдач за всё время",
+    tags=["Stats"],
+)
+async def read_top_books(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    return await top_books(db, limit)
+
+
+@router.get(
+    "/stats/current",
+    response_model=CirculationSchema,
+    summary="Текущие показатели выдачи",
+    description="Книги на руках, читатели с невозвращёнными книгами и "
+    "число разных книг, выданных хотя бы в одном экземпляре",
+    tags=["Stats"],
+)
+async def read_current_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    return await circulation_totals(db)
+
+
+# Export Endpoints
+@router.get(
+    "/export/{entity}",
+    summary="Выгрузить книги, читателей или займы",
+    description="Потоковая выгрузка всей таблицы в NDJSON или CSV через "
+    "серверный курсор; при gzip=true ответ сжимается (Content-Encoding)",
+    tags=["Export"],
+    response_class=StreamingResponse,
+)
+async def export_entity(
+    entity: Literal["books", "readers", "loans"],
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False),
+    session_factory=Depends(get_session_factory),
+    current_user: UserModel = Depends(get_current_user),
+):
+    headers = {
+        "Content-Disposition": f'attachment; filename="{entity}.{format}"'
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_rows(
+            session_factory,
+            export_statement(entity),
+            EXPORT_COLUMNS[entity],
+            format,
+            compress=gzip,
+        ),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+
+# System Endpoints
+@router.get(
+    "/metrics",
+    summary="Метрики Prometheus",
+    description="Гистограммы задержек по маршрутам, запросы в работе, пулы "
+    "соединений, очередь bcrypt и счётчики выдач/возвратов в текстовом "
+    "формате Prometheus",
+    tags=["System"],
+    response_class=Response,
+)
+async def read_metrics(db: AsyncSession = Depends(get_db)):
+    body, content_type = await render_metrics(db)
+    return Response(content=body, media_type=content_type)
+
+
+@router.get(
+    "/system/pool",
+    summary="Состояние пулов соединений",
+    description="Размер, занятость и время ожидания пулов соединений БД "
+    "в текущем воркере",
+    tags=["System"],
+)
+async def read_pool_status(
+    current_user: UserModel = Depends(get_current_user),
+):
+    # Движки создаются лениво: в воркере API обычно есть только async
+    return {
+        name: pool_status(db_engine)
+        for name, db_engine in created_engines().items()
+    }
+
+
+@router.get(
+    "/system/password-hashing",
+    summary="Очередь хеширования паролей",
+    description="Загрузка пула потоков bcrypt в текущем воркере",
+    tags=["System"],
+)
+async def read_password_hashing_status(
+    current_user: UserModel = Depends(get_current_user),
+):
+    return password_hash_queue.snapshot()
+
+
+@router.get(
+    "/system/cache",
+    summary="Состояние кэша ответов",
+    description="Попадания, промахи и вытеснения кэша книг и читателей "
+    "в текущем воркере",
+    tags=["System"],
+)
+async def read_cache_status(
+    current_user: UserModel = Depends(get_current_user),
+):
+    return await response_cache.stats()
+
+
+@asynccontextmanager
+async def lifespan(application):
+    interval = get_settings().overdue_job_interval
+    overdue_job = (
+        asyncio.create_task(run_periodically(interval)) if interval else None
+    )
+    yield
+    if overdue_job is not None:
+        overdue_job.cancel()
+        with suppress(asyncio.CancelledError):
+            await overdue_job
+    # uvicorn вызывает shutdown после того, как дождался запросов в работе
+    # (SERVER_GRACEFUL_TIMEOUT): начатые выдачи и возвраты успевают
+    # закоммититься, и только затем закрываются пулы соединений
+    await dispose_engines()
+    mark_worker_stopped()
+
+
+def create_app():
+    """Собирает приложение: маршруты и middleware.
+
+    ``uvicorn src.main:create_app --factory`` или готовый ``src.main:app``.
+    Движки БД и контекст bcrypt создаются при первом запросе, которому
+    они нужны, а не здесь. Настройки общие для процесса
+    (:func:`src.settings.get_settings`), как и у остальных модулей.
+    """
+    application = FastAPI(
+        openapi_tags=OPENAPI_TAGS, routes=router.routes, lifespan=lifespan
+    )
+    application.dependency_overrides = DependencyOverrides.dependency_overrides
+    application.add_middleware(QueryStatsMiddleware)
+    application.add_middleware(MetricsMiddleware)
+    # Логирование настраивает процесс, а не импорт модуля:
+    # src.server передаёт uvicorn log_config
+    return application
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.environ.get("PORT", 8000))  # Render предоставляет PORT
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
+    from src.server import main
+
+    main()
@@ -0,0 +1,171 @@
+import os
+import time
+
+from src.settings import get_settings
+
+# prometheus_client выбирает хранилище значений по PROMETHEUS_MULTIPROC_DIR
+# при импорте, поэтому .env должен быть прочитан раньше
+settings = get_settings()
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import (  # noqa: E402
+    CounterMetricFamily,
+    GaugeMetricFamily,
+)
+
+from src.auth import password_hash_queue  # noqa: E402
+from src.database import created_engines, pool_status  # noqa: E402
+from src.stats import circulation_totals  # noqa: E402
+
+REQUEST_LATENCY = Histogram(
+    "library_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "group", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "library_http_requests_in_flight",
+    "Запросы, обрабатываемые прямо сейчас",
+    multiprocess_mode="livesum",
+)
+LOANS_RENTED = Counter("library_loans_rented_total", "Выданные книги")
+LOANS_RETURNED = Counter("library_loans_returned_total", "Возвращённые книги")
+ACTIVE_LOANS = Gauge(
+    "library_active_loans",
+    "Невозвращённые книги на момент последнего опроса /metrics",
+    multiprocess_mode="mostrecent",
+)
+
+
+# (ключ pool_status, тип, имя метрики, описание)
+POOL_METRICS = (
+    ("pool_size", GaugeMetricFamily, "size", "Размер пула соединений"),
+    ("checked_out", GaugeMetricFamily, "checked_out", "Выданные соединения"),
+    ("overflow", GaugeMetricFamily, "overflow", "Соединения сверх pool_size"),
+    ("checkouts_total", CounterMetricFamily, "checkouts", "Выдачи соединений"),
+    ("timeouts_total", CounterMetricFamily, "timeouts", "Таймауты ожидания"),
+    (
+        "wait_seconds_total",
+        CounterMetricFamily,
+        "wait_seconds",
+        "Суммарное ожидание соединения",
+    ),
+)
+PASSWORD_HASH_METRICS = (
+    ("queued", GaugeMetricFamily, "queued", "Хеширования bcrypt в очереди"),
+    ("running", GaugeMetricFamily, "running", "Хеширования bcrypt в работе"),
+    (
+        "completed_total",
+        CounterMetricFamily,
+        "completed",
+        "Выполненные хеширования bcrypt",
+    ),
+)
+
+
+class ProcessCollector:
+    """Состояние пулов соединений и очереди bcrypt текущего воркера.
+
+    Читается из памяти в момент опроса, без обращений к базе. Пулы
+    есть только у уже созданных движков: в воркере API это обычно async.
+    """
+
+    def collect(self):
+        pid = str(os.getpid())
+        for key, metric_class, name, help_text in POOL_METRICS:
+            metric = metric_class(
+                f"library_db_pool_{name}", help_text, labels=["engine", "pid"]
+            )
+            for label, db_engine in created_engines().items():
+                metric.add_metric([label, pid], pool_status(db_engine)[key])
+            yield metric
+
+        snapshot = password_hash_queue.snapshot()
+        for key, metric_class, name, help_text in PASSWORD_HASH_METRICS:
+            metric = metric_class(
+                f"library_password_hash_{name}", help_text, labels=["pid"]
+            )
+            metric.add_metric([pid], snapshot[key])
+            yield metric
+
+
+def _registry():
+    if settings.prometheus_multiproc_dir is None:
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(ProcessCollector())
+    return registry
+
+
+if settings.prometheus_multiproc_dir is None:
+    REGISTRY.register(ProcessCollector())
+
+
+def mark_worker_stopped():
+    """Убирает из livesum-метрик файлы остановленного воркера."""
+    if settings.prometheus_multiproc_dir is None:
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def route_group(route):
+    # Группа маршрута - его первый тег: books, readers, loans, auth...
+    tags = getattr(route, "tags", None)
+    return tags[0].lower() if tags else "other"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: гистограмма задержек по шаблону маршрута."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Шаблон пути, а не сам путь: id не раздувают число серий
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                route_group(route),
+                str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+async def render_metrics(db):
+    """Обновляет метрики из базы асинхронным запросом и сериализует все."""
+    # Счётчик из circulation_totals (STATS_SHARDS строк), а не count(*)
+    # по borrowed_books: опрос не зависит от числа активных займов
+    totals = await circulation_totals(db)
+    ACTIVE_LOANS.set(totals["active_loans"])
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,71 @@
+"""Применение миграций Alembic отдельной командой перед запуском воркеров.
+
+    python -m src.migrate              # upgrade head
+    python -m src.migrate --revision <rev>
+
+Несколько одновременных запусков (например, pre-start хук у каждого
+инстанса) безопасны: миграции выполняются под pg_advisory_lock, остальные
+процессы ждут и находят схему уже обновлённой.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from src.settings import get_settings
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+# Ключ advisory lock, общий для всех процессов, применяющих миграции
+MIGRATION_LOCK_ID = 7_246_018
+
+
+def alembic_config(url=None):
+    url = url or get_settings().database_url
+    config = Config(str(ALEMBIC_INI))
+    # configparser воспринимает % как интерполяцию
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def upgrade(revision="head", url=None):
+    url = url or get_settings().database_url
+    lock_engine = create_engine(url, poolclass=NullPool)
+    try:
+        # AUTOCOMMIT: соединение с блокировкой не держит открытую
+        # транзакцию, иначе CREATE INDEX CONCURRENTLY ждал бы его вечно
+        with lock_engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as conn:
+            conn.execute(
+                text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            try:
+                command.upgrade(alembic_config(url), revision)
+            finally:
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(:id)"),
+                    {"id": MIGRATION_LOCK_ID},
+                )
+    finally:
+        lock_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--revision", default="head")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    upgrade(args.revision)
+    print(
+        f"Миграции применены до {args.revision} "
+        f"за {time.perf_counter() - started:.2f} с"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,82 @@
+from datetime import timedelta
+
 from sqlalchemy import (
     Column,
+    Date,
     Integer,
+    SmallInteger,
     String,
     CheckConstraint,
     ForeignKey,
     DateTime,
+    Index,
     Text,
+    func,
+    literal_column,
+    text,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.schema import UniqueConstraint
 
 from src.database import Base
 
+DEFAULT_LOAN_LIMIT = 3
+# Срок выдачи книги в днях
+LOAN_PERIOD_DAYS = 14
+
+
+def default_due_date(context):
+    # Срок возврата, если он не передан явно: выдача + LOAN_PERIOD_DAYS
+    borrow_date = context.get_current_parameters()["borrow_date"]
+    return borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
+
+
+def book_search_vector(title, author, description):
+    """tsvector книги: название (A), автор (B) и описание (C).
+
+    Не хранится в таблице: GIN-индекс ix_books_search_vector построен по
+    этому же выражению. Константы - литералы, а не параметры запроса,
+    иначе планировщик не сопоставит выражение с индексом.
+    """
+
+    def weighted(column, weight):
+        # Конфигурация russian стеммит и кириллицу, и латиницу
+        return func.setweight(
+            func.to_tsvector(
+                literal_column("'russian'"),
+                func.coalesce(column, literal_column("''")),
+            ),
+            literal_column(f"'{weight}'"),
+        )
+
+    concat = weighted(title, "A").op("||", return_type=TSVECTOR)
+    return concat(weighted(author, "B")).op("||", return_type=TSVECTOR)(
+        weighted(description, "C")
+    )
+
+
+def version_column():
+    # Версия строки для ETag и If-Match; onupdate срабатывает и в ORM,
+    # и в Core update(), поэтому растёт при любом изменении строки
+    return Column(
+        Integer,
+        nullable=False,
+        default=1,
+        server_default="1",
+        onupdate=literal_column("version + 1"),
+    )
+
+
+def updated_at_column():
+    # Время в UTC без таймзоны, как и остальные колонки дат
+    return Column(
+        DateTime,
+        nullable=False,
+        server_default=text("timezone('utc', now())"),
+        onupdate=func.timezone("utc", func.now()),
+    )
+
 
 class BookModel(Base):
     __tablename__ = "books"
@@ -23,12 +88,25 @@ class BookModel(Base):
     isbn = Column(String, nullable=True)
     copies_available = Column(Integer, nullable=False, default=1)
     description = Column(Text, nullable=True)
+    version = version_column()
+    updated_at = updated_at_column()
+    # deferred - вектор не вычисляется в обычных запросах
+    search_vector = column_property(
+        book_search_vector(title, author, description), deferred=True
+    )
 
+    # Триграммные индексы создаёт миграция d41a8c6f2e93, если pg_trgm есть
     __table_args__ = (
         UniqueConstraint("isbn", name="uq_isbn"),
         CheckConstraint(
             "copies_available >= 0", name="check_copies_available"
         ),
+        Index("ix_books_title_id", "title", "id"),
+        Index(
+            "ix_books_search_vector",
+            book_search_vector(title, author, description),
+            postgresql_using="gin",
+        ),
     )
 
 
@@ -38,8 +116,27 @@ class ReaderModel(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     email = Column(String, nullable=False)
+    # Счётчик невозвращённых книг, ведётся в rent_book/return_book
+    active_loans = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    loan_limit = Column(
+        Integer,
+        nullable=False,
+        default=DEFAULT_LOAN_LIMIT,
+        server_default=str(DEFAULT_LOAN_LIMIT),
+    )
+    version = version_column()
+    updated_at = updated_at_column()
 
-    __table_args__ = (UniqueConstraint("email", name="uq_reader_email"),)
+    __table_args__ = (
+        UniqueConstraint("email", name="uq_reader_email"),
+        Index("ix_readers_name_id", "name", "id"),
+        CheckConstraint(
+            "active_loans >= 0 AND active_loans <= loan_limit",
+            name="check_reader_active_loans",
+        ),
+    )
 
 
 class BorrowedBookModel(Base):
@@ -49,10 +146,130 @@ class BorrowedBookModel(Base):
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
     reader_id = Column(Integer, ForeignKey("readers.id"), nullable=False)
     borrow_date = Column(DateTime, nullable=False)
+    due_date = Column(DateTime, nullable=False, default=default_due_date)
     return_date = Column(DateTime, nullable=True)
 
     book = relationship("BookModel")
 
+    __table_args__ = (
+        # Частичные индексы только по активным займам: история возвратов
+        # не раздувает их и не замедляет проверки лимита
+        Index(
+            "ix_borrowed_books_reader_active",
+            "reader_id",
+            postgresql_where=return_date.is_(None),
+        ),
+        Index(
+            "ix_borrowed_books_book_reader_active",
+            "book_id",
+            "reader_id",
+            postgresql_where=return_date.is_(None),
+        ),
+        # История займов читателя и книги по (borrow_date, id); первой
+        # колонкой индексы заменяют отдельные индексы внешних ключей
+        Index(
+            "ix_borrowed_books_reader_history",
+            "reader_id",
+            "borrow_date",
+            "id",
+        ),
+        Index(
+            "ix_borrowed_books_book_history",
+            "book_id",
+            "borrow_date",
+            "id",
+        ),
+        # /loans/overdue и задача сводки читают активные займы по сроку
+        Index(
+            "ix_borrowed_books_due_active",
+            "due_date",
+            "id",
+            postgresql_where=return_date.is_(None),
+        ),
+    )
+
+
+class OverdueStateModel(Base):
+    """Состояние задачи сводки просрочек: одна строка с id = 1."""
+
+    __tablename__ = "overdue_state"
+
+    id = Column(Integer, primary_key=True)
+    # Займы со сроком раньше этой отметки уже учтены в reader_overdue;
+    # NULL - сводка ещё не строилась
+    checked_until = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    # Сколько займов стали просроченными за последний запуск
+    last_run_loans = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
+
+class ReaderOverdueModel(Base):
+    """Число просроченных займов читателя; строки с нулём удаляются."""
+
+    __tablename__ = "reader_overdue"
+
+    reader_id = Column(
+        Integer,
+        ForeignKey("readers.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    overdue_loans = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_reader_overdue_loans", "overdue_loans"),)
+
+
+class BookCirculationModel(Base):
+    """Выдачи книги за всё время и сейчас; ведётся в rent/return."""
+
+    __tablename__ = "book_circulation"
+
+    book_id = Column(
+        Integer,
+        ForeignKey("books.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    loans = Column(Integer, nullable=False, default=0, server_default="0")
+    active_loans = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
+    __table_args__ = (
+        # /stats/top-books читает первые строки индекса
+        Index("ix_book_circulation_loans", loans.desc(), "book_id"),
+    )
+
+
+class CirculationDailyModel(Base):
+    """Выдачи и возвраты за день UTC, по строке на шард счётчика."""
+
+    __tablename__ = "circulation_daily"
+
+    day = Column(Date, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    loans = Column(Integer, nullable=False, default=0, server_default="0")
+    returns = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class CirculationTotalsModel(Base):
+    """Текущие итоги по шардам; значение - сумма строк."""
+
+    __tablename__ = "circulation_totals"
+
+    shard = Column(SmallInteger, primary_key=True)
+    active_loans = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Читатели, у которых есть невозвращённые книги
+    active_readers = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Книги, хотя бы один экземпляр которых сейчас на руках
+    books_on_loan = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
 
 class UserModel(Base):
     __tablename__ = "users"
@@ -60,3 +277,7 @@ class UserModel(Base):
     id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
+    # Увеличение версии отзывает все ранее выданные токены
+    token_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
@@ -0,0 +1,201 @@
+"""Инкрементальная сводка просроченных займов.
+
+    python -m src.overdue        # один запуск, например из cron
+
+Состояние - отметка checked_until: займы со сроком раньше неё уже учтены
+в reader_overdue. Запуск добавляет только займы, срок которых истёк между
+прошлой отметкой и текущим моментом, - это диапазон частичного индекса
+ix_borrowed_books_due_active, а не вся история займов. Возврат уже
+учтённого займа вычитается из сводки в транзакции возврата.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from src.database import dispose_engines, get_session_factory
+from src.models import BorrowedBookModel, OverdueStateModel, ReaderOverdueModel
+
+logger = logging.getLogger("library.overdue")
+
+STATE_ID = 1
+# Ключ advisory lock: при нескольких воркерах сводку обновляет один
+OVERDUE_LOCK_ID = 7_246_023
+
+
+async def refresh_overdue_summary(db, now):
+    """Учитывает займы, ставшие просроченными с прошлого запуска.
+
+    Возвращает их число или None, если сводку сейчас обновляет другой
+    процесс. Транзакция коммитится.
+    """
+    if not await db.scalar(
+        select(func.pg_try_advisory_xact_lock(OVERDUE_LOCK_ID))
+    ):
+        await db.rollback()
+        return None
+    await db.execute(
+        insert(OverdueStateModel).values(id=STATE_ID).on_conflict_do_nothing()
+    )
+    # FOR UPDATE ждёт возвраты, которые уже прочитали отметку (FOR KEY
+    # SHARE), и задерживает новые до коммита: займ не может быть
+    # одновременно учтён здесь и пропущен при возврате
+    state = await db.scalar(
+        select(OverdueStateModel)
+        .where(OverdueStateModel.id == STATE_ID)
+        .with_for_update()
+    )
+    since = state.checked_until
+    if since is not None and now <= since:
+        await db.rollback()
+        return 0
+
+    crossed = select(BorrowedBookModel.reader_id, func.count()).where(
+        BorrowedBookModel.return_date.is_(None),
+        BorrowedBookModel.due_date < now,
+    )
+    if since is not None:
+        crossed = crossed.where(BorrowedBookModel.due_date >= since)
+    counts = (
+        await db.execute(crossed.group_by(BorrowedBookModel.reader_id))
+    ).all()
+    if counts:
+        stmt = insert(ReaderOverdueModel)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ReaderOverdueModel.reader_id],
+                set_={
+                    "overdue_loans": ReaderOverdueModel.overdue_loans
+                    + stmt.excluded.overdue_loans
+                },
+            ),
+            [
+                {"reader_id": reader_id, "overdue_loans": n}
+                for reader_id, n in counts
+            ],
+        )
+    state.checked_until = now
+    state.last_run_at = now
+    state.last_run_loans = sum(n for _, n in counts)
+    await db.commit()
+    return state.last_run_loans
+
+
+async def forget_returned(db, loans, now):
+    """Вычитает из сводки возвращённые займы, которые задача уже учла.
+
+    Вызывается в транзакции возврата до commit. Возвраты в срок сводку
+    не читают и не блокируют.
+    """
+    overdue = [loan for loan in loans if loan.due_date < now]
+    if not overdue:
+        return
+    # KEY SHARE не конфликтует с другими возвратами, только с запуском
+    # задачи (FOR UPDATE)
+    checked_until = await db.scalar(
+        select(OverdueStateModel.checked_until)
+        .where(OverdueStateModel.id == STATE_ID)
+        .with_for_update(read=True, key_share=True)
+    )
+    if checked_until is None:
+        return
+    counted = Counter(
+        loan.reader_id for loan in overdue if loan.due_date < checked_until
+    )
+    if not counted:
+        return
+    await db.execute(
+        update(ReaderOverdueModel)
+        .where(ReaderOverdueModel.reader_id.in_(sorted(counted)))
+        .values(
+            overdue_loans=ReaderOverdueModel.overdue_loans
+            - case(counted, value=ReaderOverdueModel.reader_id)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(ReaderOverdueModel)
+        .where(
+            ReaderOverdueModel.reader_id.in_(sorted(counted)),
+            ReaderOverdueModel.overdue_loans <= 0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def overdue_summary(db, top=10):
+    state = await db.get(OverdueStateModel, STATE_ID)
+    totals = (
+        await db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(ReaderOverdueModel.overdue_loans), 0),
+            )
+        )
+    ).one()
+    readers = await db.execute(
+        select(ReaderOverdueModel.reader_id, ReaderOverdueModel.overdue_loans)
+        .order_by(
+            ReaderOverdueModel.overdue_loans.desc(),
+            ReaderOverdueModel.reader_id,
+        )
+        .limit(top)
+    )
+    return {
+        "checked_until": state.checked_until if state else None,
+        "last_run_at": state.last_run_at if state else None,
+        "last_run_loans": state.last_run_loans if state else 0,
+        "overdue_readers": totals[0],
+        "overdue_loans": totals[1],
+        "top_readers": [
+            {"reader_id": reader_id, "overdue_loans": n}
+            for reader_id, n in readers
+        ],
+    }
+
+
+def _utcnow():
+    # Колонки дат без таймзоны, как utcnow() в src.main
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def run_periodically(interval):
+    """Фоновая задача воркера: обновляет сводку раз в interval секунд.
+
+    Первый запуск - через interval после старта: воркеры не обращаются
+    к базе одновременно при развёртывании.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with get_session_factory()() as db:
+                crossed = await refresh_overdue_summary(db, _utcnow())
+        except Exception:
+            logger.exception("Не удалось обновить сводку просрочек")
+            continue
+        if crossed:
+            logger.info("Новых просроченных займов: %d", crossed)
+
+
+async def _run_once():
+    try:
+        async with get_session_factory()() as db:
+            return await refresh_overdue_summary(db, _utcnow())
+    finally:
+        await dispose_engines()
+
+
+def main():
+    crossed = asyncio.run(_run_once())
+    if crossed is None:
+        print("Сводку сейчас обновляет другой процесс.")
+    else:
+        print(f"Новых просроченных займов: {crossed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, tuple_
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа последней строки в непрозрачный курсор."""
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+    if not isinstance(values, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор",
+        )
+    return values
+
+
+def cursor_value(sort_column, values):
+    # Даты в курсоре хранятся строкой ISO: asyncpg ждёт datetime
+    value = values.get("value")
+    if isinstance(sort_column.type, DateTime) and value is not None:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный курсор",
+            )
+    return value
+
+
+def keyset_page(
+    query, sort_column, id_column, cursor, skip, limit, descending=False
+):
+    """Добавляет к запросу сортировку и условие продолжения страницы.
+
+    Без курсора работает как раньше через ``offset`` (legacy-режим), но с
+    детерминированным ORDER BY. Запрос выбирает ``limit + 1`` строк, чтобы
+    :func:`next_cursor` понял, есть ли следующая страница. При
+    ``descending`` строки идут по убыванию ключа.
+    """
+    if cursor is not None:
+        if skip:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Нельзя использовать skip вместе с cursor",
+            )
+        values = decode_cursor(cursor)
+        if (
+            values.get("sort") != sort_column.key
+            or "id" not in values
+            or values.get("desc", False) != descending
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует сортировке",
+            )
+        if sort_column is id_column:
+            key, last = id_column, values["id"]
+        else:
+            key = tuple_(sort_column, id_column)
+            last = tuple_(cursor_value(sort_column, values), values["id"])
+        query = query.where(key < last if descending else key > last)
+    elif skip:
+        query = query.offset(skip)
+    columns = (
+        (id_column,) if sort_column is id_column else (sort_column, id_column)
+    )
+    if descending:
+        columns = [column.desc() for column in columns]
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def next_cursor(rows, sort_column, limit, descending=False):
+    """Обрезает лишнюю строку и возвращает курсор следующей страницы."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    values = {"sort": sort_column.key, "id": last.id}
+    if sort_column.key != "id":
+        values["value"] = getattr(last, sort_column.key)
+    if descending:
+        values["desc"] = True
+    return rows, encode_cursor(values)
@@ -0,0 +1,91 @@
+import sys
+
+from sqlalchemy import text
+
+from src.database import get_sessionmaker
+
+# Фактическое число открытых займов каждого читателя
+ACTUAL_LOANS = """
+    SELECT readers.id, count(borrowed_books.id) AS n
+    FROM readers
+    LEFT JOIN borrowed_books
+        ON borrowed_books.reader_id = readers.id
+        AND borrowed_books.return_date IS NULL
+    GROUP BY readers.id
+"""
+
+# Читатели, у которых займов больше лимита: такой счётчик не пропустит
+# CHECK check_reader_active_loans, а лимит - настройка, а не счётчик.
+OVER_LIMIT_SQL = text(
+    f"""
+    SELECT readers.id, actual.n, readers.loan_limit
+    FROM readers JOIN ({ACTUAL_LOANS}) AS actual ON actual.id = readers.id
+    WHERE actual.n > readers.loan_limit
+    ORDER BY readers.id
+    """
+)
+
+# Пересчитывает readers.active_loans по borrowed_books одним запросом.
+RECONCILE_SQL = text(
+    f"""
+    UPDATE readers SET
+        active_loans = actual.n,
+        version = readers.version + 1,
+        updated_at = timezone('utc', now())
+    FROM ({ACTUAL_LOANS}) AS actual
+    WHERE actual.id = readers.id AND readers.active_loans <> actual.n
+    RETURNING readers.id, actual.n
+    """
+)
+
+
+class LoanLimitExceeded(ValueError):
+    """У читателей займов больше лимита: сверка не меняет ни одной строки."""
+
+    def __init__(self, readers):
+        self.readers = readers
+        super().__init__(
+            f"Займов больше лимита у читателей: {len(readers)}"
+        )
+
+
+def reconcile_active_loans(db):
+    """Исправляет расхождения счётчика и возвращает {reader_id: займов}.
+
+    Если у кого-то открытых займов больше loan_limit, поднимает
+    LoanLimitExceeded со списком (reader_id, займов, лимит) и ничего
+    не меняет: лимит правят вручную или возвращают книги.
+    """
+    over_limit = [tuple(row) for row in db.execute(OVER_LIMIT_SQL)]
+    if over_limit:
+        db.rollback()
+        raise LoanLimitExceeded(over_limit)
+    repaired = dict(db.execute(RECONCILE_SQL).all())
+    db.commit()
+    return repaired
+
+
+def main():
+    db = get_sessionmaker()()
+    try:
+        repaired = reconcile_active_loans(db)
+    except LoanLimitExceeded as e:
+        for reader_id, active_loans, loan_limit in e.readers:
+            print(
+                f"Читатель {reader_id}: займов {active_loans}, "
+                f"лимит {loan_limit}"
+            )
+        print(f"{e}. Счётчики не изменены.", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+    if repaired:
+        for reader_id, active_loans in sorted(repaired.items()):
+            print(f"Читатель {reader_id}: active_loans = {active_loans}")
+        print(f"Исправлено читателей: {len(repaired)}")
+    else:
+        print("Счётчики активных займов совпадают с borrowed_books.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import List, Optional
+
+from src.models import DEFAULT_LOAN_LIMIT
 
 
 class BookBaseSchema(BaseModel):
@@ -32,22 +34,38 @@ class BookSchema(BookBaseSchema):
         from_attributes = True
 
 
+class BulkImportErrorSchema(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class BulkImportResultSchema(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    failed: int
+    errors: List[BulkImportErrorSchema]
+
+
 class ReaderBaseSchema(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     email: EmailStr = Field(...)
 
 
 class ReaderCreateSchema(ReaderBaseSchema):
-    pass
+    loan_limit: int = Field(DEFAULT_LOAN_LIMIT, ge=0)
 
 
 class ReaderUpdateSchema(BaseModel):
     name: Optional[str] = Field(..., min_length=1, max_length=255)
     email: Optional[EmailStr] = None
+    loan_limit: Optional[int] = Field(None, ge=0)
 
 
 class ReaderSchema(ReaderBaseSchema):
     id: int
+    loan_limit: int
+    active_loans: int
 
     class Config:
         from_attributes = True
@@ -68,12 +86,75 @@ class BorrowedBookSchema(BaseModel):
     book_id: int
     reader_id: int
     borrow_date: datetime
+    due_date: datetime
     return_date: Optional[datetime]
 
     class Config:
         from_attributes = True
 
 
+class OverdueLoanSchema(BaseModel):
+    id: int
+    book_id: int
+    reader_id: int
+    borrow_date: datetime
+    due_date: datetime
+    days_overdue: int
+
+
+class ReaderOverdueSchema(BaseModel):
+    reader_id: int
+    overdue_loans: int
+
+
+class OverdueSummarySchema(BaseModel):
+    checked_until: Optional[datetime]
+    last_run_at: Optional[datetime]
+    last_run_loans: int
+    overdue_readers: int
+    overdue_loans: int
+    top_readers: List[ReaderOverdueSchema]
+
+
+class DailyCirculationSchema(BaseModel):
+    day: date
+    loans: int
+    returns: int
+
+
+class TopBookSchema(BaseModel):
+    book_id: int
+    title: str
+    author: str
+    loans: int
+
+
+class CirculationSchema(BaseModel):
+    active_loans: int
+    active_readers: int
+    books_on_loan: int
+
+
+class LoanBatchSchema(BaseModel):
+    items: List[BorrowedBookCreateSchema] = Field(
+        ..., min_length=1, max_length=100
+    )
+
+
+class LoanBatchItemResultSchema(BaseModel):
+    book_id: int
+    reader_id: int
+    status_code: int
+    detail: Optional[str] = None
+    loan: Optional[BorrowedBookSchema] = None
+
+
+class LoanBatchResultSchema(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[LoanBatchItemResultSchema]
+
+
 class UserCreateSchema(BaseModel):
     email: EmailStr
     password: str
@@ -0,0 +1,92 @@
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_, select, text
+
+from src.models import BookModel
+from src.pagination import decode_cursor, encode_cursor
+
+SEARCH_CONFIG = "russian"
+# Минимальная триграммная похожесть для нечёткого поиска (0..1)
+FUZZY_THRESHOLD = 0.3
+
+_trgm_available = None
+
+
+async def trigram_available(db):
+    """Проверяет один раз на процесс, установлено ли расширение pg_trgm."""
+    global _trgm_available
+    if _trgm_available is None:
+        _trgm_available = await db.scalar(
+            text(
+                "SELECT EXISTS "
+                "(SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+            )
+        )
+    return _trgm_available
+
+
+def _fulltext_score(q):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    score = func.ts_rank_cd(BookModel.search_vector, query)
+    return BookModel.search_vector.op("@@")(query), score
+
+
+def _fuzzy_score(q):
+    score = func.greatest(
+        func.similarity(BookModel.title, q),
+        func.similarity(BookModel.author, q),
+    )
+    # Оператор % использует GIN-индексы gin_trgm_ops
+    match = or_(BookModel.title.op("%")(q), BookModel.author.op("%")(q))
+    return and_(match, score >= FUZZY_THRESHOLD), score
+
+
+async def _search_page(db, mode, q, after, limit):
+    condition, score = (
+        _fulltext_score(q) if mode == "fulltext" else _fuzzy_score(q)
+    )
+    stmt = select(BookModel, score.label("score")).where(condition)
+    if after is not None:
+        # Keyset по (score DESC, id ASC)
+        stmt = stmt.where(
+            or_(
+                score < after["score"],
+                and_(score == after["score"], BookModel.id > after["id"]),
+            )
+        )
+    stmt = stmt.order_by(score.desc(), BookModel.id).limit(limit + 1)
+    return (await db.execute(stmt)).all()
+
+
+async def search_books(db, q, cursor, limit):
+    """Ранжированный поиск книг: полнотекстовый, без результатов - нечёткий.
+
+    Возвращает ``(книги, курсор следующей страницы, режим)``.
+    """
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if after.get("q") != q or after.get("mode") not in (
+            "fulltext",
+            "fuzzy",
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует запросу",
+            )
+        mode = after["mode"]
+    else:
+        mode = "fulltext"
+
+    rows = await _search_page(db, mode, q, after, limit)
+    if not rows and after is None and await trigram_available(db):
+        mode = "fuzzy"
+        rows = await _search_page(db, mode, q, None, limit)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_book, last_score = rows[-1]
+        next_cursor = encode_cursor(
+            {"mode": mode, "q": q, "score": last_score, "id": last_book.id}
+        )
+    return [book for book, _ in rows], next_cursor, mode
@@ -1,261 +1,506 @@
+"""Генератор синтетических данных: книги, читатели и история займов.
+
+    python -m src.seed                        # небольшая база для разработки
+    python -m src.seed --books 1000000 --readers 1000000 --loans 10000000
+    python -m src.seed --reset --seed 7 --return-rate 0.9 --workers 4
+
+Строки создаются блоками по BLOCK_SIZE, у каждого блока свой генератор
+random.Random от (seed, таблица, начало блока): одни и те же параметры
+дают одну и ту же базу при любом числе воркеров. Блоки загружаются через
+COPY параллельными процессами, затем остатки книг и счётчики читателей
+пересчитываются одним UPDATE на таблицу.
+"""
+
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
 
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
 
-from src.database import SessionLocal
-from src.models import BookModel, ReaderModel, BorrowedBookModel
+from src.models import DEFAULT_LOAN_LIMIT, LOAN_PERIOD_DAYS
+from src.settings import get_settings
+from src.stats import rebuild_stats
 
+BLOCK_SIZE = 50_000
+# Экземпляров книги в фонде: от 1 до MAX_COPIES
+MAX_COPIES = 10
+TABLES = ("books", "readers", "borrowed_books")
+# version и updated_at заполняет Postgres
+COLUMNS = {
+    "books": (
+        "id",
+        "title",
+        "author",
+        "year_published",
+        "isbn",
+        "copies_available",
+        "description",
+    ),
+    "readers": ("id", "name", "email"),
+    "borrowed_books": (
+        "id",
+        "book_id",
+        "reader_id",
+        "borrow_date",
+        "due_date",
+        "return_date",
+    ),
+}
 
-def seed_books(db):
-    if db.query(BookModel).count() > 0:
-        print("База уже содержит книги, пропускаем seeding книг.")
-        return
+FIRST_NAMES = (
+    "Anna", "Boris", "Clara", "Daniel", "Elena", "Fedor", "Grace", "Hugo",
+    "Irina", "Jacob", "Kira", "Leo", "Maria", "Nikita", "Olga", "Pavel",
+    "Quinn", "Rosa", "Sergey", "Tatiana", "Ulrich", "Vera", "Walter",
+    "Xenia", "Yuri", "Zoe",
+)  # fmt: skip
+LAST_NAMES = (
+    "Abbott", "Baker", "Carter", "Dunn", "Evans", "Fischer", "Gordon",
+    "Hayes", "Ivanov", "Jensen", "Kuznetsov", "Lopez", "Morozov", "Novak",
+    "Orlov", "Petrov", "Quinto", "Romanov", "Smirnov", "Turner", "Usova",
+    "Volkov", "Walker", "Xu", "Young", "Zaitsev",
+)  # fmt: skip
+ADJECTIVES = (
+    "Silent", "Hidden", "Broken", "Eternal", "Forgotten", "Golden",
+    "Last", "Lost", "Northern", "Practical", "Quiet", "Red", "Secret",
+    "Strange", "Distant", "Modern", "Ancient", "Clean", "Dark", "Wild",
+)  # fmt: skip
+NOUNS = (
+    "River", "Garden", "Algorithm", "Empire", "Winter", "Harbor",
+    "Library", "Machine", "Mountain", "Letters", "Station", "Code",
+    "Forest", "Kingdom", "Voyage", "Theory", "City", "Island", "Bridge",
+    "Archive",
+)  # fmt: skip
+TOPICS = (
+    "Memory", "Time", "Design", "the Sea", "Silence", "Systems", "Light",
+    "the North", "Numbers", "Glass", "Patterns", "Storms", "Fire",
+)  # fmt: skip
 
-    books = [
-        {
-            "title": "Clean Code",
-            "author": "Robert Martin",
-            "year_published": 2008,
-            "isbn": "9780132350884",
-            "copies_available": 3,
-        },
-        {
-            "title": "The Pragmatic Programmer",
-            "author": "Andrew Hunt, David Thomas",
-            "year_published": 1999,
-            "isbn": "9780201616224",
-            "copies_available": 2,
-        },
-        {
-            "title": "Design Patterns",
-            "author": "Erich Gamma, Richard Helm",
-            "year_published": 1994,
-            "isbn": "9780201633610",
-            "copies_available": 1,
-        },
-        {
-            "title": "Refactoring",
-            "author": "Martin Fowler",
-            "year_published": 1999,
-            "isbn": "9780201485677",
-            "copies_available": 4,
-        },
-        {
-            "title": "You Don't Know JS",
-            "author": "Kyle Simpson",
-            "year_published": 2015,
-            "isbn": "9781491924464",
-            "copies_available": 2,
-        },
-        {
-            "title": "The Art of Computer Programming",
-            "author": "Donald Knuth",
-            "year_published": 1968,
-            "isbn": "9780201896831",
-            "copies_available": 1,
-        },
-        {
-            "title": "Code Complete",
-            "author": "Steve McConnell",
-            "year_published": 2004,
-            "isbn": "9780735619678",
-            "copies_available": 3,
-        },
-        {
-            "title": "Introduction to Algorithms",
-            "author": "Thomas H. Cormen",
-            "year_published": 2009,
-            "isbn": "9780262033848",
-            "copies_available": 2,
-        },
-        {
-            "title": "Programming Pearls",
-            "author": "Jon Bentley",
-            "year_published": 1999,
-            "isbn": "9780201657883",
-            "copies_available": 1,
-        },
-        {
-            "title": "The Mythical Man-Month",
-            "author": "Frederick Brooks",
-            "year_published": 1995,
-            "isbn": "9780201835953",
-            "copies_available": 2,
-        },
-        {
-            "title": "Structure and Interpretation of Computer Programs",
-            "author": "Harold Abelson, Gerald Jay Sussman",
-            "year_published": 1996,
-            "isbn": "9780262510875",
-            "copies_available": 1,
-        },
-        {
-            "title": "Head First Design Patterns",
-            "author": "Eric Freeman, Elisabeth Robson",
-            "year_published": 2004,
-            "isbn": "9780596007126",
-            "copies_available": 3,
-        },
-        {
-            "title": "Cracking the Coding Interview",
-            "author": "Gayle Laakmann McDowell",
-            "year_published": 2015,
-            "isbn": "9780984782857",
-            "copies_available": 2,
-        },
-        {
-            "title": "Effective Java",
-            "author": "Joshua Bloch",
-            "year_published": 2017,
-            "isbn": "9780134685991",
-            "copies_available": 1,
-        },
-        {
-            "title": "The Clean Coder",
-            "author": "Robert Martin",
-            "year_published": 2011,
-            "isbn": "9780137081073",
-            "copies_available": 2,
-        },
-    ]
 
-    for book_data in books:
-        book = BookModel(**book_data)
-        db.add(book)
+@dataclass(frozen=True)
+class SeedOptions:
+    books: int = 1_000
+    readers: int = 500
+    loans: int = 10_000
+    seed: int = 42
+    # Доля возвращённых займов; остальные - активные
+    return_rate: float = 0.95
+    # Доля просроченных среди активных займов
+    overdue_rate: float = 0.2
+    # Доля возвращённых с опозданием
+    late_return_rate: float = 0.1
+    # Средняя просрочка в днях (экспоненциальное распределение)
+    overdue_mean_days: float = 14.0
+    history_days: int = 5 * 365
+    # Момент "сейчас" для дат займов: полночь UTC, без таймзоны
+    as_of: datetime = field(
+        default_factory=lambda: datetime.now(timezone.utc)
+        .replace(tzinfo=None)
+        .replace(hour=0, minute=0, second=0, microsecond=0)
+    )
 
-    db.commit()
-    print(f"Добавлено {len(books)} книг в базу.")
+    @property
+    def returned(self):
+        return round(self.loans * self.return_rate)
 
 
-def seed_readers(db):
-    if db.query(ReaderModel).count() > 0:
-        print("База уже содержит читателей, пропускаем seeding читателей.")
-        return
+def _rng(options, table, start):
+    return random.Random(f"{options.seed}:{table}:{start}")
+
 
+def _isbn(n):
+    # ISBN-13 с контрольной цифрой, уникален для каждого id
+    digits = f"978{n:09d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str(-total % 10)
+
+
+def book_copies(options, start, stop):
+    """Фонд книг блока [start, stop).
+
+    Свой генератор: active_loans() пересчитывает фонд без названий.
+    """
+    rng = _rng(options, "copies", start)
+    return [rng.randint(1, MAX_COPIES) for _ in range(start, stop)]
+
+
+@lru_cache(maxsize=None)
+def active_loans(options):
+    """Пары (book_id, reader_id) активных займов по порядку.
+
+    Каждый займ занимает свободный экземпляр книги и место в лимите
+    читателя: обе выборки - без возвращения из всех экземпляров фонда и
+    всех мест DEFAULT_LOAN_LIMIT, поэтому остатки и лимиты соблюдаются
+    без исправлений после загрузки. Считается один раз на процесс.
+    """
+    count = options.loans - options.returned
+    funds = []
+    for table, start, stop in blocks(options, TABLES[:1]):
+        funds += book_copies(options, start, stop)
+    bounds = list(accumulate(funds))
+    copies = bounds[-1] if bounds else 0
+    seats = options.readers * DEFAULT_LOAN_LIMIT
+    if count > min(copies, seats):
+        raise ValueError(
+            f"Активных займов {count}: экземпляров в фонде {copies}, "
+            f"мест в лимитах читателей {seats}"
+        )
+    rng = _rng(options, "active", 0)
+    books = [
+        bisect_right(bounds, copy) + 1
+        for copy in rng.sample(range(copies), count)
+    ]
     readers = [
-        {"name": "John Doe", "email": "john.doe@example.com"},
-        {"name": "Jane Smith", "email": "jane.smith@example.com"},
-        {"name": "Alice Johnson", "email": "alice.johnson@example.com"},
-        {"name": "Bob Brown", "email": "bob.brown@example.com"},
-        {"name": "Emma Wilson", "email": "emma.wilson@example.com"},
-        {"name": "Michael Chen", "email": "michael.chen@example.com"},
-        {"name": "Sarah Davis", "email": "sarah.davis@example.com"},
-        {"name": "David Lee", "email": "david.lee@example.com"},
-        {"name": "Laura Martinez", "email": "laura.martinez@example.com"},
-        {"name": "James Taylor", "email": "james.taylor@example.com"},
-        {"name": "Emily Clark", "email": "emily.clark@example.com"},
-        {"name": "William Harris", "email": "william.harris@example.com"},
-        {"name": "Olivia Lewis", "email": "olivia.lewis@example.com"},
-        {"name": "Thomas Walker", "email": "thomas.walker@example.com"},
-        {"name": "Sophia Young", "email": "sophia.young@example.com"},
+        seat // DEFAULT_LOAN_LIMIT + 1
+        for seat in rng.sample(range(seats), count)
     ]
+    return list(zip(books, readers))
 
-    for reader_data in readers:
-        reader = ReaderModel(**reader_data)
-        db.add(reader)
 
-    db.commit()
-    print(f"Добавлено {len(readers)} читателей в базу.")
+def book_rows(options, start, stop):
+    rng = _rng(options, "books", start)
+    copies = book_copies(options, start, stop)
+    for book_id in range(start + 1, stop + 1):
+        title = (
+            f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} "
+            f"of {rng.choice(TOPICS)}"
+        )
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        description = (
+            f"A {rng.choice(ADJECTIVES).lower()} story about "
+            f"{rng.choice(TOPICS).lower()} and the "
+            f"{rng.choice(NOUNS).lower()}."
+        )
+        yield (
+            book_id,
+            title,
+            author,
+            rng.randint(1900, options.as_of.year),
+            _isbn(book_id),
+            # Пока фонд; выданные экземпляры вычитаются в finalize()
+            copies[book_id - start - 1],
+            description,
+        )
 
 
-def seed_borrowed_books(db):
-    if db.query(BorrowedBookModel).count() > 0:
-        print("База уже содержит займы, пропускаем seeding займов.")
-        return
+def reader_rows(options, start, stop):
+    rng = _rng(options, "readers", start)
+    for reader_id in range(start + 1, stop + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (
+            reader_id,
+            f"{first} {last}",
+            f"{first}.{last}{reader_id}@example.com".lower(),
+        )
+
+
+def loan_rows(options, start, stop):
+    """Займы [start, stop): сначала возвращённые, затем активные.
+
+    История идёт по времени: чем больше id, тем позже выдача. Популярность
+    книг и активность читателей скошены к меньшим id. Книги и читатели
+    активных займов - из active_loans(); такие займы выданы в пределах
+    срока, просроченные - раньше, на экспоненциальное число дней.
+    """
+    rng = _rng(options, "borrowed_books", start)
+    as_of = options.as_of
+    returned = options.returned
+    history = options.history_days * 86400
+    period = LOAN_PERIOD_DAYS * 86400
+    overdue_mean = options.overdue_mean_days * 86400
+    loan_period = timedelta(days=LOAN_PERIOD_DAYS)
+    for loan_id in range(start + 1, stop + 1):
+        if loan_id <= returned:
+            book_id = int(options.books * rng.random() ** 2) + 1
+            reader_id = int(options.readers * rng.random() ** 1.5) + 1
+            if rng.random() < options.late_return_rate:
+                held = period + rng.expovariate(1 / overdue_mean)
+            else:
+                held = rng.uniform(3600, period)
+            age = max(history * (returned - loan_id) / returned, 0)
+            age += held + rng.uniform(0, 86400)
+            borrow_date = as_of - timedelta(seconds=int(age))
+            return_date = borrow_date + timedelta(seconds=int(held))
+        else:
+            book_id, reader_id = active_loans(options)[loan_id - returned - 1]
+            if rng.random() < options.overdue_rate:
+                age = period + rng.expovariate(1 / overdue_mean)
+            else:
+                age = rng.uniform(0, period)
+            borrow_date = as_of - timedelta(seconds=int(age) + 1)
+            return_date = None
+        due_date = borrow_date + loan_period
+        yield loan_id, book_id, reader_id, borrow_date, due_date, return_date
+
+
+ROWS = {
+    "books": book_rows,
+    "readers": reader_rows,
+    "borrowed_books": loan_rows,
+}
+
+
+@lru_cache(maxsize=None)
+def _engine(url):
+    # Соединение на блок: пул в процессе воркера не нужен
+    return create_engine(url, poolclass=NullPool)
 
-    borrows = [
-        {
-            "book_id": 1,
-            "reader_id": 1,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=10),
-            "return_date": None,
-        },
-        {
-            "book_id": 2,
-            "reader_id": 1,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=8),
-            "return_date": None,
-        },
-        {
-            "book_id": 3,
-            "reader_id": 2,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=5),
-            "return_date": datetime.now(timezone.utc) - timedelta(days=2),
-        },
-        {
-            "book_id": 4,
-            "reader_id": 3,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=7),
-            "return_date": None,
-        },
-        {
-            "book_id": 5,
-            "reader_id": 4,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=6),
-            "return_date": None,
-        },
-        {
-            "book_id": 6,
-            "reader_id": 5,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=4),
-            "return_date": datetime.now(timezone.utc) - timedelta(days=1),
-        },
-        {
-            "book_id": 7,
-            "reader_id": 6,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=3),
-            "return_date": None,
-        },
-        {
-            "book_id": 8,
-            "reader_id": 7,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=2),
-            "return_date": None,
-        },
-        {
-            "book_id": 9,
-            "reader_id": 8,
-            "borrow_date": datetime.now(timezone.utc) - timedelta(days=1),
-            "return_date": None,
-        },
-        {
-            "book_id": 10,
-            "reader_id": 9,
-            "borrow_date": datetime.now(timezone.utc),
-            "return_date": None,
-        },
+
+def copy_block(url, options, table, start, stop):
+    """Генерирует блок строк и загружает его одним COPY."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(ROWS[table](options, start, stop))
+    buffer.seek(0)
+    connection = _engine(url).raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(COLUMNS[table])}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        connection.commit()
+    finally:
+        connection.close()
+    return table, stop - start
+
+
+def blocks(options, tables):
+    for table in tables:
+        total = getattr(options, "loans" if table == TABLES[2] else table)
+        for start in range(0, total, BLOCK_SIZE):
+            yield table, start, min(start + BLOCK_SIZE, total)
+
+
+def load(url, options, tables, workers):
+    loaded = dict.fromkeys(tables, 0)
+    if workers == 1:
+        results = (
+            copy_block(url, options, *block)
+            for block in blocks(options, tables)
+        )
+        for table, rows in results:
+            loaded[table] += rows
+        return loaded
+    # spawn: воркерам не достаются соединения родительского процесса
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(copy_block, url, options, *block)
+            for block in blocks(options, tables)
+        ]
+        for future in as_completed(futures):
+            table, rows = future.result()
+            loaded[table] += rows
+    return loaded
+
+
+def is_empty(conn):
+    return not conn.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM books) "
+            "OR EXISTS (SELECT 1 FROM readers) "
+            "OR EXISTS (SELECT 1 FROM borrowed_books)"
+        )
+    ).scalar()
+
+
+def reset(conn):
+    # Библиотекари (users) остаются
+    conn.execute(
+        text(
+            "TRUNCATE borrowed_books, books, readers RESTART IDENTITY CASCADE"
+        )
+    )
+
+
+def drop_secondary(conn):
+    """Снимает внешние ключи и индексы без ограничений перед COPY.
+
+    Проверка FK на каждую строку и поддержка индексов (особенно GIN) в
+    разы медленнее, чем построение их целиком после загрузки. Возвращает
+    DDL для restore_secondary().
+    """
+    constraints = conn.execute(
+        text(
+            "SELECT conrelid::regclass::text, conname, "
+            "pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' "
+            "AND conrelid = ANY(CAST(:tables AS regclass[]))"
+        ),
+        {"tables": list(TABLES)},
+    ).all()
+    indexes = conn.execute(
+        text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() "
+            "AND tablename = ANY(:tables) AND indexname NOT IN "
+            "(SELECT conname FROM pg_constraint WHERE contype IN ('p', 'u'))"
+        ),
+        {"tables": list(TABLES)},
+    ).all()
+    for table, name, _ in constraints:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+    for name, _ in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    return [definition for _, definition in indexes] + [
+        f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'
+        for table, name, definition in constraints
     ]
 
-    for borrow_data in borrows:
-        borrow = BorrowedBookModel(**borrow_data)
-        book = (
-            db.query(BookModel)
-            .filter(BookModel.id == borrow_data["book_id"])
-            .first()
+
+def restore_secondary(engine, statements):
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL maintenance_work_mem = '512MB'"))
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def finalize(engine):
+    """Остатки книг, счётчики читателей и последовательности по займам."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE books SET copies_available = "
+                "books.copies_available - active.n "
+                "FROM (SELECT book_id, count(*) AS n FROM borrowed_books "
+                "WHERE return_date IS NULL GROUP BY book_id) AS active "
+                "WHERE active.book_id = books.id"
+            )
+        )
+        conn.execute(
+            text(
+                "UPDATE readers SET active_loans = active.n "
+                "FROM (SELECT reader_id, count(*) AS n FROM borrowed_books "
+                "WHERE return_date IS NULL GROUP BY reader_id) AS active "
+                "WHERE active.reader_id = readers.id"
+            )
         )
-        if (
-            book
-            and book.copies_available > 0
-            and borrow_data["return_date"] is None
-        ):
-            book.copies_available -= 1
-        db.add(borrow)
+        # Сводку просрочек следующий запуск задачи построит заново
+        conn.execute(text("DELETE FROM reader_overdue"))
+        conn.execute(
+            text(
+                "UPDATE overdue_state SET checked_until = NULL, "
+                "last_run_at = NULL, last_run_loans = 0"
+            )
+        )
+        for table in TABLES:
+            conn.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"coalesce((SELECT max(id) FROM {table}), 0) + 1, false)"
+                )
+            )
+        rebuild_stats(conn)
 
-    db.commit()
-    print(f"Добавлено {len(borrows)} займов в базу.")
 
+def generate(options, workers=1, url=None, reset_data=False):
+    """Заполняет базу; возвращает число строк по таблицам или None.
 
-def seed_all():
-    db = SessionLocal()
+    Непустую базу без reset_data не трогает.
+    """
+    url = url or get_settings().database_url
+    # Проверяет, что активные займы помещаются в фонд и лимиты, до
+    # изменений в базе; воркеры с workers=1 берут готовый результат
+    active_loans(options)
+    engine = _engine(url)
+    with engine.begin() as conn:
+        if reset_data:
+            reset(conn)
+        elif not is_empty(conn):
+            return None
+        secondary = drop_secondary(conn)
     try:
-        seed_books(db)
-        seed_readers(db)
-        seed_borrowed_books(db)
-    except Exception as e:
-        db.rollback()
-        print(f"Ошибка при seeding: {e}")
+        # Займы ссылаются на книги и читателей: сначала загружаем их
+        loaded = load(url, options, TABLES[:2], workers)
+        loaded.update(load(url, options, TABLES[2:], workers))
+        finalize(engine)
     finally:
-        db.close()
+        restore_secondary(engine, secondary)
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+    return loaded
+
+
+def main():
+    defaults = SeedOptions()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=defaults.books)
+    parser.add_argument("--readers", type=int, default=defaults.readers)
+    parser.add_argument("--loans", type=int, default=defaults.loans)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument(
+        "--return-rate", type=float, default=defaults.return_rate
+    )
+    parser.add_argument(
+        "--overdue-rate",
+        type=float,
+        default=defaults.overdue_rate,
+        help="доля просроченных среди активных займов",
+    )
+    parser.add_argument(
+        "--late-return-rate", type=float, default=defaults.late_return_rate
+    )
+    parser.add_argument(
+        "--overdue-mean-days", type=float, default=defaults.overdue_mean_days
+    )
+    parser.add_argument(
+        "--history-days", type=int, default=defaults.history_days
+    )
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        default=defaults.as_of,
+        help="дата отсчёта истории (UTC), по умолчанию - сегодня",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="очистить books, readers и borrowed_books перед заполнением",
+    )
+    args = parser.parse_args()
+
+    options = SeedOptions(
+        books=args.books,
+        readers=args.readers,
+        loans=args.loans,
+        seed=args.seed,
+        return_rate=args.return_rate,
+        overdue_rate=args.overdue_rate,
+        late_return_rate=args.late_return_rate,
+        overdue_mean_days=args.overdue_mean_days,
+        history_days=args.history_days,
+        as_of=args.as_of,
+    )
+    started = time.perf_counter()
+    try:
+        loaded = generate(
+            options, workers=args.workers, reset_data=args.reset
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if loaded is None:
+        print("База уже содержит данные; --reset очистит её перед seeding.")
+        return
+    print(
+        f"Добавлено книг: {loaded['books']}, читателей: {loaded['readers']}, "
+        f"займов: {loaded['borrowed_books']} "
+        f"за {time.perf_counter() - started:.1f} с."
+    )
 
 
 if __name__ == "__main__":
-    seed_all()
+    main()
@@ -0,0 +1,131 @@
+"""Продакшен-запуск: миграции, затем несколько воркеров uvicorn.
+
+    python -m src.server                      # WEB_CONCURRENCY воркеров
+    python -m src.server --workers 4 --skip-migrations
+
+Каждый воркер - отдельный процесс со своим event loop (uvloop), парсером
+HTTP (httptools) и пулом соединений, поэтому узел использует все ядра.
+По SIGTERM/SIGINT воркеры перестают принимать соединения, дожидаются
+запросов в работе (не дольше SERVER_GRACEFUL_TIMEOUT) и закрывают пулы.
+"""
+
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from src.settings import get_settings
+
+APP = "src.main:create_app"
+
+
+def log_config(settings):
+    """Конфигурация logging для uvicorn: применяется в каждом воркере.
+
+    Логи запросов - по строке JSON; уровень задаётся только логгерам
+    приложения, чтобы не включать INFO у библиотек.
+    """
+    config = copy.deepcopy(uvicorn.config.LOGGING_CONFIG)
+    config["formatters"]["message"] = {"format": "%(message)s"}
+    config["handlers"]["library"] = {
+        "formatter": "message",
+        "class": "logging.StreamHandler",
+        "stream": "ext://sys.stderr",
+    }
+    config["loggers"]["library"] = {
+        "handlers": ["library"],
+        "level": settings.log_level,
+        "propagate": False,
+    }
+    return config
+
+
+def uvicorn_options(settings, workers):
+    return {
+        "host": settings.host,
+        "port": settings.port,
+        "workers": workers,
+        "factory": True,
+        "loop": "uvloop",
+        "http": "httptools",
+        "backlog": settings.server_backlog,
+        "timeout_keep_alive": settings.server_keepalive,
+        "limit_concurrency": settings.server_limit_concurrency or None,
+        "timeout_graceful_shutdown": settings.server_graceful_timeout,
+        "proxy_headers": True,
+        # Строку лога на запрос пишет QueryStatsMiddleware
+        "access_log": False,
+        "log_level": settings.log_level.lower(),
+        "log_config": log_config(settings),
+    }
+
+
+def check_cache_backend(settings, workers):
+    """Не даёт запустить несколько воркеров с кэшем в памяти процесса.
+
+    Изменение сбрасывает кэш только в воркере, который его обработал,
+    остальные отдавали бы устаревшие книги и читателей до конца TTL.
+    """
+    if workers > 1 and settings.cache_backend == "memory":
+        raise ValueError(
+            f"CACHE_BACKEND=memory не разделяется между {workers} "
+            "воркерами: задайте CACHE_BACKEND=redis или none, "
+            "либо запустите один воркер"
+        )
+
+
+def prepare_metrics_dir(settings, workers):
+    """Готовит каталог prometheus_client для нескольких воркеров.
+
+    Без каталога каждый воркер отдавал бы в /metrics только свои
+    счётчики. Файлы прошлого запуска удаляются: иначе счётчики
+    продолжились бы с чужих значений.
+    """
+    path = settings.prometheus_multiproc_dir
+    if path is None:
+        if workers == 1:
+            return None
+        path = tempfile.mkdtemp(prefix="library-metrics-")
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+    # Воркеры наследуют окружение и читают переменную при импорте
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers", type=int, default=settings.web_concurrency
+    )
+    parser.add_argument(
+        "--skip-migrations",
+        action="store_true",
+        help="не применять миграции перед стартом воркеров",
+    )
+    args = parser.parse_args()
+    try:
+        check_cache_backend(settings, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.skip_migrations:
+        # Один раз в родительском процессе, а не в каждом воркере
+        from src.migrate import upgrade
+
+        upgrade()
+    metrics_dir = prepare_metrics_dir(settings, args.workers)
+    try:
+        uvicorn.run(APP, **uvicorn_options(settings, args.workers))
+    finally:
+        if metrics_dir and settings.prometheus_multiproc_dir is None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
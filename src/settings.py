@@ -0,0 +1,154 @@
+"""Настройки приложения из окружения и .env.
+
+.env читается один раз за процесс при первом вызове :func:`get_settings`;
+модули берут значения из общего объекта, а не из os.getenv.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _bool(name, default):
+    return os.getenv(name, default).lower() == "true"
+
+
+@dataclass(frozen=True)
+class Settings:
+    environment: str
+    database_url: Optional[str]
+
+    # Пул соединений: размер считается на один процесс (воркер uvicorn)
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: float
+    db_pool_recycle: int
+    db_pool_pre_ping: bool
+    # Кэш скомпилированных запросов SQLAlchemy и prepared statements asyncpg
+    db_statement_cache_size: int
+    # statement_timeout на стороне Postgres, 0 - без ограничения
+    db_statement_timeout_ms: int
+
+    jwt_secret_key: Optional[str]
+    # Доверять claims токена (uid, ver) и брать пользователя из кэша,
+    # не обращаясь к таблице users на каждый запрос
+    auth_trust_token_claims: bool
+    # Сколько секунд запись пользователя живёт в кэше; это же верхняя
+    # граница задержки отзыва токена в других воркерах
+    auth_user_cache_ttl: float
+    auth_user_cache_size: int
+    # Стоимость bcrypt: хеши с другой стоимостью перехешируются при логине
+    bcrypt_rounds: int
+    # Сколько хеширований bcrypt может идти одновременно в одном воркере
+    password_hash_concurrency: int
+
+    # Кэш ответов: memory (LRU в воркере), redis или none
+    cache_backend: str
+    cache_url: str
+    # Префикс ключей в Redis: по нему очищается только кэш приложения
+    cache_key_prefix: str
+    cache_ttl: float
+    cache_max_entries: int
+
+    log_level: str
+    # Запросы дольше порога логируются отдельно, 0 - не логировать
+    query_slow_ms: float
+    # Сколько раз один и тот же SQL может выполниться за запрос до
+    # предупреждения об N+1
+    query_n_plus_one_threshold: int
+    # Server-Timing раскрывает клиенту время работы БД
+    server_timing_enabled: bool
+    # При нескольких воркерах uvicorn метрики собираются через каталог
+    # prometheus_client.multiprocess
+    prometheus_multiproc_dir: Optional[str]
+
+    host: str
+    port: int
+    # Воркеров uvicorn на узел в src.server, по умолчанию - по числу ядер
+    web_concurrency: int
+    # Очередь непринятых соединений сокета
+    server_backlog: int
+    # Сколько секунд держать простаивающее keep-alive соединение
+    server_keepalive: int
+    # Больше одновременных соединений на воркер - ответ 503, 0 - без лимита
+    server_limit_concurrency: int
+    # Сколько секунд при остановке ждать запросы в работе
+    server_graceful_timeout: int
+    # Как часто воркер обновляет сводку просрочек, секунд; 0 - не
+    # запускать фоновую задачу (например, если её запускает cron)
+    overdue_job_interval: float
+
+    @classmethod
+    def from_env(cls):
+        environment = os.getenv("ENVIRONMENT", "local")
+        if environment == "prod":
+            database_url = os.getenv("DATABASE_URL_PROD")
+        else:
+            database_url = os.getenv("DATABASE_URL_LOCAL")
+        cache_backend = os.getenv("CACHE_BACKEND", "memory")
+        # Кэш в памяти у каждого воркера свой: после изменения в одном
+        # воркере другие отдавали бы устаревшие ответы до истечения TTL
+        workers = 1 if cache_backend == "memory" else os.cpu_count() or 1
+        return cls(
+            environment=environment,
+            database_url=database_url,
+            db_pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            db_pool_pre_ping=_bool("DB_POOL_PRE_PING", "true"),
+            db_statement_cache_size=int(
+                os.getenv("DB_STATEMENT_CACHE_SIZE", "500")
+            ),
+            db_statement_timeout_ms=int(
+                os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")
+            ),
+            jwt_secret_key=os.getenv("JWT_SECRET_KEY"),
+            auth_trust_token_claims=_bool("AUTH_TRUST_TOKEN_CLAIMS", "false"),
+            auth_user_cache_ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "60")),
+            auth_user_cache_size=int(
+                os.getenv("AUTH_USER_CACHE_SIZE", "1024")
+            ),
+            bcrypt_rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+            password_hash_concurrency=int(
+                os.getenv("PASSWORD_HASH_CONCURRENCY", "2")
+            ),
+            cache_backend=cache_backend,
+            cache_url=os.getenv("CACHE_URL", "redis://localhost:6379/0"),
+            cache_key_prefix=os.getenv("CACHE_KEY_PREFIX", "library:"),
+            cache_ttl=float(os.getenv("CACHE_TTL", "30")),
+            cache_max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+            log_level=os.getenv("LOG_LEVEL", "INFO"),
+            query_slow_ms=float(os.getenv("QUERY_SLOW_MS", "200")),
+            query_n_plus_one_threshold=int(
+                os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "10")
+            ),
+            server_timing_enabled=_bool("SERVER_TIMING_ENABLED", "true"),
+            # Пустая строка из .env.default означает один процесс
+            prometheus_multiproc_dir=(
+                os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+            ),
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=int(os.getenv("PORT", "8000")),  # Render предоставляет PORT
+            web_concurrency=int(os.getenv("WEB_CONCURRENCY") or workers),
+            server_backlog=int(os.getenv("SERVER_BACKLOG", "2048")),
+            server_keepalive=int(os.getenv("SERVER_KEEPALIVE", "5")),
+            server_limit_concurrency=int(
+                os.getenv("SERVER_LIMIT_CONCURRENCY", "0")
+            ),
+            server_graceful_timeout=int(
+                os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")
+            ),
+            overdue_job_interval=float(
+                os.getenv("OVERDUE_JOB_INTERVAL", "60")
+            ),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    load_dotenv()
+    return Settings.from_env()
@@ -0,0 +1,293 @@
+"""Предагрегированная статистика выдач: по дням, по книгам и итоги.
+
+    python -m src.stats        # пересобрать таблицы по borrowed_books
+
+Таблицы обновляются в транзакциях выдачи и возврата (одиночных и
+пакетных), поэтому /stats/* читают несколько строк, сколько бы займов ни
+накопилось в истории. Дневные и общие счётчики разбиты на STATS_SHARDS
+строк по reader_id: параллельные выдачи разным читателям не ждут
+блокировку одной строки.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from src.database import get_engine
+from src.models import (
+    BookCirculationModel,
+    BookModel,
+    CirculationDailyModel,
+    CirculationTotalsModel,
+)
+
+STATS_SHARDS = 16
+
+REBUILD_SQL = (
+    "TRUNCATE book_circulation, circulation_daily, circulation_totals",
+    """
+    INSERT INTO book_circulation (book_id, loans, active_loans)
+    SELECT book_id, count(*), count(*) FILTER (WHERE return_date IS NULL)
+    FROM borrowed_books
+    GROUP BY book_id
+    """,
+    """
+    INSERT INTO circulation_daily (day, shard, loans, returns)
+    SELECT day, shard, sum(loans), sum(returns)
+    FROM (
+        SELECT borrow_date::date AS day, reader_id % :shards AS shard,
+            1 AS loans, 0 AS returns
+        FROM borrowed_books
+        UNION ALL
+        SELECT return_date::date, reader_id % :shards, 0, 1
+        FROM borrowed_books
+        WHERE return_date IS NOT NULL
+    ) AS events
+    GROUP BY day, shard
+    """,
+    # Книги на руках не привязаны к читателю: итог пишется в шард 0
+    """
+    INSERT INTO circulation_totals
+        (shard, active_loans, active_readers, books_on_loan)
+    SELECT shards.shard, coalesce(active.loans, 0),
+        coalesce(active.readers, 0),
+        CASE WHEN shards.shard = 0 THEN (
+            SELECT count(*) FROM book_circulation WHERE active_loans > 0
+        ) ELSE 0 END
+    FROM generate_series(0, :shards - 1) AS shards (shard)
+    LEFT JOIN (
+        SELECT reader_id % :shards AS shard, count(*) AS loans,
+            count(DISTINCT reader_id) AS readers
+        FROM borrowed_books
+        WHERE return_date IS NULL
+        GROUP BY 1
+    ) AS active ON active.shard = shards.shard
+    """,
+)
+
+
+def shard(reader_id):
+    return reader_id % STATS_SHARDS
+
+
+def rebuild_stats(conn):
+    """Пересчитывает все таблицы статистики по borrowed_books."""
+    for statement in REBUILD_SQL:
+        conn.execute(text(statement), {"shards": STATS_SHARDS})
+
+
+async def _add_totals(db, totals):
+    # Строки шардов по возрастанию: пакеты не взаимоблокируются
+    if not totals:
+        return
+    stmt = insert(CirculationTotalsModel).values(
+        [{"shard": key, **values} for key, values in sorted(totals.items())]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CirculationTotalsModel.shard],
+            set_={
+                column: getattr(CirculationTotalsModel, column)
+                + stmt.excluded[column]
+                for column in (
+                    "active_loans",
+                    "active_readers",
+                    "books_on_loan",
+                )
+            },
+        )
+    )
+
+
+async def _add_daily(db, column, counts):
+    stmt = insert(CirculationDailyModel).values(
+        [
+            {"day": day, "shard": key, column: n}
+            for (day, key), n in sorted(counts.items())
+        ]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[
+                CirculationDailyModel.day,
+                CirculationDailyModel.shard,
+            ],
+            set_={
+                column: getattr(CirculationDailyModel, column)
+                + stmt.excluded[column]
+            },
+        )
+    )
+
+
+def _totals():
+    return Counter(active_loans=0, active_readers=0, books_on_loan=0)
+
+
+async def record_rented(db, loans, active_loans):
+    """Учитывает выданные займы в транзакции выдачи.
+
+    active_loans - новые значения readers.active_loans после выдачи.
+    """
+    if not loans:
+        return
+    await _add_daily(
+        db,
+        "loans",
+        Counter(
+            (loan.borrow_date.date(), shard(loan.reader_id)) for loan in loans
+        ),
+    )
+    per_book = Counter(loan.book_id for loan in loans)
+    per_reader = Counter(loan.reader_id for loan in loans)
+    stmt = insert(BookCirculationModel).values(
+        [
+            {"book_id": book_id, "loans": n, "active_loans": n}
+            for book_id, n in sorted(per_book.items())
+        ]
+    )
+    books = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[BookCirculationModel.book_id],
+            set_={
+                "loans": BookCirculationModel.loans + stmt.excluded.loans,
+                "active_loans": BookCirculationModel.active_loans
+                + stmt.excluded.active_loans,
+            },
+        ).returning(
+            BookCirculationModel.book_id, BookCirculationModel.active_loans
+        )
+    )
+    book_shards = {loan.book_id: shard(loan.reader_id) for loan in loans}
+
+    totals = {}
+    for reader_id, n in per_reader.items():
+        row = totals.setdefault(shard(reader_id), _totals())
+        row["active_loans"] += n
+        # Счётчик читателя вырос с нуля
+        if active_loans[reader_id] == n:
+            row["active_readers"] += 1
+    for book_id, active in books:
+        if active == per_book[book_id]:
+            totals.setdefault(book_shards[book_id], _totals())[
+                "books_on_loan"
+            ] += 1
+    await _add_totals(db, totals)
+
+
+async def record_returned(db, loans, active_loans):
+    """Учитывает возвращённые займы в транзакции возврата.
+
+    active_loans - новые значения readers.active_loans после возврата.
+    """
+    if not loans:
+        return
+    await _add_daily(
+        db,
+        "returns",
+        Counter(
+            (loan.return_date.date(), shard(loan.reader_id)) for loan in loans
+        ),
+    )
+    per_book = Counter(loan.book_id for loan in loans)
+    per_reader = Counter(loan.reader_id for loan in loans)
+    books = await db.execute(
+        update(BookCirculationModel)
+        .where(BookCirculationModel.book_id.in_(sorted(per_book)))
+        .values(
+            active_loans=BookCirculationModel.active_loans
+            - case(per_book, value=BookCirculationModel.book_id)
+        )
+        .returning(
+            BookCirculationModel.book_id, BookCirculationModel.active_loans
+        )
+        .execution_options(synchronize_session=False)
+    )
+    book_shards = {loan.book_id: shard(loan.reader_id) for loan in loans}
+
+    totals = {}
+    for reader_id, n in per_reader.items():
+        row = totals.setdefault(shard(reader_id), _totals())
+        row["active_loans"] -= n
+        if active_loans[reader_id] == 0:
+            row["active_readers"] -= 1
+    for book_id, active in books:
+        if active == 0:
+            totals.setdefault(book_shards[book_id], _totals())[
+                "books_on_loan"
+            ] -= 1
+    await _add_totals(db, totals)
+
+
+async def daily_stats(db, date_from, date_to):
+    """Выдачи и возвраты по дням, дни без событий - нулями."""
+    rows = await db.execute(
+        select(
+            CirculationDailyModel.day,
+            func.sum(CirculationDailyModel.loans),
+            func.sum(CirculationDailyModel.returns),
+        )
+        .where(CirculationDailyModel.day.between(date_from, date_to))
+        .group_by(CirculationDailyModel.day)
+    )
+    by_day = {day: (loans, returns) for day, loans, returns in rows}
+    days = (date_to - date_from).days + 1
+    result = []
+    for offset in range(days):
+        day = date_from + timedelta(days=offset)
+        loans, returns = by_day.get(day, (0, 0))
+        result.append({"day": day, "loans": loans, "returns": returns})
+    return result
+
+
+async def top_books(db, limit):
+    rows = await db.execute(
+        select(
+            BookCirculationModel.book_id,
+            BookModel.title,
+            BookModel.author,
+            BookCirculationModel.loans,
+        )
+        .join(BookModel, BookModel.id == BookCirculationModel.book_id)
+        .where(BookCirculationModel.loans > 0)
+        .order_by(
+            BookCirculationModel.loans.desc(), BookCirculationModel.book_id
+        )
+        .limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+
+async def circulation_totals(db):
+    row = (
+        await db.execute(
+            select(
+                func.coalesce(
+                    func.sum(CirculationTotalsModel.active_loans), 0
+                ),
+                func.coalesce(
+                    func.sum(CirculationTotalsModel.active_readers), 0
+                ),
+                func.coalesce(
+                    func.sum(CirculationTotalsModel.books_on_loan), 0
+                ),
+            )
+        )
+    ).one()
+    return {
+        "active_loans": row[0],
+        "active_readers": row[1],
+        "books_on_loan": row[2],
+    }
+
+
+def main():
+    with get_engine().begin() as conn:
+        rebuild_stats(conn)
+    print("Статистика выдач пересобрана по borrowed_books.")
+
+
+if __name__ == "__main__":
+    main()
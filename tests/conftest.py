@@ -1,17 +1,52 @@
+import asyncio
+from contextlib import contextmanager
+import os
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from src.database import Base, SessionLocal  # Импортируем SessionLocal
+from sqlalchemy.pool import NullPool
+from src import database
+from src.database import (
+    Base,
+    create_db_engine,
+    get_session_factory,
+    make_async_url,
+)
 from src.main import app, get_db
 from src.models import UserModel, BookModel, ReaderModel
-from src.auth import get_password_hash
-from unittest.mock import patch
+from src.auth import get_password_hash, user_cache
+from src.cache import response_cache
 
 # URL для тестовой базы PostgreSQL
-SQLALCHEMY_DATABASE_URL = "postgresql://ilya@localhost:5432/test_library"
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "TEST_DATABASE_URL", "postgresql://ilya@localhost:5432/test_library"
+)
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient поднимает свой event loop на каждый запрос,
+# поэтому asyncpg-соединения не переиспользуем между запросами
+async_engine = create_async_engine(
+    make_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+@contextmanager
+def count_queries():
+    """Собирает SQL, который эндпоинты отправили через async-движок."""
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(
+            async_engine.sync_engine, "before_cursor_execute", record
+        )
 
 @pytest.fixture(scope="function")
 def db():
@@ -26,22 +61,32 @@ def db():
 
 @pytest.fixture(scope="function")
 def override_get_db(db):
-    def _override_get_db():
-        try:
-            yield db  # Используем ту же сессию db
-        finally:
-            pass  # Не закрываем, фикстура db управляет
+    async def _override_get_db():
+        # Данные фикстур закоммичены через db, async-сессия их видит
+        async with TestingAsyncSessionLocal() as session:
+            yield session
     return _override_get_db
 
 @pytest.fixture(scope="function")
 def client(db, override_get_db):
-    # Переопределяем SessionLocal в src.auth
-    with patch("src.auth.SessionLocal", TestingSessionLocal):
-        # Переопределяем SessionLocal в src.database, если используется
-        with patch("src.database.SessionLocal", TestingSessionLocal):
-            app.dependency_overrides[get_db] = override_get_db
-            yield TestClient(app)
-            app.dependency_overrides.clear()
+    # get_current_user использует тот же get_db, что и эндпоинты
+    user_cache.clear()
+    asyncio.run(response_cache.clear())
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = (
+        lambda: TestingAsyncSessionLocal
+    )
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def app_engine(monkeypatch):
+    # Движок приложения с метриками пула, но на тестовой базе: в тестах
+    # get_db подменён, и get_async_engine() взял бы DATABASE_URL_LOCAL
+    db_engine = create_db_engine(SQLALCHEMY_DATABASE_URL, is_async=True)
+    monkeypatch.setitem(database._engines, "async", db_engine)
+    yield db_engine
+    db_engine.sync_engine.dispose()
 
 @pytest.fixture(scope="function")
 def test_user(db):
@@ -55,6 +100,14 @@ def test_user(db):
     print(f"Created test user: {user.email}")
     return user
 
+@pytest.fixture(scope="function")
+def auth_headers(client, test_user):
+    login_response = client.post(
+        "/login",
+        json={"email": "test@library.com", "password": "testpass"}
+    )
+    return {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
 @pytest.fixture(scope="function")
 def test_book(db):
     book = BookModel(
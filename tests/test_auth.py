@@ -1,5 +1,9 @@
+from dataclasses import replace
 import pytest
 from fastapi import status
+from src.auth import get_pwd_context, settings
+from src.models import UserModel
+from tests.conftest import count_queries
 
 @pytest.mark.asyncio
 async def test_register(client):
@@ -36,4 +40,51 @@ async def test_login_wrong_credentials(client, test_user):
         json={"email": "test@library.com", "password": "wrongpass"}
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
-    assert "Неверный email или пароль" in response.json()["detail"]
\ No newline at end of file
+    assert "Неверный email или пароль" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_cost(client, db):
+    user = UserModel(
+        email="old@library.com",
+        password=get_pwd_context().hash("oldpass", rounds=4),
+    )
+    db.add(user)
+    db.commit()
+
+    response = client.post(
+        "/login",
+        json={"email": "old@library.com", "password": "oldpass"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    db.refresh(user)
+    assert f"${settings.bcrypt_rounds:02d}$" in user.password
+    assert get_pwd_context().verify("oldpass", user.password)
+
+@pytest.fixture
+def trusted_claims(monkeypatch):
+    monkeypatch.setattr(
+        "src.auth.settings", replace(settings, auth_trust_token_claims=True)
+    )
+
+@pytest.mark.asyncio
+async def test_trusted_claims_skip_user_lookup(
+    client, test_user, trusted_claims, auth_headers
+):
+    # Первый запрос прогревает кэш пользователей
+    assert client.get("/readers", headers=auth_headers).status_code == 200
+
+    with count_queries() as statements:
+        # Другая страница, чтобы не попасть в кэш ответов
+        response = client.get("/readers?limit=5", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert not any("FROM users" in s for s in statements)
+    assert len(statements) == 1
+
+@pytest.mark.asyncio
+async def test_logout_revokes_token(client, test_user, trusted_claims, auth_headers):
+    assert client.get("/readers", headers=auth_headers).status_code == 200
+
+    response = client.post("/logout", headers=auth_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = client.get("/readers", headers=auth_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
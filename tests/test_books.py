@@ -1,5 +1,8 @@
+import json
 import pytest
 from fastapi import status
+from src.bulk import BulkFormatError, iter_json_array
+from src.models import BookModel
 
 @pytest.mark.asyncio
 async def test_get_books(client):
@@ -43,4 +46,150 @@ async def test_create_book_unauthorized(client):
             "copies_available": 1
         }
     )
-    assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort", ["id", "title"])
+async def test_get_books_cursor_pagination(client, db, sort):
+    titles = ["Delta", "Alpha", "Echo", "Charlie", "Bravo"]
+    db.add_all(
+        BookModel(title=title, author="Author", copies_available=1)
+        for title in titles
+    )
+    db.commit()
+
+    seen = []
+    response = client.get("/books", params={"limit": 2, "sort": sort})
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(book["title"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get(
+            "/books", params={"limit": 2, "sort": sort, "cursor": cursor}
+        )
+    expected = titles if sort == "id" else sorted(titles)
+    assert seen == expected
+
+@pytest.mark.asyncio
+async def test_get_books_invalid_cursor(client):
+    response = client.get("/books", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_bulk_import_json(client, test_user, test_book, db, auth_headers):
+    rows = [
+        {"title": "Bulk 1", "author": "A", "isbn": "1111111111111"},
+        {"title": "", "author": "A"},
+        {"title": "Updated", "author": "B", "isbn": test_book.isbn,
+         "copies_available": 7},
+        {"title": "Bulk 2", "author": "C"},
+    ]
+    response = client.post(
+        "/books/bulk",
+        params={"batch_size": 2},
+        content=json.dumps(rows),
+        headers={**auth_headers, "Content-Type": "application/json"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["received"] == 4
+    assert result["inserted"] == 2
+    assert result["updated"] == 1
+    assert result["failed"] == 1
+    assert result["errors"][0]["row"] == 2
+    db.refresh(test_book)
+    assert test_book.title == "Updated"
+    # Для существующей книги copies_available добавляется к остатку
+    assert test_book.copies_available == 2 + 7
+
+@pytest.mark.asyncio
+async def test_bulk_import_ndjson_and_csv(client, test_user, db, auth_headers):
+    ndjson = '{"title": "N1", "author": "A"}\nnot json\n{"title": "N2", "author": "A"}\n'
+    response = client.post(
+        "/books/bulk",
+        content=ndjson,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["inserted"] == 2
+    assert response.json()["errors"][0]["row"] == 2
+
+    csv_body = (
+        "title,author,isbn,year_published,description\n"
+        'C1,Author,2222222222222,2001,"multi\nline"\n'
+        "C2,Author,2222222222222,,\n"
+    )
+    response = client.post(
+        "/books/bulk",
+        content=csv_body,
+        headers={**auth_headers, "Content-Type": "text/csv"},
+    )
+    result = response.json()
+    assert (result["inserted"], result["updated"], result["failed"]) == (1, 1, 0)
+    book = db.query(BookModel).filter(BookModel.isbn == "2222222222222").one()
+    assert book.title == "C2"
+
+async def _chunks(body, size):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+@pytest.mark.asyncio
+async def test_iter_json_array_across_chunks():
+    body = json.dumps([{"title": "Книга, [1]"}, 5, {"title": "B"}]).encode()
+    for size in (1, 3, len(body)):
+        rows = [row async for row in iter_json_array(_chunks(body, size))]
+        assert rows == [
+            (1, {"title": "Книга, [1]"}),
+            (2, "Ожидался объект"),
+            (3, {"title": "B"}),
+        ]
+    with pytest.raises(BulkFormatError):
+        async for _ in iter_json_array(_chunks(b'[{"a": 1}] x', 4)):
+            pass
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_unknown_format(client, test_user, auth_headers):
+    response = client.post(
+        "/books/bulk",
+        content="<books/>",
+        headers={**auth_headers, "Content-Type": "application/xml"},
+    )
+    assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+@pytest.mark.asyncio
+async def test_bulk_reimport_keeps_unset_columns_and_loans(client, test_user, test_book, test_reader, db, auth_headers):
+    test_book.description = "Keep me"
+    db.commit()
+    client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    ndjson = (
+        f'{{"title": "Renamed", "author": "A", "isbn": "{test_book.isbn}"}}\n'
+        '{"title": "Fresh", "author": "B", "isbn": "3333333333333", "description": "D"}\n'
+    )
+    response = client.post(
+        "/books/bulk",
+        content=ndjson,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    result = response.json()
+    assert (result["inserted"], result["updated"], result["failed"]) == (1, 1, 0)
+    db.refresh(test_book)
+    assert test_book.title == "Renamed"
+    assert test_book.description == "Keep me"
+    # Один из двух экземпляров на руках: остаток не сбросился к 1 по умолчанию
+    assert test_book.copies_available == 1
+
+    response = client.post(
+        "/books/bulk",
+        content=f'[{{"title": "Renamed", "author": "A", "isbn": "{test_book.isbn}", "copies_available": 3}}, {{"title": ',
+        headers={**auth_headers, "Content-Type": "application/json"},
+    )
+    result = response.json()
+    assert (result["updated"], result["failed"]) == (1, 1)
+    assert result["errors"][0]["row"] == 2
+    db.refresh(test_book)
+    assert test_book.copies_available == 1 + 3
\ No newline at end of file
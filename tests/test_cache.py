@@ -0,0 +1,155 @@
+import json
+import pytest
+from fastapi import status
+from src.cache import MemoryCache, RedisCache, ResponseCache
+
+class FakeRedis:
+    """Подмножество redis.asyncio.Redis, которое использует RedisCache."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value)
+        return value
+
+    async def scan_iter(self, match, count=None):
+        for key in list(self.data):
+            if key.startswith(match.rstrip("*")):
+                yield key
+
+    async def info(self, section):
+        return {"keyspace_hits": 5, "keyspace_misses": 2, "used_memory": 1}
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used():
+    backend = MemoryCache(max_entries=2)
+    await backend.set("a", 1, 30)
+    await backend.set("b", 2, 30)
+    assert await backend.get("a") == 1
+    await backend.set("c", 3, 30)
+    assert await backend.get("b") is None
+    assert await backend.get("a") == 1
+    assert (await backend.stats())["evictions"] == 1
+
+@pytest.mark.asyncio
+async def test_memory_cache_expires_entries(monkeypatch):
+    backend = MemoryCache(max_entries=10)
+    await backend.set("a", 1, 5)
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: 1e12)
+    assert await backend.get("a") is None
+    assert (await backend.stats())["expirations"] == 1
+
+@pytest.mark.asyncio
+async def test_response_cache_over_redis_backend():
+    client = FakeRedis()
+    cache = ResponseCache(RedisCache(client, "library:"), ttl=30)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"items": [{"id": 1}], "cursor": None}
+
+    for _ in range(2):
+        page = await cache.get_or_load("id:0:10:None", load, namespace="books")
+    assert page["items"] == [{"id": 1}]
+    assert len(calls) == 1
+    assert json.loads(client.data["library:books:0:id:0:10:None"]) == page
+
+    await cache.invalidate(namespaces=("books",))
+    await cache.get_or_load("id:0:10:None", load, namespace="books")
+    assert len(calls) == 2
+    assert await cache.stats() == {
+        "backend": "RedisCache",
+        "hits": 1,
+        "misses": 2,
+        "keyspace_hits": 5,
+        "keyspace_misses": 2,
+        "evicted_keys": 0,
+        "expired_keys": 0,
+    }
+
+    # Очищаются только ключи с префиксом приложения
+    client.data["other:key"] = "1"
+    await cache.clear()
+    assert client.data == {"other:key": "1"}
+
+@pytest.mark.asyncio
+async def test_entity_loaded_before_invalidation_is_not_served():
+    cache = ResponseCache(MemoryCache(max_entries=10), ttl=30)
+    versions = ["old", "new"]
+
+    async def load_during_update():
+        # Запись изменилась и сброс кэша прошёл, пока шла загрузка
+        value = {"title": versions.pop(0)}
+        await cache.invalidate("book:1", namespaces=("books",))
+        return value
+
+    async def load():
+        return {"title": versions.pop(0)}
+
+    stale = await cache.get_or_load("book:1", load_during_update)
+    assert stale == {"title": "old"}
+    assert await cache.get_or_load("book:1", load) == {"title": "new"}
+
+@pytest.mark.asyncio
+async def test_invalidation_keeps_other_entities():
+    cache = ResponseCache(MemoryCache(max_entries=10), ttl=30)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"calls": len(calls)}
+
+    await cache.get_or_load("book:1", load)
+    await cache.get_or_load("book:2", load)
+    await cache.get_or_load("id:0:10:None", load, namespace="books")
+    # Выдача книги 1: её карточка и списки сбрасываются, карточка 2 - нет
+    await cache.invalidate("book:1", namespaces=("books",))
+    assert await cache.get_or_load("book:2", load) == {"calls": 2}
+    assert await cache.get_or_load("book:1", load) == {"calls": 4}
+    assert await cache.get_or_load(
+        "id:0:10:None", load, namespace="books"
+    ) == {"calls": 5}
+
+@pytest.mark.asyncio
+async def test_book_cache_invalidated_by_update(client, test_user, test_book, auth_headers):
+    url = f"/books/{test_book.id}"
+    assert client.get(url, headers=auth_headers).json()["title"] == "Test Book"
+    assert client.get(url, headers=auth_headers).json()["title"] == "Test Book"
+
+    response = client.put(url, json={"title": "Renamed"}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert client.get(url, headers=auth_headers).json()["title"] == "Renamed"
+
+    stats = client.get("/system/cache", headers=auth_headers).json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_lists_invalidated_by_loans(
+    client, test_user, test_book, test_reader, auth_headers
+):
+    assert client.get("/books").json()[0]["copies_available"] == 2
+    reader_url = f"/readers/{test_reader.id}"
+    assert client.get(reader_url, headers=auth_headers).json()["active_loans"] == 0
+
+    response = client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert client.get("/books").json()[0]["copies_available"] == 1
+    assert client.get(reader_url, headers=auth_headers).json()["active_loans"] == 1
\ No newline at end of file
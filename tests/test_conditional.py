@@ -0,0 +1,74 @@
+import pytest
+from fastapi import status
+
+@pytest.mark.asyncio
+async def test_book_not_modified(client, test_user, test_book, auth_headers):
+    url = f"/books/{test_book.id}"
+    response = client.get(url, headers=auth_headers)
+    etag = response.headers["ETag"]
+    assert etag == '"1"'
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    last_modified = response.headers["Last-Modified"]
+    response = client.get(
+        url, headers={**auth_headers, "If-Modified-Since": last_modified}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.put(url, json={"title": "Renamed"}, headers=auth_headers)
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Renamed"
+    assert response.headers["ETag"] == '"2"'
+
+@pytest.mark.asyncio
+async def test_update_book_if_match(client, test_user, test_book, auth_headers):
+    url = f"/books/{test_book.id}"
+    response = client.put(
+        url, json={"title": "First"}, headers={**auth_headers, "If-Match": '"1"'}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"2"'
+
+    response = client.put(
+        url, json={"title": "Second"}, headers={**auth_headers, "If-Match": '"1"'}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    assert client.get(url, headers=auth_headers).json()["title"] == "First"
+
+@pytest.mark.asyncio
+async def test_update_reader_if_match(client, test_user, test_reader, auth_headers):
+    url = f"/readers/{test_reader.id}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+    response = client.put(
+        url,
+        json={"name": "Renamed"},
+        headers={**auth_headers, "If-Match": '"7"'},
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+    response = client.put(
+        url, json={"name": "Renamed"}, headers={**auth_headers, "If-Match": etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+@pytest.mark.asyncio
+async def test_loans_change_etags(
+    client, test_user, test_book, test_reader, auth_headers
+):
+    list_etag = client.get("/books").headers["ETag"]
+    response = client.get("/books", headers={"If-None-Match": list_etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    response = client.get("/books", headers={"If-None-Match": list_etag})
+    assert response.status_code == status.HTTP_200_OK
+    response = client.get(f"/readers/{test_reader.id}", headers=auth_headers)
+    assert response.headers["ETag"] == '"2"'
\ No newline at end of file
@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import pytest
+from fastapi import status
+from src.models import BookModel
+
+@pytest.fixture
+def books(db):
+    books = [
+        BookModel(title=f"Book {i}", author="Author", copies_available=i)
+        for i in range(2500)
+    ]
+    db.add_all(books)
+    db.commit()
+    return books
+
+@pytest.mark.asyncio
+async def test_export_books_ndjson(client, auth_headers, books):
+    response = client.get("/export/books", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 2500
+    assert [row["title"] for row in rows[:2]] == ["Book 0", "Book 1"]
+
+@pytest.mark.asyncio
+async def test_export_loans_csv_gzip(client, auth_headers, test_book, test_reader):
+    client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    response = client.get(
+        "/export/loans",
+        params={"format": "csv", "gzip": True},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx сам распаковывает Content-Encoding: gzip
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["book_id"] == str(test_book.id)
+    assert rows[0]["return_date"] == ""
+
+@pytest.mark.asyncio
+async def test_export_requires_auth(client):
+    response = client.get("/export/readers")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
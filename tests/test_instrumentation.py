@@ -0,0 +1,43 @@
+import json
+import logging
+import pytest
+from fastapi import status
+from src.instrumentation import QueryStats
+
+def request_logs(caplog):
+    return [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.name == "library.requests"
+    ]
+
+@pytest.mark.asyncio
+async def test_server_timing_counts_queries(client, test_user, test_book, auth_headers):
+    response = client.get(f"/books/{test_book.id}", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    timing = response.headers["Server-Timing"]
+    assert 'desc="2 queries"' in timing
+    assert "app;dur=" in timing
+
+@pytest.mark.asyncio
+async def test_request_log_record(client, caplog):
+    with caplog.at_level(logging.INFO, logger="library.requests"):
+        client.get("/books?sort=title")
+    record = request_logs(caplog)[-1]
+    assert record["method"] == "GET"
+    assert record["path"] == "/books"
+    assert record["status"] == 200
+    assert record["db_queries"] == 1
+    assert "FROM books" in record["slowest_sql"]
+
+def test_n_plus_one_detection():
+    stats = QueryStats()
+    for _ in range(4):
+        stats.record("SELECT * FROM books WHERE id = $1", 0.001)
+    stats.record("SELECT * FROM readers", 0.005)
+    assert stats.repeated(threshold=3) == [
+        ("SELECT * FROM books WHERE id = $1", 4)
+    ]
+    assert stats.repeated(threshold=4) == []
+    assert stats.slowest_statement == "SELECT * FROM readers"
+    assert stats.count == 5
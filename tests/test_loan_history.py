@@ -0,0 +1,110 @@
+import json
+from datetime import timedelta
+import pytest
+from fastapi import status
+from src.main import utcnow
+from src.models import BookModel, BorrowedBookModel
+from src.reconcile import reconcile_active_loans
+
+@pytest.fixture
+def loans(db, test_book, test_reader):
+    other = BookModel(title="Other Book", author="Other Author", copies_available=1)
+    db.add(other)
+    db.commit()
+    now = utcnow()
+    # Два займа с одной датой выдачи: порядок внутри даты задаёт id
+    days = [30, 20, 20, 10, 5]
+    entries = [
+        BorrowedBookModel(
+            book_id=test_book.id,
+            reader_id=test_reader.id,
+            borrow_date=now - timedelta(days=days_ago),
+            return_date=now - timedelta(days=days_ago - 1) if days_ago > 5 else None,
+        )
+        for days_ago in days
+    ]
+    entries.append(
+        BorrowedBookModel(
+            book_id=other.id,
+            reader_id=test_reader.id,
+            borrow_date=now - timedelta(days=15),
+            return_date=now - timedelta(days=14),
+        )
+    )
+    db.add_all(entries)
+    db.commit()
+    reconcile_active_loans(db)
+    return entries
+
+def read_all(client, headers, url, **params):
+    ids, cursor = [], None
+    while True:
+        response = client.get(
+            url, params={**params, "cursor": cursor} if cursor else params, headers=headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        ids += [loan["id"] for loan in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+
+@pytest.mark.asyncio
+async def test_reader_loans_keyset_pages(client, auth_headers, loans, test_reader):
+    url = f"/readers/{test_reader.id}/loans"
+    newest_first = sorted(loans, key=lambda loan: (loan.borrow_date, loan.id), reverse=True)
+    assert read_all(client, auth_headers, url, limit=2) == [loan.id for loan in newest_first]
+    assert read_all(client, auth_headers, url, limit=4, order="asc") == [
+        loan.id for loan in reversed(newest_first)
+    ]
+
+    response = client.get(url, params={"limit": 1}, headers=auth_headers)
+    assert response.json()[0]["return_date"] is None
+    assert response.json()[0]["due_date"] is not None
+    # Курсор убывающего порядка не подходит к возрастающему
+    response = client.get(
+        url,
+        params={"order": "asc", "cursor": response.headers["X-Next-Cursor"]},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_book_loans_date_range(client, auth_headers, loans, test_book):
+    now = utcnow()
+    response = client.get(
+        f"/books/{test_book.id}/loans",
+        params={
+            "date_from": (now - timedelta(days=25)).isoformat(),
+            "date_to": (now - timedelta(days=7)).isoformat(),
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [loan["id"] for loan in response.json()] == [loans[3].id, loans[2].id, loans[1].id]
+    assert {loan["book_id"] for loan in response.json()} == {test_book.id}
+
+    response = client.get("/books/999999/loans", headers=auth_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.asyncio
+async def test_reader_loans_stream(client, auth_headers, loans, test_reader):
+    response = client.get(
+        f"/readers/{test_reader.id}/loans",
+        params={"format": "ndjson", "order": "asc"},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [
+        loan.id for loan in sorted(loans, key=lambda loan: (loan.borrow_date, loan.id))
+    ]
+
+    response = client.get(
+        f"/readers/{test_reader.id}/loans",
+        params={"format": "csv", "date_from": utcnow().isoformat()},
+        headers=auth_headers,
+    )
+    assert response.text.splitlines() == [
+        "id,book_id,reader_id,borrow_date,due_date,return_date"
+    ]
\ No newline at end of file
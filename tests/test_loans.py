@@ -1,5 +1,12 @@
+import asyncio
+from datetime import datetime
+import httpx
 import pytest
 from fastapi import status
+from src.main import app
+from src.models import BookModel, BorrowedBookModel, ReaderModel
+from src.reconcile import LoanLimitExceeded, reconcile_active_loans
+from tests.conftest import count_queries
 
 @pytest.mark.asyncio
 async def test_rent_book(client, test_user, test_book, test_reader):
@@ -58,4 +65,259 @@ async def test_return_book(client, test_user, test_book, test_reader):
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == status.HTTP_200_OK
-    assert response.json()["return_date"] is not None
\ No newline at end of file
+    assert response.json()["return_date"] is not None
+
+@pytest.fixture
+async def async_client(client):
+    # client уже подменил get_db; ASGITransport гоняет запросы
+    # в одном event loop, поэтому они действительно конкурируют
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test"
+    ) as async_client:
+        yield async_client
+
+@pytest.mark.asyncio
+async def test_rent_last_copies_concurrently(async_client, test_user, db, auth_headers):
+    book = BookModel(title="Hot Book", author="Author", copies_available=5)
+    readers = [
+        ReaderModel(name=f"Reader {i}", email=f"reader{i}@library.com")
+        for i in range(20)
+    ]
+    db.add(book)
+    db.add_all(readers)
+    db.commit()
+
+    responses = await asyncio.gather(*(
+        async_client.post(
+            "/rent_book",
+            json={"book_id": book.id, "reader_id": reader.id},
+            headers=auth_headers,
+        )
+        for reader in readers
+    ))
+
+    codes = [response.status_code for response in responses]
+    assert codes.count(status.HTTP_201_CREATED) == 5
+    assert codes.count(status.HTTP_400_BAD_REQUEST) == 15
+    db.refresh(book)
+    assert book.copies_available == 0
+    assert db.query(BorrowedBookModel).count() == 5
+
+@pytest.mark.asyncio
+async def test_reader_limit_concurrently(async_client, test_user, test_reader, db, auth_headers):
+    books = [
+        BookModel(title=f"Book {i}", author="Author", copies_available=1)
+        for i in range(6)
+    ]
+    db.add_all(books)
+    db.commit()
+
+    responses = await asyncio.gather(*(
+        async_client.post(
+            "/rent_book",
+            json={"book_id": book.id, "reader_id": test_reader.id},
+            headers=auth_headers,
+        )
+        for book in books
+    ))
+
+    codes = [response.status_code for response in responses]
+    assert codes.count(status.HTTP_201_CREATED) == 3
+    assert db.query(BorrowedBookModel).count() == 3
+
+@pytest.mark.asyncio
+async def test_rent_book_respects_reader_limit(client, test_user, test_book, test_reader, db, auth_headers):
+    test_reader.loan_limit = 1
+    db.commit()
+
+    response = client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    response = client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    db.refresh(test_reader)
+    db.refresh(test_book)
+    assert test_reader.active_loans == 1
+    assert test_book.copies_available == 1
+
+    client.post(
+        "/return_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers
+    )
+    db.refresh(test_reader)
+    assert test_reader.active_loans == 0
+
+def test_reconcile_active_loans(db, test_book, test_reader):
+    db.add(BorrowedBookModel(
+        book_id=test_book.id,
+        reader_id=test_reader.id,
+        borrow_date=datetime(2025, 1, 1),
+    ))
+    test_reader.active_loans = 0
+    db.commit()
+
+    assert reconcile_active_loans(db) == {test_reader.id: 1}
+    db.refresh(test_reader)
+    assert test_reader.active_loans == 1
+    assert reconcile_active_loans(db) == {}
+
+def test_reconcile_reports_readers_over_limit(db, test_book, test_reader):
+    test_reader.loan_limit = 1
+    test_reader.active_loans = 0
+    db.add_all([
+        BorrowedBookModel(
+            book_id=test_book.id,
+            reader_id=test_reader.id,
+            borrow_date=datetime(2025, 1, day),
+        )
+        for day in (1, 2)
+    ])
+    db.commit()
+
+    with pytest.raises(LoanLimitExceeded) as e:
+        reconcile_active_loans(db)
+    assert e.value.readers == [(test_reader.id, 2, 1)]
+    db.refresh(test_reader)
+    assert test_reader.loan_limit == 1
+    assert test_reader.active_loans == 0
+
+@pytest.mark.asyncio
+async def test_rent_books_batch(client, test_user, test_reader, db, auth_headers):
+    books = [
+        BookModel(title=f"Book {i}", author="Author", copies_available=1)
+        for i in range(5)
+    ]
+    db.add_all(books)
+    db.commit()
+    items = [
+        {"book_id": books[0].id, "reader_id": test_reader.id},
+        {"book_id": books[0].id, "reader_id": test_reader.id},
+        {"book_id": 999999, "reader_id": test_reader.id},
+        {"book_id": books[1].id, "reader_id": 999999},
+    ] + [
+        {"book_id": book.id, "reader_id": test_reader.id}
+        for book in books[1:]
+    ]
+
+    with count_queries() as statements:
+        response = client.post(
+            "/rent_book/batch", json={"items": items}, headers=auth_headers
+        )
+    assert response.status_code == status.HTTP_200_OK
+    # Пользователь, блокировки читателей и книг, два UPDATE, один INSERT
+    # и три upsert статистики - независимо от размера пачки
+    assert len(statements) <= 10
+
+    body = response.json()
+    codes = [result["status_code"] for result in body["results"]]
+    assert codes == [201, 400, 404, 404, 201, 201, 400, 400]
+    assert body["succeeded"] == 3
+    assert body["results"][0]["loan"]["book_id"] == books[0].id
+    db.refresh(test_reader)
+    assert test_reader.active_loans == 3
+    db.refresh(books[0])
+    assert books[0].copies_available == 0
+
+    response = client.post(
+        "/return_book/batch",
+        json={"items": items[:2] + items[4:6]},
+        headers=auth_headers,
+    )
+    codes = [result["status_code"] for result in response.json()["results"]]
+    assert codes == [200, 400, 200, 200]
+    assert response.json()["results"][0]["loan"]["return_date"] is not None
+    db.refresh(test_reader)
+    db.refresh(books[0])
+    assert test_reader.active_loans == 0
+    assert books[0].copies_available == 1
+
+@pytest.mark.asyncio
+async def test_rent_and_return_concurrently(async_client, test_user, test_book, test_reader, db, auth_headers):
+    # Выдача и возврат одной пары книга/читатель блокируют строки в одном
+    # порядке (читатель, затем книга) и не взаимоблокируются
+    test_book.copies_available = 10
+    test_reader.loan_limit = 10
+    db.commit()
+    loan = {"book_id": test_book.id, "reader_id": test_reader.id}
+    for _ in range(5):
+        await async_client.post("/rent_book", json=loan, headers=auth_headers)
+
+    # return_exceptions: при взаимоблокировке остальные запросы всё равно
+    # завершаются и не держат строки до удаления таблиц
+    responses = await asyncio.gather(*(
+        async_client.post(url, json=loan, headers=auth_headers)
+        for _ in range(10)
+        for url in ("/rent_book", "/return_book")
+    ), return_exceptions=True)
+
+    assert [r for r in responses if isinstance(r, Exception)] == []
+    assert all(response.status_code < 500 for response in responses)
+    db.refresh(test_book)
+    db.refresh(test_reader)
+    active = db.query(BorrowedBookModel).filter(
+        BorrowedBookModel.return_date.is_(None)
+    ).count()
+    assert test_reader.active_loans == active
+    assert test_book.copies_available == 10 - active
+
+@pytest.mark.asyncio
+async def test_mixed_batches_concurrently(async_client, test_user, db, auth_headers):
+    books = [
+        BookModel(title=f"Book {i}", author="Author", copies_available=50)
+        for i in range(3)
+    ]
+    readers = [
+        ReaderModel(name=f"Reader {i}", email=f"reader{i}@library.com", loan_limit=50)
+        for i in range(3)
+    ]
+    db.add_all(books + readers)
+    db.commit()
+    pairs = [
+        {"book_id": book.id, "reader_id": reader.id}
+        for book in books
+        for reader in readers
+    ]
+    await async_client.post(
+        "/rent_book/batch", json={"items": pairs * 2}, headers=auth_headers
+    )
+
+    # Пачки в разном порядке позиций вперемешку с одиночными запросами
+    requests = []
+    for shift in range(6):
+        items = pairs[shift:] + pairs[:shift]
+        requests += [
+            ("/rent_book/batch", {"items": items}),
+            ("/return_book/batch", {"items": items[::-1]}),
+            ("/rent_book", items[0]),
+            ("/return_book", items[-1]),
+        ]
+    responses = await asyncio.gather(*(
+        async_client.post(url, json=body, headers=auth_headers)
+        for url, body in requests
+    ), return_exceptions=True)
+
+    assert [r for r in responses if isinstance(r, Exception)] == []
+    assert all(response.status_code < 500 for response in responses)
+    for book in books:
+        db.refresh(book)
+        active = db.query(BorrowedBookModel).filter(
+            BorrowedBookModel.book_id == book.id,
+            BorrowedBookModel.return_date.is_(None),
+        ).count()
+        assert book.copies_available == 50 - active
+    for reader in readers:
+        db.refresh(reader)
+        active = db.query(BorrowedBookModel).filter(
+            BorrowedBookModel.reader_id == reader.id,
+            BorrowedBookModel.return_date.is_(None),
+        ).count()
+        assert reader.active_loans == active
\ No newline at end of file
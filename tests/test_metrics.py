@@ -0,0 +1,38 @@
+import pytest
+from fastapi import status
+from tests.conftest import count_queries
+
+def sample(body, prefix):
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client, app_engine, test_user, test_book, test_reader, auth_headers):
+    before = client.get("/metrics").text
+    rented_before = sample(before, "library_loans_rented_total") or 0
+
+    client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    client.get(f"/books/{test_book.id}", headers=auth_headers)
+
+    with count_queries() as statements:
+        response = client.get("/metrics")
+    # Счётчик активных займов берётся из circulation_totals
+    assert not any("borrowed_books" in sql for sql in statements)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert sample(body, "library_loans_rented_total") == rented_before + 1
+    assert sample(body, "library_active_loans") == 1
+    assert sample(body, "library_http_requests_in_flight") == 1
+    assert (
+        'library_http_request_duration_seconds_count{group="books",'
+        'method="GET",route="/books/{book_id}",status="200"}'
+    ) in body
+    assert 'library_db_pool_size{engine="async"' in body
+    assert "library_password_hash_queued" in body
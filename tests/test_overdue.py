@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import status
+from src.main import utcnow
+from src.models import BorrowedBookModel, ReaderModel
+from src.overdue import refresh_overdue_summary
+from src.reconcile import reconcile_active_loans
+from tests.conftest import TestingAsyncSessionLocal
+
+@pytest.fixture
+def second_reader(db):
+    reader = ReaderModel(name="Second Reader", email="second@library.com")
+    db.add(reader)
+    db.commit()
+    return reader
+
+def add_loan(db, book, reader, days_ago, returned=False):
+    borrow_date = utcnow() - timedelta(days=days_ago)
+    loan = BorrowedBookModel(
+        book_id=book.id,
+        reader_id=reader.id,
+        borrow_date=borrow_date,
+        return_date=borrow_date + timedelta(days=1) if returned else None,
+    )
+    db.add(loan)
+    db.commit()
+    reconcile_active_loans(db)
+    return loan
+
+async def refresh(now):
+    async with TestingAsyncSessionLocal() as session:
+        return await refresh_overdue_summary(session, now)
+
+@pytest.mark.asyncio
+async def test_overdue_loans_keyset_pages(client, auth_headers, db, test_book, test_reader, second_reader):
+    oldest = add_loan(db, test_book, test_reader, days_ago=40)
+    newer = add_loan(db, test_book, second_reader, days_ago=20)
+    add_loan(db, test_book, test_reader, days_ago=5)
+    add_loan(db, test_book, test_reader, days_ago=60, returned=True)
+
+    response = client.get("/loans/overdue", params={"limit": 1}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [loan["id"] for loan in response.json()] == [oldest.id]
+    assert response.json()[0]["days_overdue"] == 26
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(
+        "/loans/overdue",
+        params={"limit": 1, "cursor": cursor},
+        headers=auth_headers,
+    )
+    assert [loan["id"] for loan in response.json()] == [newer.id]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get(
+        "/loans/overdue",
+        params={"reader_id": second_reader.id},
+        headers=auth_headers,
+    )
+    assert [loan["id"] for loan in response.json()] == [newer.id]
+
+@pytest.mark.asyncio
+async def test_overdue_summary_counts_only_new_crossings(client, auth_headers, db, test_book, test_reader, second_reader):
+    now = utcnow()
+    add_loan(db, test_book, test_reader, days_ago=30)
+    add_loan(db, test_book, second_reader, days_ago=20)
+    # Срок истечёт через 4 дня
+    add_loan(db, test_book, second_reader, days_ago=10)
+
+    assert await refresh(now) == 2
+    assert await refresh(now) == 0
+    assert await refresh(now + timedelta(days=5)) == 1
+
+    response = client.get("/loans/overdue/summary", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    summary = response.json()
+    assert summary["overdue_loans"] == 3
+    assert summary["overdue_readers"] == 2
+    assert summary["last_run_loans"] == 1
+    assert summary["top_readers"][0] == {
+        "reader_id": second_reader.id,
+        "overdue_loans": 2,
+    }
+
+    # Возврат учтённого займа вычитается сразу, без пересчёта
+    response = client.post(
+        "/return_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    summary = client.get("/loans/overdue/summary", headers=auth_headers).json()
+    assert summary["overdue_loans"] == 2
+    assert summary["overdue_readers"] == 1
+
+@pytest.mark.asyncio
+async def test_rent_book_sets_due_date(client, auth_headers, test_book, test_reader):
+    response = client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    loan = response.json()
+    borrow_date = datetime.fromisoformat(loan["borrow_date"])
+    assert datetime.fromisoformat(loan["due_date"]) == borrow_date + timedelta(days=14)
\ No newline at end of file
@@ -0,0 +1,24 @@
+import pytest
+from fastapi import status
+from src.database import create_db_engine, pool_status
+from tests.conftest import SQLALCHEMY_DATABASE_URL
+
+def test_pool_metrics_count_checkouts():
+    engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+    try:
+        with engine.connect():
+            assert pool_status(engine)["checked_out"] == 1
+        stats = pool_status(engine)
+        assert stats["checked_out"] == 0
+        assert stats["checkouts_total"] == 1
+        assert stats["checkins_total"] == 1
+        assert stats["wait_seconds_total"] > 0
+    finally:
+        engine.dispose()
+
+@pytest.mark.asyncio
+async def test_pool_status_endpoint(client, app_engine, test_user, auth_headers):
+    response = client.get("/system/pool", headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "async" in response.json()
+    assert "wait_seconds_max" in response.json()["async"]
\ No newline at end of file
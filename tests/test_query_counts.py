@@ -0,0 +1,78 @@
+import pytest
+from fastapi import status
+from tests.conftest import count_queries
+
+def assert_queries(client, expected, method, url, **kwargs):
+    with count_queries() as statements:
+        response = client.request(method, url, **kwargs)
+    assert response.status_code < 300, response.text
+    assert len(statements) == expected, "\n".join(statements)
+    return response
+
+# Каждый защищённый запрос делает один SELECT пользователя в get_current_user
+@pytest.mark.asyncio
+async def test_register_query_count(client):
+    assert_queries(
+        client,
+        1,
+        "POST",
+        "/register",
+        json={"email": "new@library.com", "password": "newpass"},
+    )
+
+@pytest.mark.asyncio
+async def test_book_write_query_counts(client, test_user, auth_headers):
+    book = {"title": "Book", "author": "Author", "isbn": "1111111111111"}
+    book_id = assert_queries(
+        client, 2, "POST", "/books", json=book, headers=auth_headers
+    ).json()["id"]
+    assert_queries(
+        client,
+        2,
+        "PUT",
+        f"/books/{book_id}",
+        json={"title": "Renamed"},
+        headers={**auth_headers, "If-Match": '"1"'},
+    )
+    assert_queries(client, 2, "DELETE", f"/books/{book_id}", headers=auth_headers)
+
+@pytest.mark.asyncio
+async def test_reader_write_query_counts(client, test_user, auth_headers):
+    reader = {"name": "Reader", "email": "new.reader@library.com"}
+    reader_id = assert_queries(
+        client, 2, "POST", "/readers", json=reader, headers=auth_headers
+    ).json()["id"]
+    assert_queries(
+        client,
+        2,
+        "PUT",
+        f"/readers/{reader_id}",
+        json={"name": "Renamed"},
+        headers=auth_headers,
+    )
+    assert_queries(
+        client, 2, "DELETE", f"/readers/{reader_id}", headers=auth_headers
+    )
+
+@pytest.mark.asyncio
+async def test_loan_query_counts(client, test_user, test_book, test_reader, auth_headers):
+    loan = {"book_id": test_book.id, "reader_id": test_reader.id}
+    # Читатель, книга, займ и три upsert статистики (src.stats)
+    assert_queries(
+        client, 7, "POST", "/rent_book", json=loan, headers=auth_headers
+    )
+    # Займ, книга, читатель и три записи статистики
+    response = assert_queries(
+        client, 7, "POST", "/return_book", json=loan, headers=auth_headers
+    )
+    assert response.json()["return_date"] is not None
+
+@pytest.mark.asyncio
+async def test_cached_reads_skip_database(client, test_user, test_book, auth_headers):
+    url = f"/books/{test_book.id}"
+    assert_queries(client, 2, "GET", url, headers=auth_headers)
+    assert_queries(client, 1, "GET", url, headers=auth_headers)
+    assert_queries(client, 1, "GET", "/books")
+    assert_queries(client, 0, "GET", "/books")
+    response = assert_queries(client, 2, "PUT", url, json={}, headers=auth_headers)
+    assert response.status_code == status.HTTP_200_OK
\ No newline at end of file
@@ -0,0 +1,66 @@
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from src.models import BookModel
+
+@pytest.fixture
+def catalog(db):
+    books = [
+        BookModel(title="Война и мир", author="Лев Толстой",
+                  description="Роман-эпопея о войне 1812 года"),
+        BookModel(title="Анна Каренина", author="Лев Толстой",
+                  description="Роман о любви и войне чувств"),
+        BookModel(title="Fluent Python", author="Luciano Ramalho",
+                  description="Clear, concise and effective programming"),
+        BookModel(title="Effective Java", author="Joshua Bloch",
+                  description="Best practices for the Java platform"),
+    ]
+    db.add_all(books)
+    db.commit()
+    return books
+
+@pytest.mark.asyncio
+async def test_search_ranks_title_matches_first(client, catalog):
+    response = client.get("/books/search", params={"q": "войны"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Search-Mode"] == "fulltext"
+    titles = [book["title"] for book in response.json()]
+    assert titles == ["Война и мир", "Анна Каренина"]
+
+@pytest.mark.asyncio
+async def test_search_cursor_pagination(client, catalog):
+    seen = []
+    params = {"q": "effective", "limit": 1}
+    while True:
+        response = client.get("/books/search", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(book["title"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+    assert seen == ["Effective Java", "Fluent Python"]
+
+@pytest.mark.asyncio
+async def test_search_cursor_must_match_query(client, catalog):
+    response = client.get("/books/search", params={"q": "effective", "limit": 1})
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/books/search", params={"q": "java", "cursor": cursor})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_search_fuzzy_fallback(client, db, catalog):
+    available = db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_available_extensions "
+        "WHERE name = 'pg_trgm')"
+    )).scalar()
+    if not available:
+        pytest.skip("pg_trgm не установлен")
+    db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    db.commit()
+
+    # Опечатка в имени автора: полнотекстовый поиск ничего не находит
+    response = client.get("/books/search", params={"q": "Lucano Ramalho"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Search-Mode"] == "fuzzy"
+    assert response.json()[0]["title"] == "Fluent Python"
\ No newline at end of file
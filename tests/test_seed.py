@@ -0,0 +1,71 @@
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, inspect, select
+from src.models import (
+    DEFAULT_LOAN_LIMIT,
+    LOAN_PERIOD_DAYS,
+    BookModel,
+    BorrowedBookModel,
+    ReaderModel,
+)
+from src.seed import SeedOptions, active_loans, book_rows, generate, loan_rows
+from tests.conftest import SQLALCHEMY_DATABASE_URL, engine
+
+AS_OF = datetime(2026, 1, 1)
+OPTIONS = SeedOptions(books=200, readers=100, loans=2000, as_of=AS_OF)
+
+def test_loan_rows_are_deterministic():
+    rows = list(loan_rows(OPTIONS, 0, OPTIONS.loans))
+    assert rows == list(loan_rows(OPTIONS, 0, OPTIONS.loans))
+    assert rows != list(loan_rows(replace(OPTIONS, seed=7), 0, OPTIONS.loans))
+    returned, active = rows[: OPTIONS.returned], rows[OPTIONS.returned :]
+    assert len(active) == 100
+    assert all(r[5] is not None and r[3] < r[5] <= AS_OF for r in returned)
+    assert all(r[5] is None and r[3] < AS_OF for r in active)
+    assert all(r[4] == r[3] + timedelta(days=LOAN_PERIOD_DAYS) for r in rows)
+    overdue = [r for r in active if r[4] < AS_OF]
+    assert 0 < len(overdue) < len(active)
+    assert all(1 <= r[1] <= 200 and 1 <= r[2] <= 100 for r in rows)
+    # Активные займы не выходят за фонд книг и лимиты читателей
+    copies = {r[0]: r[5] for r in book_rows(OPTIONS, 0, OPTIONS.books)}
+    per_book = Counter(r[1] for r in active)
+    assert all(n <= copies[book_id] for book_id, n in per_book.items())
+    per_reader = Counter(r[2] for r in active)
+    assert max(per_reader.values()) <= DEFAULT_LOAN_LIMIT
+
+def test_active_loans_must_fit_limits():
+    options = replace(OPTIONS, readers=10, return_rate=0.5)
+    with pytest.raises(ValueError):
+        active_loans(options)
+
+def test_generate_builds_consistent_database(db):
+    loaded = generate(OPTIONS, url=SQLALCHEMY_DATABASE_URL)
+    assert loaded == {"books": 200, "readers": 100, "borrowed_books": 2000}
+    # Непустую базу без reset_data не трогает
+    assert generate(OPTIONS, url=SQLALCHEMY_DATABASE_URL) is None
+    active = dict(
+        db.execute(
+            select(BorrowedBookModel.reader_id, func.count())
+            .where(BorrowedBookModel.return_date.is_(None))
+            .group_by(BorrowedBookModel.reader_id)
+        ).all()
+    )
+    readers = db.scalars(select(ReaderModel)).all()
+    assert {r.id: r.active_loans for r in readers if r.active_loans} == active
+    assert all(r.loan_limit == DEFAULT_LOAN_LIMIT for r in readers)
+    assert all(r.active_loans <= r.loan_limit for r in readers)
+    assert db.scalar(select(func.min(BookModel.copies_available))) >= 0
+    # Индексы и внешние ключи восстановлены после COPY
+    inspector = inspect(engine)
+    assert {i["name"] for i in inspector.get_indexes("borrowed_books")} >= {
+        "ix_borrowed_books_reader_active",
+        "ix_borrowed_books_book_reader_active",
+    }
+    assert len(inspector.get_foreign_keys("borrowed_books")) == 2
+    # Последовательности сдвинуты за явные id
+    book = BookModel(title="New", author="Author", copies_available=1)
+    db.add(book)
+    db.commit()
+    assert book.id == 201
\ No newline at end of file
@@ -0,0 +1,79 @@
+import os
+from dataclasses import replace
+import pytest
+from fastapi.testclient import TestClient
+from src import database
+from src.database import create_db_engine
+from src.main import create_app
+from src.server import (
+    check_cache_backend,
+    log_config,
+    prepare_metrics_dir,
+    uvicorn_options,
+)
+from src.settings import Settings, get_settings
+from tests.conftest import SQLALCHEMY_DATABASE_URL
+
+def test_uvicorn_options_use_fast_loop_and_limits():
+    settings = replace(
+        get_settings(), server_limit_concurrency=0, server_keepalive=7
+    )
+    options = uvicorn_options(settings, workers=4)
+    assert options["workers"] == 4
+    assert options["factory"] is True
+    assert (options["loop"], options["http"]) == ("uvloop", "httptools")
+    assert options["limit_concurrency"] is None
+    assert options["timeout_keep_alive"] == 7
+    assert options["timeout_graceful_shutdown"] == (
+        settings.server_graceful_timeout
+    )
+
+def test_log_config_sets_only_library_level():
+    settings = replace(get_settings(), log_level="DEBUG")
+    config = uvicorn_options(settings, workers=1)["log_config"]
+    assert config == log_config(settings)
+    assert config["loggers"]["library"]["level"] == "DEBUG"
+    assert config["loggers"]["uvicorn"]["level"] == "INFO"
+    assert "root" not in config
+
+def test_prepare_metrics_dir(monkeypatch, tmp_path):
+    # prepare_metrics_dir пишет в os.environ; monkeypatch восстановит его
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", "")
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR")
+    settings = replace(get_settings(), prometheus_multiproc_dir=None)
+    assert prepare_metrics_dir(settings, workers=1) is None
+
+    # Файлы прошлого запуска не должны попасть в счётчики нового
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "counter_1.db").write_bytes(b"stale")
+    settings = replace(settings, prometheus_multiproc_dir=str(metrics_dir))
+    assert prepare_metrics_dir(settings, workers=2) == str(metrics_dir)
+    assert list(metrics_dir.iterdir()) == []
+    assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == str(metrics_dir)
+
+def test_memory_cache_allows_single_worker(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setenv("CACHE_BACKEND", "memory")
+    settings = Settings.from_env()
+    assert settings.web_concurrency == 1
+    check_cache_backend(settings, workers=1)
+    with pytest.raises(ValueError, match="CACHE_BACKEND=memory"):
+        check_cache_backend(settings, workers=4)
+
+    monkeypatch.setenv("CACHE_BACKEND", "redis")
+    settings = Settings.from_env()
+    assert settings.web_concurrency == (os.cpu_count() or 1)
+    check_cache_backend(settings, workers=4)
+
+def test_lifespan_shutdown_disposes_engines(monkeypatch, app_engine):
+    sync_engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+    monkeypatch.setitem(database._engines, "sync", sync_engine)
+    # dispose() заменяет пул движка новым, пустым
+    pools = {"sync": sync_engine.pool, "async": app_engine.pool}
+    with TestClient(create_app()) as client:
+        assert client.get("/docs").status_code == 200
+        assert sync_engine.pool is pools["sync"]
+        assert app_engine.pool is pools["async"]
+    assert sync_engine.pool is not pools["sync"]
+    assert app_engine.pool is not pools["async"]
\ No newline at end of file
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+from src.main import app, create_app
+
+# Бюджет на импорт src.main (сумма по python -X importtime), мс:
+# около 1.5x от измеренных ~1.3 с, чтобы тяжёлый импорт не прошёл незаметно
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+# Модули, которые нужны только отдельным запросам или командам
+LAZY_MODULES = {"alembic", "asyncpg", "jose", "passlib", "psycopg2", "redis"}
+
+def import_times():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import src.main\n"
+            "from src.database import created_engines\n"
+            "assert not created_engines()",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000
+    return times
+
+def test_import_is_lazy_and_within_budget():
+    times = import_times()
+    loaded = {name.split(".")[0] for name in times}
+    assert not LAZY_MODULES & loaded
+    assert times["src.main"] < IMPORT_TIME_BUDGET_MS
+
+def test_create_app_reuses_routes_and_overrides():
+    other = create_app()
+    assert [route.path for route in other.routes] == [
+        route.path for route in app.routes
+    ]
+    assert other.dependency_overrides is app.dependency_overrides
\ No newline at end of file
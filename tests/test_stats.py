@@ -0,0 +1,93 @@
+import pytest
+from fastapi import status
+from src.main import utcnow
+from src.models import BookModel, ReaderModel
+from src.stats import rebuild_stats, shard
+from tests.conftest import engine
+
+@pytest.fixture
+def second_book(db):
+    book = BookModel(title="Second Book", author="Second Author", copies_available=3)
+    db.add(book)
+    db.commit()
+    return book
+
+@pytest.fixture
+def second_reader(db):
+    # Другой шард счётчиков, чем у test_reader
+    reader = ReaderModel(name="Second Reader", email="second@library.com")
+    db.add(reader)
+    db.commit()
+    return reader
+
+def read_stats(client, headers):
+    current = client.get("/stats/current", headers=headers).json()
+    top = client.get("/stats/top-books", headers=headers).json()
+    daily = client.get("/stats/daily", headers=headers).json()
+    return current, top, daily
+
+def test_stats_follow_rent_and_return(client, auth_headers, db, test_book, second_book, test_reader, second_reader):
+    assert shard(test_reader.id) != shard(second_reader.id)
+    client.post(
+        "/rent_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    response = client.post(
+        "/rent_book/batch",
+        json={"items": [
+            {"book_id": test_book.id, "reader_id": second_reader.id},
+            {"book_id": second_book.id, "reader_id": second_reader.id},
+            {"book_id": second_book.id, "reader_id": test_reader.id},
+        ]},
+        headers=auth_headers,
+    )
+    assert response.json()["succeeded"] == 3
+    client.post(
+        "/return_book",
+        json={"book_id": test_book.id, "reader_id": test_reader.id},
+        headers=auth_headers,
+    )
+    client.post(
+        "/return_book/batch",
+        json={"items": [
+            {"book_id": test_book.id, "reader_id": second_reader.id},
+            {"book_id": second_book.id, "reader_id": second_reader.id},
+        ]},
+        headers=auth_headers,
+    )
+
+    current, top, daily = read_stats(client, auth_headers)
+    assert current == {"active_loans": 1, "active_readers": 1, "books_on_loan": 1}
+    assert [(book["book_id"], book["loans"]) for book in top] == [
+        (test_book.id, 2), (second_book.id, 2)
+    ]
+    assert top[0]["title"] == "Test Book"
+    assert len(daily) == 30
+    assert daily[-1] == {
+        "day": utcnow().date().isoformat(), "loans": 4, "returns": 3
+    }
+    assert sum(day["loans"] for day in daily[:-1]) == 0
+
+    # Полный пересчёт по borrowed_books даёт те же значения
+    with engine.begin() as conn:
+        rebuild_stats(conn)
+    assert read_stats(client, auth_headers) == (current, top, daily)
+
+def test_daily_stats_period(client, auth_headers):
+    response = client.get(
+        "/stats/daily",
+        params={"date_from": "2026-01-30", "date_to": "2026-02-02"},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [day["day"] for day in response.json()] == [
+        "2026-01-30", "2026-01-31", "2026-02-01", "2026-02-02"
+    ]
+
+    response = client.get(
+        "/stats/daily",
+        params={"date_from": "2025-01-01", "date_to": "2026-02-02"},
+        headers=auth_headers,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
\ No newline at end of file